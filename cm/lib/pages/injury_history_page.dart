@@ -18,6 +18,8 @@ class _InjuryHistoryPageState extends State<InjuryHistoryPage> {
   bool _isLoading = true;
   List<dynamic> _injuries = [];
   Map<String, dynamic>? _statistics;
+  // Full records by ID; the list only holds summaries
+  Map<String, Map<String, dynamic>> _details = {};
   
   @override
   void initState() {
@@ -30,12 +32,19 @@ class _InjuryHistoryPageState extends State<InjuryHistoryPage> {
     setState(() => _isLoading = true);
     
     try {
-      final injuries = await _service.getInjuries();
-      final stats = await _service.getStatistics();
+      final history = await _service.loadHistory();
+      final latest = history['latest'];
       
       setState(() {
-        _injuries = injuries;
-        _statistics = stats;
+        _injuries = history['injuries'];
+        _statistics = history['statistics'];
+        if (history['full']) _details.clear();
+        for (final id in history['changed']) {
+          _details.remove(id);
+        }
+        if (latest != null) {
+          _details[latest['id']] = Map<String, dynamic>.from(latest);
+        }
         _isLoading = false;
       });
     } catch (e) {
@@ -75,6 +84,22 @@ class _InjuryHistoryPageState extends State<InjuryHistoryPage> {
     }
   }
   
+  Future<void> _openInjury(Map<String, dynamic> injury) async {
+    final id = injury['id'];
+    var details = _details[id];
+    if (details == null) {
+      try {
+        details = await _service.getInjuryDetails(id);
+        _details[id] = details;
+      } catch (e) {
+        _showError('Error loading details: $e');
+        return;
+      }
+    }
+    if (!mounted) return;
+    _showInjuryDetails(details);
+  }
+  
   void _showInjuryDetails(Map<String, dynamic> injury) {
     showModalBottomSheet(
       context: context,
@@ -463,7 +488,7 @@ class _InjuryHistoryPageState extends State<InjuryHistoryPage> {
                                 ],
                               ),
                               trailing: const Icon(Icons.chevron_right),
-                              onTap: () => _showInjuryDetails(injury),
+                              onTap: () => _openInjury(injury),
                             ),
                           );
                         },
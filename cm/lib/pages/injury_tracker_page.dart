@@ -17,6 +17,8 @@ class _InjuryTrackerPageState extends State<InjuryTrackerPage> {
   final User? user = FirebaseAuth.instance.currentUser;
   
   File? _selectedImage;
+  // Same key for every analysis attempt of the selected photo
+  String? _idempotencyKey;
   bool _isAnalyzing = false;
   Map<String, dynamic>? _analysisResult;
   
@@ -63,6 +65,7 @@ class _InjuryTrackerPageState extends State<InjuryTrackerPage> {
         
         setState(() {
           _selectedImage = file;
+          _idempotencyKey = InjuryTrackerService.newIdempotencyKey();
           _analysisResult = null;
         });
         
@@ -97,7 +100,10 @@ class _InjuryTrackerPageState extends State<InjuryTrackerPage> {
       }
       
       print('✅ File exists, sending to API...');
-      final result = await _service.analyzeWound(_selectedImage!);
+      final result = await _service.analyzeWound(
+        _selectedImage!,
+        idempotencyKey: _idempotencyKey,
+      );
       
       print('🎉 Analysis successful!');
       print('Result: $result');
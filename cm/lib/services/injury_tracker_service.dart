@@ -1,8 +1,13 @@
 import 'dart:convert';
 import 'dart:io';
+import 'dart:math';
+import 'package:firebase_auth/firebase_auth.dart';
+import 'package:flutter/foundation.dart';
 import 'package:http/http.dart' as http;
+import 'package:image/image.dart' as img;
 import 'package:http_parser/http_parser.dart';
 import 'package:mime/mime.dart';
+import 'package:shared_preferences/shared_preferences.dart';
 
 class InjuryTrackerService {
   // API Configuration - Choose ONE based on where you're running the app:
@@ -18,10 +23,102 @@ class InjuryTrackerService {
   
   final String userId;
   
+  // Model input description from /api/v1/model-info, fetched once per app run
+  static Map<String, dynamic>? _modelInfo;
+  
+  // Last response with an ETag per URL, revalidated with If-None-Match
+  static final Map<String, http.Response> _etagCache = {};
+  
   InjuryTrackerService({required this.userId});
   
+  /// Authorization header value: the signed-in user's Firebase ID token,
+  /// which firebase_auth caches and refreshes before it expires
+  Future<String> _authorization() async {
+    final token = await FirebaseAuth.instance.currentUser?.getIdToken();
+    return 'Bearer ${token ?? userId}';
+  }
+  
+  /// GET a per-user resource, reusing the cached body when the server
+  /// answers 304 Not Modified
+  Future<http.Response> _conditionalGet(Uri url) async {
+    final cacheKey = '$userId $url';
+    final cached = _etagCache[cacheKey];
+    final response = await http.get(
+      url,
+      headers: {
+        'Authorization': await _authorization(),
+        if (cached != null) 'If-None-Match': cached.headers['etag']!,
+      },
+    );
+    
+    if (response.statusCode == 304 && cached != null) {
+      return cached;
+    }
+    if (response.statusCode == 200 && response.headers.containsKey('etag')) {
+      _etagCache[cacheKey] = response;
+    }
+    return response;
+  }
+  
+  /// Get the model input size and accepted upload types (cached)
+  Future<Map<String, dynamic>?> getModelInfo() async {
+    if (_modelInfo != null) return _modelInfo;
+    try {
+      final response = await http.get(Uri.parse('$baseUrl/api/v1/model-info'));
+      if (response.statusCode == 200) {
+        _modelInfo = json.decode(response.body);
+      }
+    } catch (e) {
+      print('⚠️ Could not get model info: $e');
+    }
+    return _modelInfo;
+  }
+  
+  /// Resize the photo to the model input size on the device, so only the
+  /// pixels the model uses are uploaded. Returns null to upload the original.
+  Future<Uint8List?> _compactImage(File imageFile) async {
+    final info = await getModelInfo();
+    if (info == null ||
+        !(info['accepted_content_types'] as List).contains('image/jpeg')) {
+      return null;
+    }
+    
+    final inputSize = info['input_size'];
+    return compute(_resizeToJpeg, {
+      'bytes': await imageFile.readAsBytes(),
+      'width': inputSize['width'],
+      'height': inputSize['height'],
+    });
+  }
+  
+  /// Decode, stretch to the model input size and re-encode (runs in an isolate)
+  static Uint8List? _resizeToJpeg(Map<String, dynamic> args) {
+    final decoded = img.decodeImage(args['bytes'] as Uint8List);
+    if (decoded == null) return null;
+    
+    // Same convention as the server: bicubic stretch, aspect ratio not kept
+    final resized = img.copyResize(
+      img.bakeOrientation(decoded),
+      width: args['width'] as int,
+      height: args['height'] as int,
+      interpolation: img.Interpolation.cubic,
+    );
+    return img.encodeJpg(resized, quality: 90);
+  }
+  
+  /// New Idempotency-Key for one wound photo; reuse it when retrying the
+  /// analysis of the same photo so the server does not analyze it twice
+  static String newIdempotencyKey() {
+    final random = Random.secure();
+    final bytes = List<int>.generate(16, (_) => random.nextInt(256));
+    return bytes.map((b) => b.toRadixString(16).padLeft(2, '0')).join();
+  }
+  
   /// Analyze wound image and get severity with recommendations
-  Future<Map<String, dynamic>> analyzeWound(File imageFile) async {
+  Future<Map<String, dynamic>> analyzeWound(
+    File imageFile, {
+    String? idempotencyKey,
+  }) async {
     try {
       print('🔍 Starting wound analysis...');
       print('📁 Image path: ${imageFile.path}');
@@ -31,7 +128,28 @@ class InjuryTrackerService {
       print('🌐 API endpoint: $url');
       
       var request = http.MultipartRequest('POST', url);
-      request.headers['Authorization'] = 'Bearer $userId';
+      request.headers['Authorization'] = await _authorization();
+      if (idempotencyKey != null) {
+        request.headers['Idempotency-Key'] = idempotencyKey;
+      }
+      
+      // Upload a compact copy at the model input size when the server
+      // advertises one; fall back to the original file otherwise
+      final compact = await _compactImage(imageFile);
+      if (compact != null) {
+        print('🗜️ Uploading compact image: ${compact.length} bytes');
+        request.files.add(
+          http.MultipartFile.fromBytes(
+            'file',
+            compact,
+            filename: 'wound.jpg',
+            contentType: MediaType('image', 'jpeg'),
+          ),
+        );
+        
+        var streamedResponse = await request.send();
+        return _analysisResult(await http.Response.fromStream(streamedResponse));
+      }
       
       // Detect MIME type and add image file with proper content type
       final mimeType = lookupMimeType(imageFile.path);
@@ -60,58 +178,128 @@ class InjuryTrackerService {
       
       // Send request
       var streamedResponse = await request.send();
-      var response = await http.Response.fromStream(streamedResponse);
+      return _analysisResult(await http.Response.fromStream(streamedResponse));
+    } catch (e) {
+      print('💥 Exception during analysis: $e');
+      throw Exception('Error analyzing wound: $e');
+    }
+  }
+  
+  Map<String, dynamic> _analysisResult(http.Response response) {
+    print('📥 Response status: ${response.statusCode}');
+    print('📄 Response body length: ${response.body.length} chars');
+    
+    if (response.statusCode == 200) {
+      print('✅ Analysis successful');
+      return json.decode(response.body);
+    } else if (response.statusCode == 429 || response.statusCode == 503) {
+      // Rate limited or overloaded; retry (with the same Idempotency-Key)
+      // after the delay the server asks for
+      final retryAfter = response.headers['retry-after'] ?? '30';
+      print('⏳ Server busy, retry after ${retryAfter}s');
+      throw Exception('The service is busy. Please try again in $retryAfter seconds.');
+    } else {
+      print('❌ Analysis failed');
+      print('Error body: ${response.body}');
+      throw Exception('Failed to analyze wound: ${response.body}');
+    }
+  }
+  
+  /// Get all injury records for user
+  Future<List<dynamic>> getInjuries({int limit = 50}) async {
+    try {
+      final url = Uri.parse('$baseUrl/api/v1/injuries?limit=$limit');
       
-      print('📥 Response status: ${response.statusCode}');
-      print('📄 Response body length: ${response.body.length} chars');
+      final response = await _conditionalGet(url);
       
       if (response.statusCode == 200) {
-        print('✅ Analysis successful');
         return json.decode(response.body);
       } else {
-        print('❌ Analysis failed');
-        print('Error body: ${response.body}');
-        throw Exception('Failed to analyze wound: ${response.body}');
+        throw Exception('Failed to get injuries: ${response.body}');
       }
     } catch (e) {
-      print('💥 Exception during analysis: $e');
-      throw Exception('Error analyzing wound: $e');
+      throw Exception('Error getting injuries: $e');
     }
   }
   
-  /// Get all injury records for user
-  Future<List<dynamic>> getInjuries({int limit = 50}) async {
+  /// Get the history screen data (first page of summaries, statistics and
+  /// the most recent record's details) in one request
+  Future<Map<String, dynamic>> getDashboard({int limit = 20, String? since}) async {
     try {
-      final url = Uri.parse('$baseUrl/api/v1/injuries?limit=$limit');
+      final url = Uri.parse('$baseUrl/api/v1/dashboard').replace(queryParameters: {
+        'limit': '$limit',
+        if (since != null) 'since': since,
+      });
       
       final response = await http.get(
         url,
         headers: {
-          'Authorization': 'Bearer $userId',
+          'Authorization': await _authorization(),
         },
       );
       
       if (response.statusCode == 200) {
         return json.decode(response.body);
       } else {
-        throw Exception('Failed to get injuries: ${response.body}');
+        throw Exception('Failed to get dashboard: ${response.body}');
       }
     } catch (e) {
-      throw Exception('Error getting injuries: $e');
+      throw Exception('Error getting dashboard: $e');
     }
   }
   
+  /// Load the history screen data. Record summaries are cached on the
+  /// device; after the first load only the changes since the last sync are
+  /// downloaded. The result has 'injuries' (newest first), 'statistics',
+  /// 'latest', 'full' (cached records were replaced) and 'changed' (IDs of
+  /// records that were added, modified or deleted)
+  Future<Map<String, dynamic>> loadHistory({int limit = 20}) async {
+    final prefs = await SharedPreferences.getInstance();
+    final cacheKey = 'injury_history_$userId';
+    final cached = prefs.getString(cacheKey);
+    final cache = cached != null ? json.decode(cached) as Map<String, dynamic> : null;
+    
+    final dashboard = await getDashboard(limit: limit, since: cache?['sync_token']);
+    final full = dashboard['full'] == true || cache == null;
+    
+    final records = <String, dynamic>{};
+    if (!full) {
+      for (final injury in cache!['injuries']) {
+        records[injury['id']] = injury;
+      }
+    }
+    final changed = <String>[];
+    for (final injury in dashboard['injuries']) {
+      records[injury['id']] = injury;
+      changed.add(injury['id']);
+    }
+    for (final id in dashboard['deleted']) {
+      records.remove(id);
+      changed.add(id);
+    }
+    
+    final injuries = records.values.toList()
+      ..sort((a, b) => (b['createdAt'] ?? '').compareTo(a['createdAt'] ?? ''));
+    await prefs.setString(cacheKey, json.encode({
+      'sync_token': dashboard['sync_token'],
+      'injuries': injuries,
+    }));
+    
+    return {
+      'injuries': injuries,
+      'statistics': dashboard['statistics'],
+      'latest': dashboard['latest'],
+      'full': full,
+      'changed': changed,
+    };
+  }
+  
   /// Get specific injury details
   Future<Map<String, dynamic>> getInjuryDetails(String injuryId) async {
     try {
       final url = Uri.parse('$baseUrl/api/v1/injuries/$injuryId');
       
-      final response = await http.get(
-        url,
-        headers: {
-          'Authorization': 'Bearer $userId',
-        },
-      );
+      final response = await _conditionalGet(url);
       
       if (response.statusCode == 200) {
         return json.decode(response.body);
@@ -135,7 +323,7 @@ class InjuryTrackerService {
       final response = await http.put(
         url,
         headers: {
-          'Authorization': 'Bearer $userId',
+          'Authorization': await _authorization(),
           'Content-Type': 'application/json',
         },
         body: json.encode({
@@ -162,7 +350,7 @@ class InjuryTrackerService {
       final response = await http.delete(
         url,
         headers: {
-          'Authorization': 'Bearer $userId',
+          'Authorization': await _authorization(),
         },
       );
       
@@ -181,12 +369,7 @@ class InjuryTrackerService {
     try {
       final url = Uri.parse('$baseUrl/api/v1/statistics');
       
-      final response = await http.get(
-        url,
-        headers: {
-          'Authorization': 'Bearer $userId',
-        },
-      );
+      final response = await _conditionalGet(url);
       
       if (response.statusCode == 200) {
         return json.decode(response.body);
@@ -197,4 +380,31 @@ class InjuryTrackerService {
       throw Exception('Error getting statistics: $e');
     }
   }
+  
+  /// Injury counts per day or week by severity and status, for trend
+  /// charts. [start] and [end] are ISO dates; the server defaults to the
+  /// last 30 days (or 12 weeks).
+  Future<Map<String, dynamic>> getStatisticsTimeseries({
+    String period = 'day',
+    String? start,
+    String? end,
+  }) async {
+    try {
+      final url = Uri.parse('$baseUrl/api/v1/statistics/timeseries').replace(queryParameters: {
+        'period': period,
+        if (start != null) 'start': start,
+        if (end != null) 'end': end,
+      });
+      
+      final response = await _conditionalGet(url);
+      
+      if (response.statusCode == 200) {
+        return json.decode(response.body);
+      } else {
+        throw Exception('Failed to get timeseries: ${response.body}');
+      }
+    } catch (e) {
+      throw Exception('Error getting timeseries: $e');
+    }
+  }
 }
@@ -0,0 +1,227 @@
+"""
+Admission control for the analyze pipeline.
+
+An analysis holds the model for tens of milliseconds and waits on the
+recommendation model for seconds. Under a burst (many reporters of one
+incident) accepting every upload would queue work without bound, and
+latency would climb for everyone until clients time out. Instead:
+
+- Each expensive step runs in a Stage: at most `concurrency` calls at a
+  time, at most `max_queue` waiting, and nobody waits longer than
+  `max_wait` seconds. Work beyond that is rejected with a Retry-After
+  estimated from the stage's recent service time.
+- LoadSheddingMiddleware rejects analyze requests with 503 before their
+  upload is read while any stage's queue is full.
+- RateLimiter gives every user a token bucket, so one client retrying in
+  a loop cannot take the capacity meant for everyone else (429).
+
+Stages run their work in the threadpool, so the event loop (and with it
+every read endpoint) stays responsive while the pipeline is saturated.
+This only holds if no endpoint blocks the loop itself: every Firestore
+call in main.py goes through run_in_threadpool too. Keep the stages'
+combined concurrency well below the threadpool size (40 threads), so
+reads always find a free thread.
+
+The state lives in process memory, i.e. limits apply per worker process.
+"""
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Iterable, Optional
+
+from fastapi.responses import JSONResponse
+
+# Per-user analyze rate: sustained requests per minute and burst size
+ANALYZE_RATE_PER_MINUTE = float(os.getenv('ANALYZE_RATE_PER_MINUTE', 6))
+ANALYZE_BURST = int(os.getenv('ANALYZE_BURST', 5))
+
+# Users whose buckets are tracked (least recently seen dropped first)
+RATE_LIMIT_MAX_USERS = int(os.getenv('RATE_LIMIT_MAX_USERS', 100000))
+
+# Model inference: concurrent calls, queued calls, longest wait in seconds
+INFERENCE_CONCURRENCY = int(os.getenv('INFERENCE_CONCURRENCY', 2))
+INFERENCE_QUEUE_DEPTH = int(os.getenv('INFERENCE_QUEUE_DEPTH', 32))
+INFERENCE_MAX_WAIT_SECONDS = float(os.getenv('INFERENCE_MAX_WAIT_SECONDS', 2))
+
+# Recommendation (LLM) calls: concurrent calls, queued calls, longest wait
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', 16))
+LLM_QUEUE_DEPTH = int(os.getenv('LLM_QUEUE_DEPTH', 16))
+LLM_MAX_WAIT_SECONDS = float(os.getenv('LLM_MAX_WAIT_SECONDS', 5))
+
+# Weight of the newest sample in a stage's average service time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class OverloadedError(Exception):
+    """A request was rejected to protect the service; retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After value (whole seconds, at least 1)."""
+    return str(max(1, math.ceil(seconds)))
+
+
+class Stage:
+    """
+    A pipeline step with bounded concurrency and a bounded, time-limited queue.
+
+    Args:
+        name: Name used in error messages
+        concurrency: Calls allowed to run at the same time
+        max_queue: Calls allowed to wait for a free slot
+        max_wait: Longest wait for a slot in seconds
+        service_time: Initial estimate of one call's duration in seconds
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float,
+                 service_time: float = 0.1):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.service_time = service_time
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def full(self) -> bool:
+        """True when a new call would be rejected."""
+        return self.in_flight >= self.concurrency and self.queued >= self.max_queue
+
+    def retry_after(self) -> float:
+        """Seconds until the calls running and waiting now are expected to finish."""
+        return (self.in_flight + self.queued) * self.service_time / self.concurrency
+
+    def _release(self):
+        # Hand the slot straight to the next waiter, so a newcomer cannot
+        # overtake the queue between release and wake-up
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _acquire(self):
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            raise OverloadedError(f"The {self.name} queue is full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # Got the slot just as the wait ended
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise OverloadedError(f"Timed out waiting for {self.name}", self.retry_after())
+            raise
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the stage's slots.
+
+        Raises:
+            OverloadedError: The queue is full, or no slot came free within max_wait
+        """
+        await self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.service_time += SERVICE_TIME_SMOOTHING * (elapsed - self.service_time)
+            self._release()
+
+
+class RateLimiter:
+    """
+    Per-key token buckets.
+
+    Args:
+        rate: Tokens added per second (sustained requests per second)
+        burst: Bucket size (requests allowed at once after being idle)
+        max_keys: Buckets kept at most (least recently used dropped first;
+            a dropped bucket starts full again)
+        clock: Monotonic clock in seconds
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = RATE_LIMIT_MAX_USERS,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, time of last update)
+
+    def acquire(self, key: str) -> Optional[float]:
+        """
+        Take one token from the key's bucket.
+
+        Args:
+            key: Bucket key (user ID)
+
+        Returns:
+            None if the request may proceed, else seconds until a token is available
+        """
+        now = self._clock()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return None if allowed else (1 - tokens) / self.rate
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware that rejects requests with 503 while a stage is full.
+
+    The check runs before the request body is read, so a shed upload costs
+    neither bandwidth nor decoding.
+    """
+
+    def __init__(self, app, stages: Iterable[Stage], paths: Iterable[str]):
+        """
+        Args:
+            app: ASGI application
+            stages: Stages the paths go through
+            paths: Path prefixes the check applies to
+        """
+        self.app = app
+        self.stages = list(stages)
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'].startswith(self.paths):
+            full = [stage for stage in self.stages if stage.full()]
+            if full:
+                retry_after = max(stage.retry_after() for stage in full)
+                response = JSONResponse(
+                    status_code=503,
+                    content={'detail': "The service is busy. Please retry shortly."},
+                    headers={'Retry-After': retry_after_header(retry_after)}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
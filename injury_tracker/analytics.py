@@ -0,0 +1,531 @@
+"""
+Organization-wide analytics over a columnar snapshot of all injury records.
+
+The snapshot keeps one NumPy array per field instead of one dict per record.
+User, severity and status strings are dictionary-encoded as small integer
+codes, and timestamps are datetime64 values, so a few million records fit in
+tens of megabytes. Aggregates are single vectorized passes (bincount,
+histogram, percentile) over those arrays.
+
+The snapshot is saved as a .npz file and refreshed incrementally. Each
+refresh reads the records whose updatedAt is newer than the snapshot's
+watermark, plus the tombstones of records deleted since then, and applies
+them to the arrays. A full rebuild happens only when the snapshot is older
+than the tombstone retention.
+
+Usage:
+    python analytics.py                 # Refresh the snapshot and print a report
+    python analytics.py --full          # Rebuild the snapshot from scratch
+    python analytics.py --no-refresh    # Report on the saved snapshot only
+"""
+import os
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from dashboard import SEVERITIES, SYNC_SKEW_SECONDS
+from firebase_service import TOMBSTONE_RETENTION_DAYS
+
+ANALYTICS_SNAPSHOT_PATH = os.getenv('ANALYTICS_SNAPSHOT_PATH', './analytics/injuries_snapshot.npz')
+
+# Stages of the status funnel, in order
+STATUS_FUNNEL = ('active', 'healing', 'resolved')
+
+PERIODS = ('day', 'week', 'month')
+
+# Confidence percentiles are computed to this precision
+CONFIDENCE_RESOLUTION = 1e-4
+
+# Fields read from Firestore for the snapshot
+SNAPSHOT_FIELDS = ['userId', 'severity', 'confidence', 'probabilities', 'status', 'createdAt', 'updatedAt']
+
+# Dictionary-encoded columns and the values their codes start with
+_CATEGORIES = {'user': (), 'severity': SEVERITIES, 'status': STATUS_FUNNEL}
+
+
+def _encode(values: List[str], dictionary: List[str]) -> np.ndarray:
+    """Dictionary-encode strings, appending unseen values to dictionary."""
+    if not values:
+        return np.zeros(0, dtype=np.int32)
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    index = {value: code for code, value in enumerate(dictionary)}
+    codes = np.empty(len(uniques), dtype=np.int32)
+    for i, value in enumerate(uniques):
+        if value not in index:
+            index[value] = len(dictionary)
+            dictionary.append(str(value))
+        codes[i] = index[value]
+    return codes[inverse.ravel()]
+
+
+def _timestamps(values: List[Optional[str]]) -> np.ndarray:
+    """Parse ISO 8601 strings to datetime64[s] (missing values become NaT)."""
+    return np.array([value or 'NaT' for value in values], dtype='datetime64[us]').astype('datetime64[s]')
+
+
+class InjurySnapshot:
+    """
+    Columnar copy of the injuries collection.
+
+    Attributes:
+        ids: Record IDs (bytes), in ascending order
+        user, severity, status: int32 codes into categories[name]
+        confidence: float32 prediction confidence
+        probabilities: float32 array of shape (n, len(SEVERITIES))
+        created, updated: datetime64[s] timestamps
+        categories: Dict of column name -> list of the values its codes stand for
+        watermark: Changes up to this time (ISO string) have been applied; None
+            for a snapshot that has never been refreshed
+        refreshed_at: When the snapshot was last refreshed (ISO string), or None
+    """
+
+    COLUMNS = ('ids', 'user', 'severity', 'status', 'confidence', 'probabilities', 'created', 'updated')
+
+    def __init__(self, columns: Optional[Dict[str, np.ndarray]] = None, categories: Optional[Dict[str, List[str]]] = None,
+                 watermark: Optional[str] = None, refreshed_at: Optional[str] = None):
+        if columns is None:
+            columns = {
+                'ids': np.zeros(0, dtype='S20'),
+                'user': np.zeros(0, dtype=np.int32),
+                'severity': np.zeros(0, dtype=np.int32),
+                'status': np.zeros(0, dtype=np.int32),
+                'confidence': np.zeros(0, dtype=np.float32),
+                'probabilities': np.zeros((0, len(SEVERITIES)), dtype=np.float32),
+                'created': np.zeros(0, dtype='datetime64[s]'),
+                'updated': np.zeros(0, dtype='datetime64[s]')
+            }
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.categories = categories or {name: list(values) for name, values in _CATEGORIES.items()}
+        self.watermark = watermark
+        self.refreshed_at = refreshed_at
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def clear(self):
+        """Drop all records, categories and the watermark."""
+        self.__init__()
+
+    @classmethod
+    def load(cls, path: str = ANALYTICS_SNAPSHOT_PATH) -> 'InjurySnapshot':
+        """
+        Load a saved snapshot.
+
+        Args:
+            path: .npz file written by save
+
+        Returns:
+            The snapshot, or an empty one if the file does not exist
+        """
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            columns = {name: data[name] for name in cls.COLUMNS}
+            categories = {name: data[f'categories_{name}'].tolist() for name in _CATEGORIES}
+            watermark = str(data['watermark']) or None
+            refreshed_at = str(data['refreshed_at']) or None
+        return cls(columns, categories, watermark, refreshed_at)
+
+    def save(self, path: str = ANALYTICS_SNAPSHOT_PATH):
+        """Write the snapshot to a .npz file (atomically replacing the old one)."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {name: getattr(self, name) for name in self.COLUMNS}
+        for name, values in self.categories.items():
+            arrays[f'categories_{name}'] = np.array(values, dtype=str)
+        arrays['watermark'] = np.array(self.watermark or '')
+        arrays['refreshed_at'] = np.array(self.refreshed_at or '')
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+    def apply(self, records: Iterable[Dict], deleted_ids: Iterable[str] = ()):
+        """
+        Apply changed and deleted records.
+
+        Args:
+            records: New and modified records (with an id field); they
+                replace earlier versions of the same records
+            deleted_ids: IDs of deleted records
+        """
+        # A record modified while the changes were being paged through is
+        # read twice; the later read wins
+        records = sorted({record['id']: record for record in records}.values(), key=lambda record: record['id'])
+        ids = np.array([record['id'] for record in records], dtype='S')
+
+        # Rows are kept sorted by ID, so replaced and deleted rows are found
+        # by binary search instead of comparing every row
+        removed = np.union1d(ids, np.array(list(deleted_ids), dtype='S'))
+        keep = np.ones(len(self), dtype=bool)
+        if len(self) and len(removed):
+            positions = np.searchsorted(self.ids, removed).clip(max=len(self) - 1)
+            keep[positions[self.ids[positions] == removed]] = False
+
+        probabilities = np.array(
+            [[(record.get('probabilities') or {}).get(severity, 0.0) for severity in SEVERITIES] for record in records],
+            dtype=np.float32
+        ).reshape(-1, len(SEVERITIES))
+        added = {
+            'ids': ids,
+            'user': _encode([record.get('userId', '') for record in records], self.categories['user']),
+            'severity': _encode([record.get('severity', '') for record in records], self.categories['severity']),
+            'status': _encode([record.get('status') or 'active' for record in records], self.categories['status']),
+            'confidence': np.array([record.get('confidence', 0.0) for record in records], dtype=np.float32),
+            'probabilities': probabilities,
+            'created': _timestamps([record.get('createdAt') for record in records]),
+            'updated': _timestamps([record.get('updatedAt') for record in records])
+        }
+
+        kept_ids = self.ids[keep]
+        if ids.dtype.itemsize > kept_ids.dtype.itemsize:
+            kept_ids = kept_ids.astype(ids.dtype)
+        insert_at = np.searchsorted(kept_ids, ids)
+        for name in self.COLUMNS:
+            column = kept_ids if name == 'ids' else getattr(self, name)[keep]
+            setattr(self, name, np.insert(column, insert_at, added[name], axis=0))
+
+
+def refresh_snapshot(firebase_service, snapshot: InjurySnapshot, full: bool = False) -> Dict:
+    """
+    Bring a snapshot up to date with Firestore.
+
+    Args:
+        firebase_service: FirebaseService
+        snapshot: Snapshot to update in place
+        full: Rebuild from scratch instead of applying changes
+
+    Returns:
+        Dict with changed, deleted, full and rows
+    """
+    now = datetime.utcnow()
+    expired = (snapshot.watermark is not None and
+               datetime.fromisoformat(snapshot.watermark) < now - timedelta(days=TOMBSTONE_RETENTION_DAYS))
+    if full or expired:
+        snapshot.clear()
+    after = snapshot.watermark
+
+    records = list(firebase_service.iter_all_injury_changes(after, fields=SNAPSHOT_FIELDS))
+    tombstones = firebase_service.get_all_tombstones(after) if after else []
+    snapshot.apply(records, [tombstone['injuryId'] for tombstone in tombstones])
+
+    # Writes whose updatedAt was taken shortly before they committed may not
+    # have been visible to this read; the next refresh reads them again
+    snapshot.watermark = (now - timedelta(seconds=SYNC_SKEW_SECONDS)).isoformat()
+    snapshot.refreshed_at = now.isoformat()
+
+    return {
+        'changed': len(records),
+        'deleted': len(tombstones),
+        'full': after is None,
+        'rows': len(snapshot)
+    }
+
+
+def _select(snapshot: InjurySnapshot, start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Index of the records created in [start, end).
+
+    Raises:
+        ValueError: start or end is not an ISO date
+    """
+    mask = ~np.isnat(snapshot.created)
+    if start:
+        mask &= snapshot.created >= np.datetime64(start, 's')
+    if end:
+        mask &= snapshot.created < np.datetime64(end, 's')
+    # Indexing with a mask copies every column; skip it when all records match
+    return slice(None) if mask.all() else mask
+
+
+def _period_start(dates: np.ndarray, period: str) -> np.ndarray:
+    """Start date of the day, week (Monday) or month of each date."""
+    days = dates.astype('datetime64[D]')
+    if period == 'day':
+        return days
+    if period == 'week':
+        # 1970-01-01 was a Thursday
+        return days - (days.astype(np.int64) + 3) % 7
+    return dates.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def severity_mix(snapshot: InjurySnapshot, period: str = 'week',
+                 start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    """
+    Records per severity in each period.
+
+    Args:
+        snapshot: InjurySnapshot
+        period: 'day', 'week' or 'month'
+        start: Only records created at or after this ISO date
+        end: Only records created before this ISO date
+
+    Returns:
+        One dict per period from the first record to the last (periods
+        without records included) with records (total), counts and shares
+        per severity
+
+    Raises:
+        ValueError: Unknown period, or start or end is not an ISO date
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}. Use one of: {', '.join(PERIODS)}")
+    selected = _select(snapshot, start, end)
+    severities = snapshot.categories['severity']
+    days = snapshot.created[selected].view(np.int64) // 86400
+    if not len(days):
+        return []
+
+    # Map every calendar day in range to its period once, then look the
+    # records' days up in that table (no per-record date arithmetic)
+    first_day = days.min()
+    calendar = np.arange(first_day, days.max() + 1).astype('datetime64[D]')
+    periods, day_period = np.unique(_period_start(calendar, period), return_inverse=True)
+    record_period = day_period.ravel()[days - first_day]
+
+    counts = np.bincount(
+        record_period * len(severities) + snapshot.severity[selected],
+        minlength=len(periods) * len(severities)
+    ).reshape(len(periods), len(severities))
+    totals = counts.sum(axis=1).tolist()
+
+    return [
+        {
+            'period': str(period_start),
+            'records': total,
+            'counts': {severity: int(count) for severity, count in zip(severities, row)},
+            'shares': {severity: round(int(count) / total, 4) if total else 0.0
+                       for severity, count in zip(severities, row)}
+        }
+        for period_start, row, total in zip(periods, counts, totals)
+    ]
+
+
+def confidence_distribution(snapshot: InjurySnapshot, bins: int = 10,
+                            start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """
+    Distribution of prediction confidence, overall and per predicted severity.
+
+    Percentiles are read from a histogram with CONFIDENCE_RESOLUTION wide
+    bins (one bincount for all groups), so they are exact to that resolution.
+
+    Args:
+        snapshot: InjurySnapshot
+        bins: Number of equal-width bins over [0, 1]
+        start: Only records created at or after this ISO date
+        end: Only records created before this ISO date
+
+    Returns:
+        Dict with bin edges and, for 'all' and each severity, the records,
+        histogram counts, mean and 10th/50th/90th percentiles
+
+    Raises:
+        ValueError: start or end is not an ISO date
+    """
+    selected = _select(snapshot, start, end)
+    confidence = snapshot.confidence[selected]
+    severity = snapshot.severity[selected]
+    severities = snapshot.categories['severity']
+    steps = int(round(1 / CONFIDENCE_RESOLUTION))
+
+    fine_bins = np.minimum((confidence * steps).astype(np.int64), steps - 1)
+    fine = np.bincount(severity * steps + fine_bins, minlength=len(severities) * steps).reshape(len(severities), steps)
+    sums = np.bincount(severity, weights=confidence, minlength=len(severities))
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    coarse_bins = np.minimum((confidence * bins).astype(np.int64), bins - 1)
+    histograms = np.bincount(severity * bins + coarse_bins, minlength=len(severities) * bins).reshape(len(severities), bins)
+
+    def describe(counts: np.ndarray, histogram: np.ndarray, total: float) -> Dict:
+        records = int(counts.sum())
+        if not records:
+            return {'records': 0, 'histogram': [0] * bins, 'mean': None, 'percentiles': None}
+        cumulative = np.cumsum(counts)
+        ranks = np.ceil(np.array([0.1, 0.5, 0.9]) * records).clip(1)
+        p10, p50, p90 = (np.searchsorted(cumulative, ranks) + 0.5) / steps
+        return {
+            'records': records,
+            'histogram': histogram.tolist(),
+            'mean': round(float(total) / records, 4),
+            'percentiles': {'p10': round(float(p10), 4), 'p50': round(float(p50), 4), 'p90': round(float(p90), 4)}
+        }
+
+    groups = {'all': describe(fine.sum(axis=0), histograms.sum(axis=0), sums.sum())}
+    for code, name in enumerate(severities):
+        groups[name] = describe(fine[code], histograms[code], sums[code])
+
+    return {'bin_edges': [round(float(edge), 4) for edge in edges], 'groups': groups}
+
+
+def status_funnel(snapshot: InjurySnapshot, start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """
+    How far records have progressed through active -> healing -> resolved.
+
+    Args:
+        snapshot: InjurySnapshot
+        start: Only records created at or after this ISO date
+        end: Only records created before this ISO date
+
+    Returns:
+        Dict with records, the current status counts, per funnel stage the
+        records at or past it (and their share), per severity the status
+        counts, and the median days from creation to the last update of
+        resolved records
+
+    Raises:
+        ValueError: start or end is not an ISO date
+    """
+    selected = _select(snapshot, start, end)
+    statuses = snapshot.categories['status']
+    severities = snapshot.categories['severity']
+    status = snapshot.status[selected]
+    total = len(status)
+
+    by_severity = np.bincount(
+        snapshot.severity[selected] * len(statuses) + status,
+        minlength=len(severities) * len(statuses)
+    ).reshape(len(severities), len(statuses))
+    counts = by_severity.sum(axis=0)
+
+    # Funnel stages come first in the status dictionary, so a record has
+    # reached a stage when its code is at least the stage's code
+    stages = []
+    for code, name in enumerate(STATUS_FUNNEL):
+        reached = int(counts[code:len(STATUS_FUNNEL)].sum())
+        stages.append({'stage': name, 'records': reached, 'share': round(reached / total, 4) if total else 0.0})
+
+    resolved = status == STATUS_FUNNEL.index('resolved')
+    # Integer views index much faster than datetime64 arrays
+    updated = snapshot.updated.view(np.int64)[selected][resolved]
+    seconds = updated - snapshot.created.view(np.int64)[selected][resolved]
+    seconds = seconds[seconds >= 0]  # Drops records without updatedAt (NaT)
+
+    return {
+        'records': total,
+        'status_counts': {name: int(count) for name, count in zip(statuses, counts)},
+        'funnel': stages,
+        'by_severity': {
+            severity: {name: int(count) for name, count in zip(statuses, row)}
+            for severity, row in zip(severities, by_severity)
+        },
+        'median_days_to_resolved': round(float(np.median(seconds)) / 86400, 2) if len(seconds) else None
+    }
+
+
+def snapshot_summary(snapshot: InjurySnapshot) -> Dict:
+    """Size and freshness of a snapshot."""
+    created = snapshot.created[~np.isnat(snapshot.created)]
+    return {
+        'records': len(snapshot),
+        'users': int(len(np.unique(snapshot.user))),
+        'first_record': str(created.min()) if len(created) else None,
+        'last_record': str(created.max()) if len(created) else None,
+        'watermark': snapshot.watermark,
+        'refreshed_at': snapshot.refreshed_at,
+        'memory_mb': round(sum(getattr(snapshot, name).nbytes for name in snapshot.COLUMNS) / 1024 ** 2, 2)
+    }
+
+
+class SnapshotStore:
+    """
+    The API's copy of the snapshot.
+
+    Loaded on first use and reloaded when the file changes, so a snapshot
+    refreshed by a scheduled `python analytics.py` run is picked up by
+    all workers.
+    """
+
+    def __init__(self, path: str = ANALYTICS_SNAPSHOT_PATH):
+        self.path = path
+        self._snapshot = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self) -> InjurySnapshot:
+        """Current snapshot (empty if none has been built)."""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        with self._lock:
+            if self._snapshot is None or mtime != self._mtime:
+                self._snapshot = InjurySnapshot.load(self.path)
+                self._mtime = mtime
+            return self._snapshot
+
+    def refresh(self, firebase_service, full: bool = False) -> Dict:
+        """
+        Refresh the snapshot from Firestore and save it.
+
+        Args:
+            firebase_service: FirebaseService
+            full: Rebuild from scratch
+
+        Returns:
+            refresh_snapshot's result
+        """
+        with self._lock:
+            snapshot = InjurySnapshot.load(self.path)
+            result = refresh_snapshot(firebase_service, snapshot, full)
+            snapshot.save(self.path)
+            self._snapshot = snapshot
+            self._mtime = os.path.getmtime(self.path)
+        return result
+
+
+def print_report(snapshot: InjurySnapshot, period: str):
+    """Print the analytics report for a snapshot."""
+    summary = snapshot_summary(snapshot)
+    print(f"Records: {summary['records']}   Users: {summary['users']}   "
+          f"Snapshot memory: {summary['memory_mb']} MB")
+    print(f"Records created {summary['first_record']} .. {summary['last_record']}")
+
+    print("-" * 50)
+    print(f"Severity mix per {period} (last 8)")
+    for row in severity_mix(snapshot, period)[-8:]:
+        shares = '  '.join(f"{name} {share:5.1%}" for name, share in row['shares'].items())
+        print(f"  {row['period']}  {row['records']:>8}  {shares}")
+
+    print("-" * 50)
+    print("Confidence")
+    for name, group in confidence_distribution(snapshot)['groups'].items():
+        if group['records']:
+            p = group['percentiles']
+            print(f"  {name:<10} n={group['records']:<8} mean {group['mean']:.3f}  "
+                  f"p10 {p['p10']:.3f}  p50 {p['p50']:.3f}  p90 {p['p90']:.3f}")
+
+    print("-" * 50)
+    print("Status funnel")
+    funnel = status_funnel(snapshot)
+    for stage in funnel['funnel']:
+        print(f"  {stage['stage']:<10} {stage['records']:>8}  {stage['share']:.1%}")
+    print(f"  Median days to resolved: {funnel['median_days_to_resolved']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Refresh the analytics snapshot and report fleet-wide statistics')
+    parser.add_argument('--path', default=ANALYTICS_SNAPSHOT_PATH,
+                        help=f'Snapshot file (default: {ANALYTICS_SNAPSHOT_PATH})')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild the snapshot instead of applying changes')
+    parser.add_argument('--no-refresh', action='store_true',
+                        help='Report on the saved snapshot without reading Firestore')
+    parser.add_argument('--period', choices=PERIODS, default='week',
+                        help='Period of the severity mix (default: week)')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Injury Tracker - Analytics Snapshot")
+    print("=" * 50)
+
+    store = SnapshotStore(args.path)
+    if not args.no_refresh:
+        from firebase_service import FirebaseService
+
+        start = time.perf_counter()
+        result = store.refresh(FirebaseService(), full=args.full)
+        print(f"{'Rebuilt' if result['full'] else 'Refreshed'} in {time.perf_counter() - start:.1f}s: "
+              f"{result['changed']} changed, {result['deleted']} deleted, {result['rows']} rows")
+
+    print_report(store.get(), args.period)
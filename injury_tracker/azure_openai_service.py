@@ -70,6 +70,7 @@ class FirstAidRecommendation:
                 'wound_type': wound_type,
                 'recommendations': parsed_recommendations,
                 'emergency_info': self._get_emergency_info(severity),
+                'fallback': False,
                 'disclaimer': 'This is AI-generated first aid guidance. For serious injuries, always seek professional medical help immediately.'
             }
             
@@ -77,7 +78,7 @@ class FirstAidRecommendation:
             
         except Exception as e:
             # Fallback to basic recommendations if API fails
-            return self._get_fallback_recommendations(severity, confidence, wound_type)
+            return self.fallback_recommendations(severity, confidence, wound_type)
     
     def _create_prompt(self, severity: str, wound_type: str) -> str:
         """Create a detailed prompt for Azure OpenAI."""
@@ -168,13 +169,26 @@ class FirstAidRecommendation:
         
         return emergency_info.get(severity, emergency_info['moderate'])
     
-    def _get_fallback_recommendations(
+    def fallback_recommendations(
         self,
         severity: str,
         confidence: float,
-        wound_type: str
+        wound_type: str = "general wound"
     ) -> Dict[str, any]:
-        """Provide basic fallback recommendations if API fails."""
+        """
+        Get the static first aid recommendations, without calling the API.
+        
+        Used when the API fails, and by callers that cannot wait for it
+        (e.g. when the recommendation stage is overloaded).
+        
+        Args:
+            severity: Wound severity (mild, moderate, severe)
+            confidence: Confidence score of the prediction
+            wound_type: Type of wound (optional)
+            
+        Returns:
+            Dictionary in the same shape as get_recommendations
+        """
         fallback = {
             'mild': {
                 'immediate_actions': 'Clean the wound with clean water or saline solution.',
@@ -258,5 +272,6 @@ class FirstAidRecommendation:
             'wound_type': wound_type,
             'recommendations': recommendations,
             'emergency_info': self._get_emergency_info(severity),
+            'fallback': True,  # Static text, shared by every record of this severity
             'disclaimer': 'This is basic first aid guidance. For serious injuries, always seek professional medical help immediately.'
         }
@@ -0,0 +1,225 @@
+"""
+Offline batch scoring for the wound classifier.
+Scores every image under a directory tree without going through the HTTP API,
+e.g. for a clinical audit or to check a new model against dataset/.
+
+Images are decoded in a process pool while the model runs on large batches,
+and results are streamed to CSV or NDJSON as they are produced. When images
+sit in folders named after a class (mild/, moderate/, severe/) the folder name
+is used as the label and a confusion matrix and per-class metrics are printed.
+
+Usage:
+    python batch_score.py ./dataset                          # Print metrics only
+    python batch_score.py ./audit_images --output results.csv
+    python batch_score.py ./dataset --output results.ndjson --workers 8 --batch-size 128
+    python batch_score.py --shards ./dataset_shards           # Score preprocessed shards (no decode)
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from image_io import IMAGE_EXTENSIONS, decode_image
+
+
+def find_images(root: str) -> List[str]:
+    """Recursively list image files under a directory, sorted."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(dirpath, filename))
+    return paths
+
+
+def _decode_chunk(args: Tuple[List[str], Tuple[int, int]]) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """
+    Process pool worker: decode a chunk of images.
+
+    Returns:
+        Tuple of (stacked uint8 images, per-image error message or None).
+        Images that fail to decode are left as zeros.
+    """
+    paths, size = args
+    images = np.zeros((len(paths), size[0], size[1], 3), dtype=np.uint8)
+    errors = []
+    for i, path in enumerate(paths):
+        try:
+            images[i] = decode_image(path, size)
+            errors.append(None)
+        except Exception as e:
+            errors.append(str(e))
+    return images, errors
+
+
+def decode_in_parallel(
+    paths: List[str],
+    size: Tuple[int, int],
+    batch_size: int,
+    workers: int = None
+) -> Iterator[Tuple[List[str], np.ndarray, List[Optional[str]]]]:
+    """
+    Decode images in a process pool, yielding batches in input order.
+
+    At most two batches per worker are in flight, so memory use does not grow
+    with the number of images.
+
+    Yields:
+        Tuples of (paths, uint8 images, errors)
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = (paths[i:i + batch_size] for i in range(0, len(paths), batch_size))
+    pending = deque()
+
+    # Spawned, not forked: forking after TensorFlow has started its threads
+    # can deadlock the children. Workers import only image_io (no TensorFlow),
+    # so they start quickly and stay small.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(_decode_chunk, (chunk, size))))
+            if len(pending) >= workers * 2:
+                chunk, future = pending.popleft()
+                yield (chunk,) + future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield (chunk,) + future.result()
+
+
+class ResultWriter:
+    """Stream prediction rows to a CSV or NDJSON file."""
+
+    def __init__(self, path: str, class_names: List[str]):
+        self.path = path
+        self.class_names = class_names
+        self.format = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+        self.file = open(path, 'w', newline='')
+
+        if self.format == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(['path', 'label', 'severity', 'confidence']
+                                 + [f'p_{name}' for name in class_names] + ['error'])
+
+    def write(self, path: str, label: Optional[str], prediction: Optional[dict], error: Optional[str]):
+        if self.format == 'ndjson':
+            row = {'path': path, 'label': label, 'error': error}
+            if prediction:
+                row.update(prediction)
+            self.file.write(json.dumps(row) + '\n')
+        elif prediction:
+            self.writer.writerow([path, label or '', prediction['severity'],
+                                  f"{prediction['confidence']:.6f}"]
+                                 + [f"{prediction['probabilities'][name]:.6f}" for name in self.class_names]
+                                 + [''])
+        else:
+            self.writer.writerow([path, label or '', '', ''] + [''] * len(self.class_names) + [error])
+
+    def close(self):
+        self.file.close()
+
+
+def _label_from_path(path: str, class_names: List[str]) -> Optional[str]:
+    folder = os.path.basename(os.path.dirname(path))
+    return folder if folder in class_names else None
+
+
+def score(args):
+    """Run batch scoring for the parsed command line arguments."""
+    from ml_model import WoundClassifier
+    from metrics import evaluate_predictions, print_report
+
+    classifier = WoundClassifier(args.model)
+    class_names = classifier.class_names
+    size = (classifier.img_height, classifier.img_width)
+
+    if args.shards:
+        from dataset_shards import ShardedDataset
+
+        shards = ShardedDataset(args.shards)
+        if shards.img_size != size:
+            raise SystemExit(f"Shards are {shards.img_size}, model expects {size}")
+        paths = [os.path.join(args.shards, path) for path in shards.paths]
+
+        def batches():
+            for start in range(0, len(shards), args.batch_size):
+                indices = np.arange(start, min(start + args.batch_size, len(shards)))
+                yield [paths[i] for i in indices], shards.take(indices), [None] * len(indices)
+    else:
+        paths = find_images(args.directory)
+
+        def batches():
+            return decode_in_parallel(paths, size, args.batch_size, args.workers)
+
+    print(f"Scoring {len(paths)} images with batch size {args.batch_size}...")
+    writer = ResultWriter(args.output, class_names) if args.output else None
+
+    labels, predicted = [], []
+    failed = 0
+    inference_seconds = 0.0
+    start = time.perf_counter()
+
+    for batch_paths, images, errors in batches():
+        ok = [i for i, error in enumerate(errors) if error is None]
+        failed += len(errors) - len(ok)
+
+        inference_start = time.perf_counter()
+        predictions = dict(zip(ok, classifier.predict_batch(images[ok], args.batch_size)))
+        inference_seconds += time.perf_counter() - inference_start
+
+        for i, path in enumerate(batch_paths):
+            label = _label_from_path(path, class_names)
+            prediction = predictions.get(i)
+            if writer:
+                writer.write(path, label, prediction, errors[i])
+            if label and prediction:
+                labels.append(class_names.index(label))
+                predicted.append(class_names.index(prediction['severity']))
+
+    elapsed = time.perf_counter() - start
+    if writer:
+        writer.close()
+
+    scored = len(paths) - failed
+    print("-" * 50)
+    print(f"Scored {scored} images in {elapsed:.2f}s ({failed} failed to decode)")
+    print(f"Throughput: {scored / elapsed:.1f} images/sec "
+          f"(inference alone: {scored / max(inference_seconds, 1e-9):.1f} images/sec)")
+    if writer:
+        print(f"Results written to {args.output}")
+
+    if labels:
+        print("-" * 50)
+        print_report(evaluate_predictions(np.array(labels), np.array(predicted), class_names),
+                     class_names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Batch score wound images')
+    parser.add_argument('directory', nargs='?', default='./dataset',
+                        help='Directory tree of images (default: ./dataset)')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', './models/wound_classifier.h5'),
+                        help='Model path (default: $MODEL_PATH or ./models/wound_classifier.h5)')
+    parser.add_argument('--output', default=None,
+                        help='Write per-image results to this .csv or .ndjson file')
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help='Decode and inference batch size (default: 64)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Decode processes (default: CPU count)')
+    parser.add_argument('--shards', default=None,
+                        help='Score a preprocessed shard directory instead of decoding files')
+    args = parser.parse_args()
+
+    if not args.shards and not os.path.isdir(args.directory):
+        parser.error(f"Directory not found: {args.directory}")
+    if not os.path.exists(args.model):
+        parser.error(f"Model not found: {args.model}. Run train_model.py first.")
+
+    score(args)
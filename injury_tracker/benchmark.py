@@ -0,0 +1,1770 @@
+"""
+Performance benchmarks for the injury tracker backend.
+Run these locally to compare implementations before and after a change.
+
+Usage:
+    python benchmark.py input-pipeline                    # ImageDataGenerator vs tf.data
+    python benchmark.py input-pipeline --epochs 3 --batch-size 16
+    python benchmark.py input-pipeline --shards ./dataset_shards
+    python benchmark.py upload-ingest                     # Peak RSS per 10 MB upload, before/after
+    python benchmark.py upload-ingest --size-mb 20 --requests 5
+    python benchmark.py adversarial-images                # Worst-case decode cost, before/after probe
+    python benchmark.py compact-upload                    # Full vs pre-resized vs raw uploads
+    python benchmark.py compact-upload --uplink-mbps 1 --images 100
+    python benchmark.py near-duplicates                   # Index search latency and detection rate
+    python benchmark.py dashboard                         # History screen round trips, bytes and open time
+    python benchmark.py dashboard --rtt-ms 300 --records 500
+    python benchmark.py conditional-get                   # Refresh bandwidth/latency with gzip and ETags
+    python benchmark.py json-serialization                # Response serialization cost, stock vs fast path
+    python benchmark.py export                            # History export memory and time to first byte
+    python benchmark.py export --sizes 1000 20000 --format csv
+    python benchmark.py analytics                         # Fleet-wide aggregates, record loop vs snapshot
+    python benchmark.py analytics --rows 3000000
+    python benchmark.py timeseries                        # Trend chart from raw records vs daily rollups
+    python benchmark.py auth                              # Per-request token verification cost
+    python benchmark.py overload                          # Analyze burst above capacity, with/without admission control
+    python benchmark.py model-swap                        # Deploying a model version: restart vs hot swap
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+
+def _print_header(title: str):
+    """Print a section header."""
+    print("=" * 50)
+    print(title)
+    print("=" * 50)
+
+
+def _images_per_second(batches, max_batches: int = None) -> float:
+    """Iterate over batches and return the throughput in images/sec."""
+    images = 0
+    start = time.perf_counter()
+    for i, (batch, _) in enumerate(batches):
+        images += len(batch)
+        if max_batches and i + 1 >= max_batches:
+            break
+    return images / (time.perf_counter() - start)
+
+
+def benchmark_input_pipeline(data_dir: str, epochs: int, batch_size: int, shard_dir: str = None):
+    """
+    Compare ImageDataGenerator with the tf.data input pipeline.
+
+    Args:
+        data_dir: Dataset directory (mild/, moderate/, severe/)
+        epochs: Number of passes over the training subset
+        batch_size: Batch size
+        shard_dir: Also measure tf.data reading from these dataset shards
+    """
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    from ml_model import WoundClassifier
+
+    classifier = WoundClassifier()
+
+    _print_header("Input pipeline: ImageDataGenerator vs tf.data")
+    print(f"CPU cores: {os.cpu_count()}")
+
+    datagen = ImageDataGenerator(
+        rescale=1./255,
+        rotation_range=20,
+        width_shift_range=0.2,
+        height_shift_range=0.2,
+        horizontal_flip=True,
+        zoom_range=0.2,
+        validation_split=0.2
+    )
+    generator = datagen.flow_from_directory(
+        data_dir,
+        target_size=(224, 224),
+        batch_size=batch_size,
+        class_mode='categorical',
+        subset='training'
+    )
+
+    train_ds, _ = classifier.build_datasets(data_dir, batch_size)
+    shard_ds = None
+    if shard_dir:
+        shard_ds, _ = classifier.build_datasets(data_dir, batch_size, shard_dir=shard_dir)
+
+    print()
+    print(f"{'Epoch':<8}{'ImageDataGenerator':>22}{'tf.data':>14}{'shards':>14}")
+    for epoch in range(1, epochs + 1):
+        generator_rate = _images_per_second(generator, max_batches=len(generator))
+        dataset_rate = _images_per_second(train_ds)
+        line = f"{epoch:<8}{generator_rate:>16.1f} img/s{dataset_rate:>8.1f} img/s"
+        if shard_ds is not None:
+            line += f"{_images_per_second(shard_ds):>8.1f} img/s"
+        print(line)
+    print()
+    print("Epoch 1 includes decoding; later tf.data epochs read from the cache.")
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    import resource
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _noise_png(size_mb: float) -> bytes:
+    """A PNG of random noise (incompressible, so the file is about size_mb)."""
+    import io
+    import numpy as np
+    from PIL import Image
+
+    side = int((size_mb * 1024 * 1024 / 3) ** 0.5)
+    pixels = np.random.default_rng(0).integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def _multipart_body(payload: bytes, boundary: bytes, content_type: str = 'image/png') -> bytes:
+    """Wrap a payload as a single-file multipart/form-data body."""
+    return (b'--' + boundary + b'\r\n'
+            b'Content-Disposition: form-data; name="file"; filename="wound"\r\n'
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n'
+            + payload + b'\r\n--' + boundary + b'--\r\n')
+
+
+async def _post_upload(app, path: str, body: bytes, boundary: bytes, chunk_size: int = 64 * 1024) -> int:
+    """Stream a multipart body through the ASGI app in chunks and return the status code."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': b'', 'client': ('127.0.0.1', 1), 'server': ('127.0.0.1', 8000),
+        'headers': [(b'content-type', b'multipart/form-data; boundary=' + boundary),
+                    (b'content-length', str(len(body)).encode())]
+    }
+    view = memoryview(body)
+    offsets = iter(range(0, len(body), chunk_size))
+    status = {}
+
+    async def receive():
+        offset = next(offsets, None)
+        if offset is None:
+            return {'type': 'http.disconnect'}
+        chunk = bytes(view[offset:offset + chunk_size])
+        return {'type': 'http.request', 'body': chunk, 'more_body': offset + chunk_size < len(body)}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    await app(scope, receive, send)
+    return status.get('code')
+
+
+def _upload_ingest_worker(mode: str, size_mb: float, requests: int) -> dict:
+    """Serve uploads with the old (buffered) or new (streaming) ingest in this process."""
+    import asyncio
+    import hashlib
+    import io
+    from fastapi import FastAPI, File, UploadFile
+    from ml_model import decode_image
+    from upload_ingest import (MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES,
+                               UploadSizeLimitMiddleware, ingest_upload)
+
+    app = FastAPI()
+
+    if mode == 'buffered':
+        @app.post('/upload')
+        async def upload_buffered(file: UploadFile = File(...)):
+            image_bytes = await file.read()
+            image_hash = hashlib.sha256(image_bytes).hexdigest()
+            decode_image(io.BytesIO(image_bytes), (224, 224))
+            return {'hash': image_hash}
+    else:
+        app.add_middleware(UploadSizeLimitMiddleware,
+                           max_body_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+                           paths=['/upload'])
+
+        @app.post('/upload')
+        async def upload_streaming(file: UploadFile = File(...)):
+            upload = await ingest_upload(file)
+            decode_image(upload.stream, (224, 224))
+            return {'hash': upload.sha256}
+
+    # The request body is built up front (it plays the client's socket buffer)
+    # and one small upload warms up imports and code paths before the baseline
+    boundary = b'benchmarkboundary'
+    payload = _noise_png(size_mb)
+    body = _multipart_body(payload, boundary)
+    asyncio.run(_post_upload(app, '/upload', _multipart_body(_noise_png(0.1), boundary), boundary))
+    baseline = _peak_rss_mb()
+
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = asyncio.run(_post_upload(app, '/upload', body, boundary))
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert status == 200, f"upload failed with status {status}"
+
+    return {
+        'upload_mb': len(payload) / (1024 * 1024),
+        'peak_rss_increase_mb': _peak_rss_mb() - baseline,
+        'latency_ms': sorted(latencies)[len(latencies) // 2]
+    }
+
+
+def benchmark_upload_ingest(size_mb: float, requests: int):
+    """
+    Compare peak RSS per request for buffered and streaming upload ingest.
+
+    Each mode runs in a fresh process so the peak-RSS high-water marks are
+    independent. The payload is a noise PNG, so decode work is the same in
+    both modes and the difference is the copies of the upload itself.
+
+    Args:
+        size_mb: Upload size in MB
+        requests: Sequential uploads per mode
+    """
+    _print_header("Upload ingest: buffered vs streaming")
+    print(f"Spool threshold: {os.getenv('UPLOAD_SPOOL_BYTES', 1024 * 1024)} bytes")
+    print()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'Mode':<12}{'upload MB':>12}{'peak RSS +MB':>15}{'p50 ms':>10}")
+    for mode in ('buffered', 'streaming'):
+        with context.Pool(1) as pool:
+            result = pool.apply(_upload_ingest_worker, (mode, size_mb, requests))
+        print(f"{mode:<12}{result['upload_mb']:>12.1f}{result['peak_rss_increase_mb']:>15.1f}"
+              f"{result['latency_ms']:>10.1f}")
+    print()
+    print("Peak RSS increase is measured over the warmed-up baseline of each process.")
+
+
+def _write_adversarial_images(directory: str) -> list:
+    """
+    Write worst-case uploads: tiny files that claim huge dimensions, plus a
+    normal phone photo and a non-image for reference.
+
+    Returns:
+        List of (case name, path)
+    """
+    import numpy as np
+    from PIL import Image
+
+    cases = []
+
+    # 1-bit PNG just under PIL's own bomb guard: ~20 KB file, ~500 MB as RGB
+    path = os.path.join(directory, 'png_bomb.png')
+    Image.new('1', (13000, 13000)).save(path, optimize=True)
+    cases.append(('13000x13000 PNG', path))
+
+    # Flat grey JPEG: small file, 144 megapixels
+    path = os.path.join(directory, 'huge.jpg')
+    Image.new('L', (12000, 12000), 128).save(path, quality=50)
+    cases.append(('12000x12000 JPEG', path))
+
+    gradient = np.linspace(0, 255, 4032, dtype=np.uint8)
+    path = os.path.join(directory, 'photo.jpg')
+    Image.fromarray(np.stack([np.tile(gradient, (3024, 1))] * 3, axis=-1)).save(path, quality=90)
+    cases.append(('4032x3024 JPEG', path))
+
+    path = os.path.join(directory, 'garbage.jpg')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(1024 * 1024))
+    cases.append(('1 MB garbage', path))
+
+    return cases
+
+
+def _tiny_png():
+    import io
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+
+def _decode_cost_worker(mode: str, path: str) -> dict:
+    """Decode one image as the API did before (full decode) or does now (probe first)."""
+    import numpy as np
+    from PIL import Image
+    import warnings
+    from ml_model import ImageTooLargeError, UnsupportedImageError, decode_image, probe_image
+
+    warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+    # Warm up imports and code paths before the baseline
+    decode_image(_tiny_png(), (224, 224))
+    baseline = _peak_rss_mb()
+
+    start = time.perf_counter()
+    with open(path, 'rb') as stream:
+        try:
+            if mode == 'before':
+                image = Image.open(stream).convert('RGB').resize((224, 224))
+                np.asarray(image, dtype=np.uint8)
+            else:
+                probe_image(stream)
+                decode_image(stream, (224, 224))
+            outcome = 'decoded'
+        except UnsupportedImageError:
+            outcome = 'rejected 415'
+        except ImageTooLargeError:
+            outcome = 'rejected 422'
+        except Exception as e:
+            outcome = f"error ({type(e).__name__})"
+
+    return {
+        'ms': (time.perf_counter() - start) * 1000,
+        'peak_rss_increase_mb': _peak_rss_mb() - baseline,
+        'outcome': outcome
+    }
+
+
+def benchmark_adversarial_images():
+    """
+    Compare the worst-case cost of one image decode without and with the header probe.
+
+    Each case runs in a fresh process so the peak-RSS measurements are
+    independent.
+    """
+    import tempfile
+
+    _print_header("Adversarial images: full decode vs header probe")
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        cases = _write_adversarial_images(directory)
+        print(f"{'Case':<20}{'file KB':>9}{'mode':>8}{'ms':>9}{'peak RSS +MB':>14}  outcome")
+        for name, path in cases:
+            size_kb = os.path.getsize(path) / 1024
+            for mode in ('before', 'after'):
+                with context.Pool(1) as pool:
+                    result = pool.apply(_decode_cost_worker, (mode, path))
+                print(f"{name:<20}{size_kb:>9.0f}{mode:>8}{result['ms']:>9.1f}"
+                      f"{result['peak_rss_increase_mb']:>14.1f}  {result['outcome']}")
+
+
+def _compact_payloads(path: str, size: tuple) -> dict:
+    """
+    Encode one dataset image the ways a client can upload it.
+
+    Returns:
+        Dict of path name -> (content type, payload bytes)
+    """
+    import io
+    from PIL import Image
+
+    image = Image.open(path).convert('RGB')
+    small = image.resize((size[1], size[0]), Image.BICUBIC)
+
+    def encoded(picture, image_format, **options):
+        buffer = io.BytesIO()
+        picture.save(buffer, format=image_format, **options)
+        return buffer.getvalue()
+
+    return {
+        # What the app sends today: the picker output, at most 1024 px, quality 85
+        'full JPEG': ('image/jpeg', encoded(image.resize((1024, 1024), Image.BICUBIC), 'JPEG', quality=85)),
+        'compact JPEG': ('image/jpeg', encoded(small, 'JPEG', quality=90)),
+        'compact WebP': ('image/webp', encoded(small, 'WEBP', quality=90)),
+        'raw RGB': ('application/octet-stream', small.tobytes())
+    }
+
+
+def benchmark_compact_upload(data_dir: str, model_path: str, images: int, uplink_mbps: float):
+    """
+    Compare bytes on the wire and end-to-end latency of full-size and compact uploads.
+
+    Server time runs the analyze path up to and including inference (upload
+    ingest, probe, decode, quality gate, model) through the ASGI stack; upload
+    time is estimated from the wire size at the given uplink bandwidth.
+
+    Args:
+        data_dir: Dataset directory (mild/, moderate/, severe/)
+        model_path: Model to serve
+        images: Number of dataset images to send per path
+        uplink_mbps: Client uplink bandwidth in Mbit/s
+    """
+    import asyncio
+    import numpy as np
+    from fastapi import FastAPI, File, UploadFile
+    from image_quality import assess_quality
+    from ml_model import WoundClassifier, list_dataset_files
+    from upload_ingest import read_model_input
+
+    classifier = WoundClassifier(model_path)
+    size = (classifier.img_height, classifier.img_width)
+    paths, _ = list_dataset_files(data_dir, classifier.class_names)
+    paths = paths[::max(1, len(paths) // images)][:images]
+
+    app = FastAPI()
+    served = []
+
+    @app.post('/analyze')
+    async def analyze(file: UploadFile = File(...)):
+        image, upload = await read_model_input(file, size)
+        assess_quality(image)
+        prediction = classifier.predict_array(image)
+        served.append(prediction['severity'])
+        return prediction
+
+    _print_header("Upload size: full-size vs compact uploads")
+    print(f"Model input: {size[0]}x{size[1]}, uplink: {uplink_mbps} Mbit/s, images: {len(paths)}")
+
+    boundary = b'benchmarkboundary'
+    results = {}
+    predictions = {}
+    for path in paths:
+        for name, (content_type, payload) in _compact_payloads(path, size).items():
+            body = _multipart_body(payload, boundary, content_type)
+
+            start = time.perf_counter()
+            status = asyncio.run(_post_upload(app, '/analyze', body, boundary))
+            server_ms = (time.perf_counter() - start) * 1000
+            assert status == 200, f"{name} upload failed with status {status}"
+
+            results.setdefault(name, []).append((len(body), server_ms))
+            predictions.setdefault(name, []).append(served[-1])
+
+    print()
+    print(f"{'Path':<16}{'wire KB':>10}{'upload ms':>11}{'server ms':>11}{'total ms':>10}{'agree':>8}")
+    for name, rows in results.items():
+        wire_kb = np.mean([row[0] for row in rows]) / 1024
+        upload_ms = wire_kb * 1024 * 8 / (uplink_mbps * 1e6) * 1000
+        server_ms = np.median([row[1] for row in rows])
+        agreement = np.mean([a == b for a, b in zip(predictions[name], predictions['full JPEG'])])
+        print(f"{name:<16}{wire_kb:>10.1f}{upload_ms:>11.0f}{server_ms:>11.1f}"
+              f"{upload_ms + server_ms:>10.0f}{agreement:>8.1%}")
+    print()
+    print("'agree' is the share of predictions matching the full-size upload.")
+
+
+def benchmark_near_duplicates(data_dir: str, entries: int, searches: int):
+    """
+    Measure near-duplicate search latency and how well edited copies are detected.
+
+    Args:
+        data_dir: Dataset directory (mild/, moderate/, severe/)
+        entries: Hashes in the user index for the latency measurement
+        searches: Number of timed searches
+    """
+    import io
+    import numpy as np
+    from datetime import datetime
+    from PIL import Image
+    from ml_model import decode_image, list_dataset_files
+    from near_duplicates import DUPLICATE_MAX_DISTANCE, DuplicateIndex, format_hash, perceptual_hash
+
+    _print_header("Near-duplicate index")
+
+    rng = np.random.default_rng(0)
+    now = datetime.utcnow().isoformat()
+    stored = [(f"record-{i}", format_hash(int(value)), now) for i, value in
+              enumerate(rng.integers(0, 2 ** 63, entries, dtype=np.int64))]
+    index = DuplicateIndex(lambda user_id: stored)
+    index.find('user', 0)  # Load the index
+
+    queries = [int(value) for value in rng.integers(0, 2 ** 63, searches, dtype=np.int64)]
+    start = time.perf_counter()
+    for value in queries:
+        index.find('user', value)
+    search_us = (time.perf_counter() - start) / searches * 1e6
+    print(f"Search over {entries} hashes: {search_us:.1f} us")
+
+    def edited(path, crop=0.0, quality=85, gain=1.0):
+        image = Image.open(path).convert('RGB')
+        width, height = image.size
+        dx, dy = int(width * crop / 2), int(height * crop / 2)
+        image = image.crop((dx, dy, width - dx, height - dy))
+        if gain != 1.0:
+            image = Image.fromarray(np.clip(np.asarray(image) * gain, 0, 255).astype(np.uint8))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        buffer.seek(0)
+        return perceptual_hash(decode_image(buffer, (224, 224)))
+
+    paths, _ = list_dataset_files(data_dir, ['mild', 'moderate', 'severe'])
+    if not paths:
+        return
+
+    originals = {path: perceptual_hash(decode_image(path, (224, 224))) for path in paths}
+    variants = {
+        're-encoded (JPEG 60)': lambda path: edited(path, quality=60),
+        'cropped 5%': lambda path: edited(path, crop=0.05),
+        'cropped 10%': lambda path: edited(path, crop=0.10),
+        'brightened 15%': lambda path: edited(path, gain=1.15)
+    }
+
+    print(f"Detection at max distance {DUPLICATE_MAX_DISTANCE} over {len(paths)} dataset photos:")
+    for name, make in variants.items():
+        detected = 0
+        for path in paths:
+            index = DuplicateIndex(lambda user_id: [(path, format_hash(originals[path]), now)])
+            detected += index.find('user', make(path)) is not None
+        print(f"  {name:<24}{detected / len(paths):>8.1%}")
+
+    # Distinct dataset photos matching each other (includes real duplicates in the dataset)
+    all_photos = DuplicateIndex(lambda user_id: [(path, format_hash(value), now)
+                                                 for path, value in originals.items()])
+    all_photos.find('user', 0)
+    matches = 0
+    for path, value in originals.items():
+        all_photos.remove('user', path)
+        matches += all_photos.find('user', value) is not None
+        all_photos.add('user', path, value)
+    print(f"  {'other dataset photos':<24}{matches / len(paths):>8.1%}")
+
+
+class _StandInFirebase:
+    """
+    In-memory FirebaseService with simulated Firestore latency.
+
+    Every query costs query_ms plus doc_ms per document returned; count
+    aggregations cost one query and no documents.
+    """
+
+    def __init__(self, records: int, query_ms: float, doc_ms: float):
+        from datetime import datetime, timedelta
+        from azure_openai_service import FirstAidRecommendation
+
+        first_aid = FirstAidRecommendation.__new__(FirstAidRecommendation)  # Fallback text only, no Azure client
+        severities = ['mild', 'moderate', 'severe']
+        now = datetime.utcnow()
+        self.query_ms = query_ms
+        self.doc_ms = doc_ms
+        self.version = 0
+        self.records = []
+        for i in range(records):
+            severity = severities[i % 3]
+            advice = first_aid.fallback_recommendations(severity, 0.9, 'general wound')
+            created = (now - timedelta(hours=i)).isoformat()
+            self.records.append({
+                'id': f"record-{i:05d}",
+                'userId': 'user',
+                'imageHash': f"{i:064x}",
+                'severity': severity,
+                'confidence': 0.9,
+                'probabilities': {name: 0.05 for name in severities},
+                'recommendations': advice['recommendations'],
+                'emergencyInfo': advice['emergency_info'],
+                'status': 'active',
+                'createdAt': created,
+                'updatedAt': created
+            })
+
+    def _read(self, documents: int):
+        time.sleep((self.query_ms + self.doc_ms * documents) / 1000)
+
+    def get_injury_records(self, user_id: str, limit: int = 50, fields: list = None) -> list:
+        records = self.records[:limit]
+        self._read(len(records))
+        return [dict({field: record[field] for field in (fields or record) if field in record}, id=record['id'])
+                for record in records]
+
+    def iter_injury_records(self, user_id: str, page_size: int = 200):
+        import copy
+
+        for start in range(0, len(self.records), page_size):
+            # Fresh objects per page, as decoding Firestore documents creates
+            page = copy.deepcopy(self.records[start:start + page_size])
+            self._read(len(page))
+            yield from page
+
+    def get_injury_changes(self, user_id: str, after: str = None, limit: int = 100, fields: list = None,
+                           after_id: str = None) -> list:
+        cursor = (after, after_id or '\uffff')
+        changed = sorted((record for record in self.records
+                          if after is None or (record['updatedAt'], record['id']) > cursor),
+                         key=lambda record: (record['updatedAt'], record['id']))[:limit]
+        self._read(len(changed))
+        return [dict({field: record[field] for field in (fields or record) if field in record}, id=record['id'])
+                for record in changed]
+
+    def get_tombstones(self, user_id: str, after: str = None) -> list:
+        self._read(0)
+        return []
+
+    def get_injury_by_id(self, injury_id: str):
+        self._read(1)
+        return next((dict(record) for record in self.records if record['id'] == injury_id), None)
+
+    def count_injuries(self, user_id: str, severity: str = None) -> int:
+        self._read(0)
+        return sum(1 for record in self.records if severity in (None, record['severity']))
+
+    def get_user_version(self, user_id: str) -> int:
+        self._read(1)
+        return self.version
+
+    def get_rollups(self, user_id: str, start: str, end: str) -> list:
+        from collections import Counter
+
+        rollups = {}
+        for record in self.records:
+            day = record['createdAt'][:10]
+            if start <= day <= end:
+                rollup = rollups.setdefault(day, {'date': day, 'total': 0, 'severity': Counter(), 'status': Counter()})
+                rollup['total'] += 1
+                rollup['severity'][record['severity']] += 1
+                rollup['status'][record['status']] += 1
+        self._read(len(rollups))
+        return [rollups[day] for day in sorted(rollups)]
+
+    def update_injury_status(self, injury_id: str, user_id: str, status: str, notes: str = None):
+        from datetime import datetime
+
+        record = next(record for record in self.records if record['id'] == injury_id)
+        record.update(status=status, updatedAt=datetime.utcnow().isoformat())
+        self.version += 1
+
+
+def _stand_in_app(firebase, conditional: bool = False):
+    """
+    FastAPI app serving the history screen endpoints from a stand-in Firebase.
+
+    With conditional, the list, details and statistics endpoints answer
+    If-None-Match and responses are gzip-compressed, as in main.py.
+    """
+    from fastapi import FastAPI, Request, Response
+    from fastapi.middleware.gzip import GZipMiddleware
+    from dashboard import build_dashboard
+    from http_cache import conditional_response
+
+    app = FastAPI()
+    if conditional:
+        app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
+    def not_modified(request, response):
+        if conditional:
+            return conditional_response(request, response, 'user', firebase.get_user_version('user'))
+
+    @app.get("/api/v1/injuries")
+    def get_injuries(request: Request, response: Response, limit: int = 50):
+        return not_modified(request, response) or firebase.get_injury_records('user', limit)
+
+    @app.get("/api/v1/injuries/{injury_id}")
+    def get_injury_details(injury_id: str, request: Request, response: Response):
+        return not_modified(request, response) or firebase.get_injury_by_id(injury_id)
+
+    @app.get("/api/v1/statistics")
+    def get_statistics_scan(request: Request, response: Response):
+        cached = not_modified(request, response)
+        if cached:
+            return cached
+        # Previous implementation: read up to 1000 records and count in Python
+        breakdown = {'mild': 0, 'moderate': 0, 'severe': 0}
+        records = firebase.get_injury_records('user', limit=1000)
+        for record in records:
+            breakdown[record['severity']] += 1
+        return {'total_injuries': len(records), 'severity_breakdown': breakdown, 'user_id': 'user'}
+
+    @app.get("/api/v1/dashboard")
+    async def get_dashboard(limit: int = 20, since: str = None):
+        return await build_dashboard(firebase, 'user', limit, since)
+
+    return app
+
+
+def _latency_transport(app, rtt_ms: float, downlink_mbps: float = None):
+    """
+    httpx transport to an ASGI app that adds network latency to every request.
+
+    Each request costs rtt_ms, plus the time to receive the response body
+    (as sent, i.e. compressed) at downlink_mbps. round_trips and wire_bytes
+    are counted on the returned transport.
+    """
+    import asyncio
+    import httpx
+
+    class LatencyTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self.inner = httpx.ASGITransport(app=app)
+            self.round_trips = 0
+            self.wire_bytes = 0
+
+        async def handle_async_request(self, request):
+            self.round_trips += 1
+            response = await self.inner.handle_async_request(request)
+            body = b"".join([chunk async for chunk in response.stream])
+            self.wire_bytes += len(body)
+            delay = rtt_ms / 1000
+            if downlink_mbps:
+                delay += len(body) * 8 / (downlink_mbps * 1e6)
+            await asyncio.sleep(delay)
+            return httpx.Response(response.status_code, headers=response.headers, content=body)
+
+    return LatencyTransport()
+
+
+def benchmark_dashboard(records: int, rtt_ms: float, query_ms: float, doc_ms: float, runs: int):
+    """
+    Compare opening the history screen with separate calls vs the dashboard endpoint.
+
+    The client adds rtt_ms of network latency to every request; the backend is
+    a stand-in Firestore with query_ms per query and doc_ms per document read.
+    A reopen sends the sync token of the previous open after one record changed.
+
+    Args:
+        records: Records stored for the user
+        rtt_ms: Client round-trip time in ms
+        query_ms: Simulated Firestore latency per query in ms
+        doc_ms: Simulated Firestore cost per document read in ms
+        runs: Opens timed per flow
+    """
+    import asyncio
+    from datetime import datetime
+    import httpx
+
+    _print_header("History screen open")
+
+    firebase = _StandInFirebase(records, query_ms, doc_ms)
+    app = _stand_in_app(firebase)
+
+    async def separate_calls(client):
+        # Previous client: list, then statistics, then details when the newest record is opened
+        injuries = (await client.get('/api/v1/injuries', params={'limit': 50})).json()
+        (await client.get('/api/v1/statistics')).json()
+        shown = time.perf_counter()
+        (await client.get(f"/api/v1/injuries/{injuries[0]['id']}")).json()
+        return shown
+
+    async def dashboard_call(client):
+        dashboard = (await client.get('/api/v1/dashboard', params={'limit': 20})).json()
+        assert dashboard['latest']['recommendations']
+        return time.perf_counter()
+
+    sync_token = datetime.utcnow().isoformat()
+    firebase.records[records // 2]['updatedAt'] = datetime.utcnow().isoformat()  # Changed after the last open
+
+    async def dashboard_reopen(client):
+        dashboard = (await client.get('/api/v1/dashboard', params={'limit': 20, 'since': sync_token})).json()
+        assert not dashboard['full'] and len(dashboard['injuries']) == 1
+        return time.perf_counter()
+
+    async def measure(flow):
+        transport = _latency_transport(app, rtt_ms)
+        received = []
+
+        async def count_bytes(response):
+            await response.aread()
+            received.append(len(response.content))
+
+        shown_ms, total_ms = [], []
+        async with httpx.AsyncClient(transport=transport, base_url='http://backend',
+                                     event_hooks={'response': [count_bytes]}) as client:
+            for _ in range(runs):
+                start = time.perf_counter()
+                shown = await flow(client)
+                total_ms.append((time.perf_counter() - start) * 1000)
+                shown_ms.append((shown - start) * 1000)
+        return {
+            'round_trips': transport.round_trips / runs,
+            'kb': sum(received) / runs / 1024,
+            'shown_ms': sorted(shown_ms)[runs // 2],
+            'total_ms': sorted(total_ms)[runs // 2]
+        }
+
+    print(f"{records} records, RTT {rtt_ms:.0f} ms, Firestore {query_ms:.0f} ms/query + {doc_ms} ms/document")
+    print("-" * 50)
+    print(f"{'flow':<20}{'round trips':>12}{'received':>12}{'list shown':>12}{'+ latest':>12}")
+    flows = [
+        ('separate calls', separate_calls),
+        ('dashboard', dashboard_call),
+        ('dashboard reopen', dashboard_reopen)
+    ]
+    for name, flow in flows:
+        result = asyncio.run(measure(flow))
+        print(f"{name:<20}{result['round_trips']:>12.0f}{result['kb']:>10.1f}KB"
+              f"{result['shown_ms']:>10.0f}ms{result['total_ms']:>10.0f}ms")
+
+def benchmark_conditional_get(records: int, rtt_ms: float, downlink_mbps: float, query_ms: float, refreshes: int):
+    """
+    Bandwidth and latency of the mobile refresh pattern with and without
+    compression and conditional GET.
+
+    A refresh loads the record list and statistics, then opens the newest
+    record. Refreshes run against unchanged data, and with one record
+    changed before each refresh.
+
+    Args:
+        records: Records stored for the user
+        rtt_ms: Client round-trip time in ms
+        downlink_mbps: Client downlink bandwidth in Mbit/s
+        query_ms: Simulated Firestore latency per query in ms
+        refreshes: Refreshes timed per mode
+    """
+    import asyncio
+    import httpx
+
+    _print_header("Conditional GET and compression")
+
+    async def refresh(client, etags: dict):
+        async def get(url):
+            cached = etags.get(url)
+            headers = {'If-None-Match': cached[0]} if cached else {}
+            response = await client.get(url, headers=headers)
+            if response.status_code == 304:
+                return cached[1]
+            if 'etag' in response.headers:
+                etags[url] = (response.headers['etag'], response.json())
+            return response.json()
+
+        injuries = await get('/api/v1/injuries?limit=50')
+        await get('/api/v1/statistics')
+        await get(f"/api/v1/injuries/{injuries[0]['id']}")
+
+    async def measure(compress: bool, conditional: bool, changes: bool):
+        firebase = _StandInFirebase(records, query_ms, 0.2)
+        transport = _latency_transport(_stand_in_app(firebase, conditional=True), rtt_ms, downlink_mbps)
+        headers = {'Accept-Encoding': 'gzip' if compress else 'identity'}
+        etags = {}
+        async with httpx.AsyncClient(transport=transport, base_url='http://backend', headers=headers) as client:
+            await refresh(client, etags if conditional else {})  # First open fills the cache
+            transport.wire_bytes = 0
+            timings = []
+            for i in range(refreshes):
+                if changes:
+                    firebase.update_injury_status(firebase.records[i % 10]['id'], 'user', 'healing')
+                start = time.perf_counter()
+                await refresh(client, etags if conditional else {})
+                timings.append((time.perf_counter() - start) * 1000)
+        return transport.wire_bytes / refreshes / 1024, sorted(timings)[refreshes // 2]
+
+    print(f"{records} records, RTT {rtt_ms:.0f} ms, downlink {downlink_mbps} Mbit/s, "
+          f"Firestore {query_ms:.0f} ms/query")
+    print("-" * 50)
+    print(f"{'refresh':<36}{'received':>12}{'latency':>12}")
+    modes = [
+        ('plain', False, False, False),
+        ('gzip', True, False, False),
+        ('gzip + ETag, unchanged', True, True, False),
+        ('gzip + ETag, one record changed', True, True, True)
+    ]
+    for name, compress, conditional, changes in modes:
+        kb, ms = asyncio.run(measure(compress, conditional, changes))
+        print(f"{name:<36}{kb:>10.1f}KB{ms:>10.0f}ms")
+
+
+def benchmark_json_serialization(sizes: list, repeats: int):
+    """
+    Serialization cost of record responses, stock FastAPI path vs fast_json.
+
+    Records are shaped like Firestore output: nested recommendations and
+    probabilities, and a DatetimeWithNanoseconds timestamp.
+
+    Args:
+        sizes: Record counts per response
+        repeats: Timed serializations per size and path
+    """
+    import json
+    from datetime import datetime, timezone
+    from typing import List, Optional
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+    from pydantic import BaseModel, TypeAdapter
+    import fast_json
+
+    _print_header("JSON serialization")
+
+    class InjuryRecord(BaseModel):
+        """Same fields as main.InjuryRecord."""
+        id: str
+        userId: str
+        severity: str
+        confidence: float
+        imageHash: str
+        timestamp: datetime
+        status: Optional[str] = "active"
+
+    list_model = TypeAdapter(List[InjuryRecord])
+
+    def median_ms(serialize) -> float:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            serialize()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)[repeats // 2]
+
+    def stdlib_dumps(content):
+        accelerator, fast_json.orjson = fast_json.orjson, None
+        try:
+            return fast_json.dumps(content)
+        finally:
+            fast_json.orjson = accelerator
+
+    print(f"JSON encoder: {'orjson' if fast_json.orjson else 'stdlib (orjson not installed)'}")
+    print("-" * 50)
+    print(f"{'records':>8}  {'path':<40}{'ms':>10}{'KB':>8}")
+    for size in sizes:
+        records = _StandInFirebase(size, 0, 0).records
+        for record in records:
+            created = datetime.fromisoformat(record['createdAt'])
+            record['timestamp'] = DatetimeWithNanoseconds(*created.timetuple()[:6], created.microsecond,
+                                                          tzinfo=timezone.utc)
+        stock = JSONResponse(jsonable_encoder(records)).body
+        assert json.loads(stock) == json.loads(fast_json.dumps(records)) == json.loads(stdlib_dumps(records))
+
+        paths = [
+            # Details, changes, statistics and dashboard: no response_model
+            ('full: jsonable_encoder + json.dumps', lambda: JSONResponse(jsonable_encoder(records)).body),
+            ('full: fast_json, stdlib encoder', lambda: stdlib_dumps(records)),
+            ('full: fast_json', lambda: fast_json.dumps(records)),
+            # /injuries keeps List[InjuryRecord], serialized by Pydantic
+            ('list: response_model', lambda: list_model.dump_json(list_model.validate_python(records)))
+        ]
+        for name, serialize in paths:
+            body = serialize()
+            print(f"{size:>8}  {name:<40}{median_ms(serialize):>10.2f}{len(body) / 1024:>8.0f}")
+
+
+async def _get_streamed(app, path: str, query: bytes = b'') -> dict:
+    """GET path from the ASGI app, discarding the body; returns status, bytes and time to first byte."""
+    import asyncio
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query, 'client': ('127.0.0.1', 1), 'server': ('127.0.0.1', 8000),
+        'headers': []
+    }
+    start = time.perf_counter()
+    result = {'bytes': 0, 'first_byte_ms': None}
+    requested = []
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()  # The client stays connected
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+        elif message['type'] == 'http.response.body' and message.get('body'):
+            if result['first_byte_ms'] is None:
+                result['first_byte_ms'] = (time.perf_counter() - start) * 1000
+            result['bytes'] += len(message['body'])
+
+    await app(scope, receive, send)
+    result['total_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def _export_worker(mode: str, records: int, query_ms: float, doc_ms: float, export_format: str) -> dict:
+    """Export a history with a materialized list or the streaming export, in this process."""
+    import asyncio
+    import tracemalloc
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from export import EXPORT_FORMATS, export_stream
+    from fast_json import json_response
+
+    firebase = _StandInFirebase(records, query_ms, doc_ms)
+    app = FastAPI()
+
+    if mode == 'materialized':
+        @app.get('/export')
+        def export_materialized():
+            # Previous option: read the whole history into a list, then respond
+            return json_response(list(firebase.iter_injury_records('user')))
+    else:
+        @app.get('/export')
+        def export_streaming():
+            return StreamingResponse(export_stream(firebase.iter_injury_records('user'), export_format),
+                                     media_type=EXPORT_FORMATS[export_format])
+
+    timing = asyncio.run(_get_streamed(app, '/export'))
+    assert timing['status'] == 200
+
+    firebase.query_ms = firebase.doc_ms = 0  # Latency does not matter for memory
+    tracemalloc.start()
+    asyncio.run(_get_streamed(app, '/export'))
+    peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+
+    return dict(timing, peak_mb=peak_mb)
+
+
+def benchmark_export(sizes: list, query_ms: float, doc_ms: float, export_format: str):
+    """
+    Compare exporting a whole history as one materialized response vs streaming.
+
+    Each run happens in a fresh process. Peak memory is the Python heap
+    allocated while serving (tracemalloc), excluding the stand-in's stored
+    records; the body is discarded as it is sent.
+
+    Args:
+        sizes: History lengths
+        query_ms: Simulated Firestore latency per page query in ms
+        doc_ms: Simulated Firestore cost per document read in ms
+        export_format: Streaming format ('ndjson' or 'csv')
+    """
+    _print_header("History export: materialized vs streaming")
+
+    context = multiprocessing.get_context('spawn')
+    print(f"Firestore {query_ms:.0f} ms/page + {doc_ms} ms/document, 200 records per page")
+    print("-" * 50)
+    print(f"{'records':>8}  {'mode':<22}{'MB sent':>9}{'first byte':>12}{'total':>10}{'peak heap':>11}")
+    for size in sizes:
+        for mode in ('materialized', 'streaming'):
+            with context.Pool(1) as pool:
+                result = pool.apply(_export_worker, (mode, size, query_ms, doc_ms, export_format))
+            name = mode if mode == 'materialized' else f"streaming {export_format}"
+            print(f"{size:>8}  {name:<22}{result['bytes'] / (1024 * 1024):>9.1f}"
+                  f"{result['first_byte_ms']:>10.0f}ms{result['total_ms']:>8.0f}ms{result['peak_mb']:>9.1f}MB")
+
+
+def _synthetic_records(count: int, offset: int, rng) -> list:
+    """Records shaped like the analytics snapshot's Firestore reads, over about two years."""
+    from datetime import datetime, timedelta
+    import numpy as np
+
+    base = datetime(2024, 1, 1)
+    severities = np.array(['mild', 'moderate', 'severe'])[rng.choice(3, count, p=[0.5, 0.35, 0.15])]
+    statuses = np.array(['active', 'healing', 'resolved'])[rng.choice(3, count, p=[0.3, 0.3, 0.4])]
+    probabilities = rng.dirichlet([2, 2, 2], count)
+    minutes = rng.integers(0, 2 * 365 * 24 * 60, count)
+    users = rng.integers(0, max(1, count // 20), count) + offset
+
+    records = []
+    for i in range(count):
+        created = base + timedelta(minutes=int(minutes[i]))
+        records.append({
+            'id': f"{offset + i:020d}",
+            'userId': f"user{users[i]}",
+            'severity': str(severities[i]),
+            'confidence': float(probabilities[i].max()),
+            'probabilities': dict(zip(('mild', 'moderate', 'severe'), probabilities[i].tolist())),
+            'status': str(statuses[i]),
+            'createdAt': created.isoformat(),
+            'updatedAt': (created + timedelta(days=int(minutes[i] % 20))).isoformat()
+        })
+    return records
+
+
+def benchmark_analytics(rows: int, chunk: int, repeats: int):
+    """
+    Fleet-wide aggregates: a Python loop over record dicts vs the columnar snapshot.
+
+    Both compute the weekly severity mix, the confidence distribution per
+    severity and the status counts over the same synthetic records.
+
+    Args:
+        rows: Records in total
+        chunk: Records generated (and applied to the snapshot) at a time
+        repeats: Timed runs of the snapshot queries
+    """
+    import tempfile
+    from collections import Counter, defaultdict
+    from datetime import datetime, timedelta
+    import numpy as np
+    import analytics
+
+    _print_header("Organization-wide analytics")
+
+    def loop_aggregates(records, weekly, confidences, statuses):
+        # Previous option: one pass over the record dicts, as get_user_statistics did per user
+        for record in records:
+            created = datetime.fromisoformat(record['createdAt'])
+            week = (created - timedelta(days=created.weekday())).date()
+            weekly[week][record['severity']] += 1
+            confidences[record['severity']].append(record['confidence'])
+            statuses[record['status']] += 1
+
+    rng = np.random.default_rng(0)
+    snapshot = analytics.InjurySnapshot()
+    weekly, confidences, statuses = defaultdict(Counter), defaultdict(list), Counter()
+    loop_seconds = apply_seconds = 0.0
+    for offset in range(0, rows, chunk):
+        records = _synthetic_records(min(chunk, rows - offset), offset, rng)
+        start = time.perf_counter()
+        loop_aggregates(records, weekly, confidences, statuses)
+        loop_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        snapshot.apply(records)
+        apply_seconds += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for values in confidences.values():
+        values.sort()
+        [values[int(q * (len(values) - 1))] for q in (0.1, 0.5, 0.9)]
+    loop_seconds += time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'snapshot.npz')
+        start = time.perf_counter()
+        snapshot.save(path)
+        save_seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        start = time.perf_counter()
+        snapshot = analytics.InjurySnapshot.load(path)
+        load_seconds = time.perf_counter() - start
+
+    queries = [
+        ('severity mix per week', lambda: analytics.severity_mix(snapshot, 'week')),
+        ('confidence distribution', lambda: analytics.confidence_distribution(snapshot)),
+        ('status funnel', lambda: analytics.status_funnel(snapshot))
+    ]
+    mix = queries[0][1]()
+    assert sum(row['records'] for row in mix) == rows
+    assert [row['counts'] for row in mix] == [
+        {name: weekly[week][name] for name in analytics.SEVERITIES} for week in sorted(weekly)
+    ]
+
+    print(f"Records: {rows}   Users: {len(snapshot.categories['user'])}")
+    print(f"Snapshot: {analytics.snapshot_summary(snapshot)['memory_mb']:.1f} MB in memory, {size_mb:.1f} MB on disk")
+    print(f"Apply {rows} records: {apply_seconds:.2f}s   Save: {save_seconds * 1000:.0f}ms   "
+          f"Load: {load_seconds * 1000:.0f}ms")
+    print("-" * 50)
+    print(f"Python loop over record dicts (all three): {loop_seconds * 1000:>8.0f}ms")
+    total_ms = 0.0
+    for name, query in queries:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        median = sorted(timings)[repeats // 2]
+        total_ms += median
+        print(f"Snapshot: {name:<32}{median:>8.1f}ms")
+    print(f"Snapshot: {'all three':<32}{total_ms:>8.1f}ms")
+
+    # An incremental refresh: some records changed, a few deleted
+    changed = _synthetic_records(1000, 0, rng)
+    deleted = [f"{i:020d}" for i in range(rows - 100, rows)]
+    start = time.perf_counter()
+    snapshot.apply(changed, deleted)
+    print(f"Apply 1000 changed and 100 deleted records: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+def benchmark_timeseries(records: int, history_days: int, query_ms: float, doc_ms: float, runs: int):
+    """
+    Trend chart data: bucketing all of a user's records vs reading daily rollups.
+
+    Args:
+        records: Records stored for the user
+        history_days: Days the records are spread over
+        query_ms: Simulated Firestore latency per query in ms
+        doc_ms: Simulated Firestore cost per document read in ms
+        runs: Timed runs per path and range
+    """
+    import asyncio
+    from collections import Counter
+    from datetime import date, datetime, timedelta
+    from rollups import build_timeseries, timeseries_range
+
+    _print_header("Injury timeseries: raw records vs rollups")
+
+    firebase = _StandInFirebase(records, query_ms, doc_ms)
+    now = datetime.utcnow()
+    for i, record in enumerate(firebase.records):
+        record['createdAt'] = (now - timedelta(days=history_days * i / records)).isoformat()
+
+    def from_records(period: str) -> dict:
+        # Previous option: read every record, then bucket by day in Python
+        first, last = timeseries_range(period, None, None, now.date())
+        counts = Counter()
+        documents = 0
+        for record in firebase.iter_injury_records('user'):
+            documents += 1
+            day = date.fromisoformat(record['createdAt'][:10])
+            if first <= day <= last:
+                counts[(day - first).days // (7 if period == 'week' else 1), record['severity']] += 1
+        return {'documents': documents, 'counts': counts}
+
+    def from_rollups(period: str) -> dict:
+        series = asyncio.run(build_timeseries(firebase, 'user', period))
+        return {'buckets': series['buckets']}
+
+    def median_ms(build) -> float:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            build()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)[runs // 2]
+
+    print(f"{records} records over {history_days} days; Firestore {query_ms:.0f} ms/query + {doc_ms} ms/document")
+    print("-" * 50)
+    print(f"{'range':<18}{'path':<14}{'docs read':>10}{'ms':>10}")
+    for period, label in (('day', 'last 30 days'), ('week', 'last 12 weeks')):
+        raw = from_records(period)
+        series = from_rollups(period)['buckets']
+        assert sum(bucket['total'] for bucket in series) == sum(raw['counts'].values())
+        first, last = timeseries_range(period, None, None, now.date())
+        rollup_docs = len({record['createdAt'][:10] for record in firebase.records
+                           if first.isoformat() <= record['createdAt'][:10] <= last.isoformat()})
+        print(f"{label:<18}{'records':<14}{raw['documents']:>10}{median_ms(lambda: from_records(period)):>10.0f}")
+        print(f"{label:<18}{'rollups':<14}{rollup_docs:>10}{median_ms(lambda: from_rollups(period)):>10.0f}")
+
+
+def _mint_id_token(private_key, project_id: str, user_id: str, kid: str, expires_in: int = 3600, **claims) -> str:
+    """Sign a token shaped like a Firebase ID token with a locally generated key."""
+    import jwt
+
+    now = int(time.time())
+    payload = {
+        'iss': f"https://securetoken.google.com/{project_id}",
+        'aud': project_id,
+        'sub': user_id,
+        'iat': now,
+        'auth_time': now,
+        'exp': now + expires_in
+    }
+    payload.update(claims)
+    return jwt.encode(payload, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+def benchmark_auth(requests: int, users: int, fetch_ms: float):
+    """
+    Auth cost per request: verifying every token naively vs with cached keys and tokens.
+
+    Tokens are signed offline with a locally generated RSA key; the key
+    fetch is simulated with fetch_ms of latency.
+
+    Args:
+        requests: Requests per mode
+        users: Distinct users (tokens) the requests come from
+        fetch_ms: Simulated latency of fetching the signing keys in ms
+    """
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from token_auth import InvalidTokenError, KeySet, TokenVerifier
+
+    _print_header("Token verification cost per request")
+
+    project_id = 'injury-tracker-local'
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(fetch_ms / 1000)
+        return {'local': private_key.public_key()}, 3600
+
+    tokens = [_mint_id_token(private_key, project_id, f"user{i}", 'local') for i in range(users)]
+
+    # Rejections, checked offline
+    verifier = TokenVerifier(project_id, KeySet(fetch))
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    rejected = {
+        'expired': _mint_id_token(private_key, project_id, 'user', 'local', expires_in=-120),
+        'wrong audience': _mint_id_token(private_key, 'other-project', 'user', 'local'),
+        'wrong signature': _mint_id_token(other_key, project_id, 'user', 'local'),
+        'unknown key': _mint_id_token(other_key, project_id, 'user', 'rotated'),
+        'not a token': 'user123'
+    }
+    for name, token in rejected.items():
+        try:
+            verifier.verify(token)
+            raise AssertionError(f"{name} token was accepted")
+        except InvalidTokenError:
+            pass
+    assert verifier.verify(tokens[0]) == 'user0'
+
+    def naive(token):
+        # Previous option without caching: fetch the keys and check the signature every time
+        keys, _ = fetch()
+        header = jwt.get_unverified_header(token)
+        return jwt.decode(token, keys[header['kid']], algorithms=['RS256'], audience=project_id,
+                          issuer=f"https://securetoken.google.com/{project_id}")['sub']
+
+    keys_only = TokenVerifier(project_id, KeySet(fetch), cache_size=0)
+    cached = TokenVerifier(project_id, KeySet(fetch))
+
+    def with_cache(token):
+        return cached.cached(token) or cached.verify(token)
+
+    for token in tokens:
+        cached.verify(token)  # Each user's first request; later ones are cache hits
+
+    modes = [
+        ('naive (fetch keys + verify)', naive, max(1, requests // 100)),
+        ('cached keys, verify signature', keys_only.verify, requests),
+        ('cached keys and tokens (warm)', with_cache, requests)
+    ]
+    print(f"{users} users, {fetch_ms:.0f} ms key fetch, RS256 2048-bit")
+    print("-" * 50)
+    print(f"{'mode':<32}{'requests':>9}{'us/request':>12}{'key fetches':>13}")
+    for name, verify, count in modes:
+        del fetches[:]
+        start = time.perf_counter()
+        for i in range(count):
+            assert verify(tokens[i % users]) == f"user{i % users}"
+        elapsed = time.perf_counter() - start
+        print(f"{name:<32}{count:>9}{elapsed / count * 1e6:>12.1f}{len(fetches):>13}")
+
+
+def _overload_server(mode: str, port: int, infer_ms: float, llm_ms: float):
+    """
+    Serve a stand-in analyze endpoint and a read endpoint with uvicorn.
+
+    The model and recommendation calls sleep for infer_ms and llm_ms. In
+    'unbounded' mode they block the event loop as the analyze pipeline did
+    before admission control; in 'admission' mode they run through the
+    stages, the shedding middleware and the per-user rate limit as in main.py.
+    """
+    import asyncio
+    import uvicorn
+    from fastapi import Depends, FastAPI, Header, HTTPException
+    from starlette.concurrency import run_in_threadpool
+    import admission
+
+    def predict():
+        time.sleep(infer_ms / 1000)
+        return {'severity': 'moderate'}
+
+    def recommend():
+        time.sleep(llm_ms / 1000)
+        return {'recommendations': {}}
+
+    app = FastAPI()
+
+    @app.get("/api/v1/injuries")
+    async def get_injuries():
+        await asyncio.sleep(0.005)  # Stand-in Firestore query
+        return []
+
+    if mode == 'unbounded':
+        @app.post("/api/v1/analyze-wound")
+        async def analyze_unbounded(authorization: str = Header(None)):
+            prediction = predict()
+            recommend()
+            return prediction
+    else:
+        inference = admission.Stage('inference', admission.INFERENCE_CONCURRENCY,
+                                    admission.INFERENCE_QUEUE_DEPTH, admission.INFERENCE_MAX_WAIT_SECONDS)
+        llm = admission.Stage('recommendation', admission.LLM_CONCURRENCY, admission.LLM_QUEUE_DEPTH,
+                              admission.LLM_MAX_WAIT_SECONDS, service_time=llm_ms / 1000)
+        limiter = admission.RateLimiter(admission.ANALYZE_RATE_PER_MINUTE / 60, admission.ANALYZE_BURST)
+        app.add_middleware(admission.LoadSheddingMiddleware, stages=[inference, llm],
+                           paths=["/api/v1/analyze-wound"])
+
+        def analyze_user(authorization: str = Header(None)):
+            retry_after = limiter.acquire(authorization)
+            if retry_after is not None:
+                raise HTTPException(429, headers={'Retry-After': admission.retry_after_header(retry_after)})
+            return authorization
+
+        @app.post("/api/v1/analyze-wound")
+        async def analyze_admitted(user_id: str = Depends(analyze_user)):
+            try:
+                async with inference.slot():
+                    prediction = await run_in_threadpool(predict)
+                try:
+                    async with llm.slot():
+                        await run_in_threadpool(recommend)
+                except admission.OverloadedError:
+                    pass  # Static recommendations
+            except admission.OverloadedError as e:
+                raise HTTPException(503, headers={'Retry-After': admission.retry_after_header(e.retry_after)})
+            return prediction
+
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='error')
+
+
+def _percentile_ms(timings: list, percent: float) -> float:
+    if not timings:
+        return float('nan')
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * percent / 100))] * 1000
+
+
+def benchmark_overload(rate: float, duration: float, users: int, read_rate: float,
+                       infer_ms: float, llm_ms: float, timeout: float):
+    """
+    Analyze latency and read latency under an analyze burst above capacity.
+
+    Clients send analyze requests at `rate` per second (open loop, i.e. new
+    requests keep arriving whatever the latency) from `users` users, plus one
+    user retrying in a tight loop, while a reader polls the history endpoint.
+    The server runs in its own process behind real sockets.
+
+    Args:
+        rate: Analyze requests per second
+        duration: Length of the burst in seconds
+        users: Distinct users sending analyze requests
+        read_rate: History requests per second during the burst
+        infer_ms: Simulated model inference time in ms
+        llm_ms: Simulated recommendation call time in ms
+        timeout: Client timeout in seconds (requests that take longer count as timed out)
+    """
+    import asyncio
+    import socket
+    import httpx
+    import admission
+
+    _print_header("Analyze burst: unbounded vs admission control")
+
+    async def load(port: int) -> dict:
+        results = {'analyze': [], 'read': [], 'status': {}}
+
+        async def call(client, method, path, user, kind):
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, f"http://127.0.0.1:{port}{path}",
+                                                headers={'Authorization': user})
+                status = response.status_code
+                if status == 200:
+                    results[kind].append(time.perf_counter() - start)
+            except httpx.TimeoutException:
+                status = 'timeout'
+            if kind == 'analyze':
+                results['status'][status] = results['status'].get(status, 0) + 1
+
+        async def arrivals(client, per_second, method, path, kind, user_for):
+            tasks = []
+            for i in range(int(duration * per_second)):
+                tasks.append(asyncio.ensure_future(call(client, method, path, user_for(i), kind)))
+                await asyncio.sleep(1 / per_second)
+            return tasks
+
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            groups = await asyncio.gather(
+                arrivals(client, rate, 'POST', '/api/v1/analyze-wound', 'analyze', lambda i: f"user{i % users}"),
+                arrivals(client, 10, 'POST', '/api/v1/analyze-wound', 'analyze', lambda i: 'retrying-user'),
+                arrivals(client, read_rate, 'GET', '/api/v1/injuries', 'read', lambda i: 'reader')
+            )
+            await asyncio.gather(*[task for tasks in groups for task in tasks])
+        return results
+
+    context = multiprocessing.get_context('spawn')
+    capacity = min(admission.INFERENCE_CONCURRENCY * 1000 / infer_ms, admission.LLM_CONCURRENCY * 1000 / llm_ms)
+    print(f"{rate:.0f} analyses/s for {duration:.0f}s from {users} users + 1 user at 10/s; "
+          f"{read_rate:.0f} reads/s")
+    print(f"Inference {infer_ms:.0f} ms, recommendations {llm_ms:.0f} ms; "
+          f"admitted capacity about {capacity:.1f} analyses/s; client timeout {timeout:.0f}s")
+    print("-" * 50)
+    for mode in ('unbounded', 'admission'):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = context.Process(target=_overload_server, args=(mode, port, infer_ms, llm_ms), daemon=True)
+        server.start()
+        for _ in range(200):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        results = asyncio.run(load(port))
+        server.terminate()
+        server.join()
+
+        counts = ', '.join(f"{status}: {count}" for status, count in sorted(results['status'].items(), key=str))
+        print(f"{mode}")
+        print(f"  analyze responses    {counts}")
+        print(f"  analyze OK p50/p99   {_percentile_ms(results['analyze'], 50):>7.0f} / "
+              f"{_percentile_ms(results['analyze'], 99):.0f} ms")
+        print(f"  read OK p50/p99      {_percentile_ms(results['read'], 50):>7.0f} / "
+              f"{_percentile_ms(results['read'], 99):.0f} ms  ({len(results['read'])} of "
+              f"{int(duration * read_rate)} reads)")
+
+
+def _cold_start_worker(model_path: str) -> dict:
+    """Time a worker restart: import TensorFlow, load the model, serve the first requests."""
+    start = time.perf_counter()
+    import numpy as np
+    from ml_model import WoundClassifier
+
+    classifier = WoundClassifier(model_path)
+    loaded = time.perf_counter()
+    image = np.zeros((classifier.img_height, classifier.img_width, 3), dtype=np.uint8)
+    timings = []
+    for _ in range(5):
+        request_start = time.perf_counter()
+        classifier.predict_array(image)
+        timings.append((time.perf_counter() - request_start) * 1000)
+    return {'load_ms': (loaded - start) * 1000, 'first_ms': timings[0], 'warm_ms': sorted(timings[1:])[1]}
+
+
+def _save_benchmark_model(path: str, architecture: str, img_size: int, version: str, seed: int):
+    """Save an untrained model with a version in its metadata."""
+    import tensorflow as tf
+    from ml_model import WoundClassifier
+
+    tf.keras.utils.set_random_seed(seed)
+    WoundClassifier(architecture=architecture, img_size=img_size).save_model(path, version=version)
+
+
+def benchmark_model_swap(architecture: str, img_size: int, interval_ms: float, shadow_requests: int):
+    """
+    Deploying a new model version: restarting the worker vs a warmed hot swap.
+
+    A client thread classifies an image every interval_ms through the model
+    manager while a second version is loaded, warmed and swapped in; every
+    request is checked for errors and for the version it was served by. The
+    restart cost is measured in a fresh process (import, load, first request).
+
+    Args:
+        architecture: Architecture of the two model versions
+        img_size: Model input size
+        interval_ms: Time between client requests in ms
+        shadow_requests: Requests served while the new version runs in shadow
+    """
+    import tempfile
+    import threading
+    import numpy as np
+    from model_manager import ModelManager
+    from ml_model import WoundClassifier
+
+    _print_header("Model deployment: restart vs hot swap")
+
+    directory = tempfile.mkdtemp()
+    paths = {}
+    for seed, version in enumerate(('v1', 'v2')):
+        paths[version] = os.path.join(directory, f"wound_classifier_{version}.h5")
+        _save_benchmark_model(paths[version], architecture, img_size, version, seed)
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        cold = pool.apply(_cold_start_worker, (paths['v2'],))
+
+    manager = ModelManager(WoundClassifier(paths['v1']), paths['v1'])
+    manager.classifier.measure_latency(runs=20)
+    rng = np.random.RandomState(0)
+    images = rng.randint(0, 256, (64, manager.classifier.img_height, manager.classifier.img_width, 3), dtype=np.uint8)
+
+    samples = []  # (phase, latency ms, version or error)
+    phase = ['before']
+    stop = threading.Event()
+
+    def client():
+        i = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                outcome = manager.predict(images[i % len(images)])['model_version']
+            except Exception as e:
+                outcome = f"error: {e}"
+            samples.append((phase[0], (time.perf_counter() - start) * 1000, outcome))
+            i += 1
+            time.sleep(interval_ms / 1000)
+
+    thread = threading.Thread(target=client)
+    thread.start()
+    time.sleep(2)
+    phase[0] = 'loading + warming'
+    swap_start = time.perf_counter()
+    manager.deploy_in_background(paths['v2'])
+    while manager.live.version != 'v2':
+        time.sleep(0.001)
+    swap_ms = (time.perf_counter() - swap_start) * 1000
+    phase[0] = 'after'
+    time.sleep(2)
+    stop.set()
+    thread.join()
+
+    print(f"{architecture} {img_size}x{img_size}, one request every {interval_ms:.0f} ms")
+    print("-" * 50)
+    print(f"Restart (fresh process):  import + load {cold['load_ms']:.0f} ms, "
+          f"first request {cold['first_ms']:.0f} ms, warm request {cold['warm_ms']:.1f} ms")
+    print(f"Hot swap: v2 loaded and warmed in the background in {swap_ms:.0f} ms")
+    print(f"{'phase':<20}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}  versions")
+    for name in ('before', 'loading + warming', 'after'):
+        rows = [sample for sample in samples if sample[0] == name]
+        timings = sorted(latency for _, latency, _ in rows)
+        errors = sum(1 for _, _, outcome in rows if outcome.startswith('error'))
+        versions = sorted({outcome for _, _, outcome in rows if not outcome.startswith('error')})
+        print(f"{name:<20}{len(rows):>9}{errors:>8}{timings[len(timings) // 2]:>9.1f}"
+              f"{timings[min(len(timings) - 1, int(len(timings) * 0.99))]:>9.1f}{timings[-1]:>9.1f}  "
+              f"{', '.join(versions)}")
+
+    # Shadow: v1 goes back in as a candidate and sees a sample of v2's traffic
+    manager.shadow_rate = 1.0
+    manager.deploy(paths['v1'], shadow=True)
+    for i in range(shadow_requests):
+        manager.predict(images[i % len(images)])
+        time.sleep(interval_ms / 1000)
+    manager._shadow_executor.submit(lambda: None).result()
+    stats = manager.status()['shadow_stats']
+    print(f"Shadow {stats['candidate_version']} vs live {stats['live_version']}: "
+          f"{stats['compared']} compared, {stats['skipped']} skipped, {stats['errors']} errors, agreement {stats['agreement']:.2f}, "
+          f"live p50 {stats['live_ms']['p50']} ms, candidate p50 {stats['candidate_ms']['p50']} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Injury tracker benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    pipeline_parser = subparsers.add_parser('input-pipeline',
+                                            help='Training input pipeline throughput')
+    pipeline_parser.add_argument('--data-dir', default='./dataset',
+                                 help='Dataset directory (default: ./dataset)')
+    pipeline_parser.add_argument('--epochs', type=int, default=3,
+                                 help='Passes over the training data (default: 3)')
+    pipeline_parser.add_argument('--batch-size', type=int, default=32,
+                                 help='Batch size (default: 32)')
+    pipeline_parser.add_argument('--shards', default=None,
+                                 help='Also benchmark this shard directory')
+
+    ingest_parser = subparsers.add_parser('upload-ingest',
+                                          help='Peak memory per request for large uploads')
+    ingest_parser.add_argument('--size-mb', type=float, default=10,
+                               help='Upload size in MB (default: 10)')
+    ingest_parser.add_argument('--requests', type=int, default=3,
+                               help='Uploads per mode (default: 3)')
+
+    subparsers.add_parser('adversarial-images',
+                          help='Worst-case decode cost of hostile uploads')
+
+    compact_parser = subparsers.add_parser('compact-upload',
+                                           help='Wire size and latency of full-size vs compact uploads')
+    compact_parser.add_argument('--data-dir', default='./dataset',
+                                help='Dataset directory (default: ./dataset)')
+    compact_parser.add_argument('--model', default=os.getenv('MODEL_PATH', './models/wound_classifier.h5'),
+                                help='Model path (default: $MODEL_PATH or ./models/wound_classifier.h5)')
+    compact_parser.add_argument('--images', type=int, default=50,
+                                help='Images per path (default: 50)')
+    compact_parser.add_argument('--uplink-mbps', type=float, default=2.0,
+                                help='Client uplink bandwidth in Mbit/s (default: 2)')
+
+    duplicates_parser = subparsers.add_parser('near-duplicates',
+                                              help='Near-duplicate search latency and detection rate')
+    duplicates_parser.add_argument('--data-dir', default='./dataset',
+                                   help='Dataset directory (default: ./dataset)')
+    duplicates_parser.add_argument('--entries', type=int, default=50000,
+                                   help='Hashes in the index (default: 50000)')
+    duplicates_parser.add_argument('--searches', type=int, default=1000,
+                                   help='Timed searches (default: 1000)')
+
+    dashboard_parser = subparsers.add_parser('dashboard',
+                                             help='History screen round trips and cold-open time')
+    dashboard_parser.add_argument('--records', type=int, default=200,
+                                  help='Records stored for the user (default: 200)')
+    dashboard_parser.add_argument('--rtt-ms', type=float, default=150,
+                                  help='Client round-trip time in ms (default: 150)')
+    dashboard_parser.add_argument('--firestore-ms', type=float, default=40,
+                                  help='Simulated Firestore latency per query in ms (default: 40)')
+    dashboard_parser.add_argument('--doc-ms', type=float, default=0.2,
+                                  help='Simulated Firestore cost per document read in ms (default: 0.2)')
+    dashboard_parser.add_argument('--runs', type=int, default=10,
+                                  help='Cold opens per flow (default: 10)')
+
+    conditional_parser = subparsers.add_parser('conditional-get',
+                                               help='Refresh bandwidth and latency with gzip and ETags')
+    conditional_parser.add_argument('--records', type=int, default=200,
+                                    help='Records stored for the user (default: 200)')
+    conditional_parser.add_argument('--rtt-ms', type=float, default=150,
+                                    help='Client round-trip time in ms (default: 150)')
+    conditional_parser.add_argument('--downlink-mbps', type=float, default=2.0,
+                                    help='Client downlink bandwidth in Mbit/s (default: 2)')
+    conditional_parser.add_argument('--firestore-ms', type=float, default=40,
+                                    help='Simulated Firestore latency per query in ms (default: 40)')
+    conditional_parser.add_argument('--refreshes', type=int, default=10,
+                                    help='Refreshes per mode (default: 10)')
+
+    json_parser = subparsers.add_parser('json-serialization',
+                                        help='Response serialization cost for record lists')
+    json_parser.add_argument('--sizes', type=int, nargs='+', default=[50, 1000],
+                             help='Records per response (default: 50 1000)')
+    json_parser.add_argument('--repeats', type=int, default=50,
+                             help='Timed serializations per size and path (default: 50)')
+
+    export_parser = subparsers.add_parser('export',
+                                          help='History export memory and time to first byte')
+    export_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                               help='History lengths (default: 1000 10000)')
+    export_parser.add_argument('--firestore-ms', type=float, default=40,
+                               help='Simulated Firestore latency per page query in ms (default: 40)')
+    export_parser.add_argument('--doc-ms', type=float, default=0.2,
+                               help='Simulated Firestore cost per document read in ms (default: 0.2)')
+    export_parser.add_argument('--format', dest='export_format', choices=['ndjson', 'csv'], default='ndjson',
+                               help='Streaming format (default: ndjson)')
+
+    analytics_parser = subparsers.add_parser('analytics',
+                                             help='Fleet-wide aggregates, record loop vs columnar snapshot')
+    analytics_parser.add_argument('--rows', type=int, default=1000000,
+                                  help='Records in total (default: 1000000)')
+    analytics_parser.add_argument('--chunk', type=int, default=100000,
+                                  help='Records generated at a time (default: 100000)')
+    analytics_parser.add_argument('--repeats', type=int, default=10,
+                                  help='Timed runs per snapshot query (default: 10)')
+
+    timeseries_parser = subparsers.add_parser('timeseries',
+                                              help='Trend chart data from raw records vs daily rollups')
+    timeseries_parser.add_argument('--records', type=int, default=2000,
+                                   help='Records stored for the user (default: 2000)')
+    timeseries_parser.add_argument('--history-days', type=int, default=365,
+                                   help='Days the records are spread over (default: 365)')
+    timeseries_parser.add_argument('--firestore-ms', type=float, default=40,
+                                   help='Simulated Firestore latency per query in ms (default: 40)')
+    timeseries_parser.add_argument('--doc-ms', type=float, default=0.2,
+                                   help='Simulated Firestore cost per document read in ms (default: 0.2)')
+    timeseries_parser.add_argument('--runs', type=int, default=5,
+                                   help='Timed runs per path and range (default: 5)')
+
+    auth_parser = subparsers.add_parser('auth',
+                                        help='Per-request token verification cost')
+    auth_parser.add_argument('--requests', type=int, default=20000,
+                             help='Requests per mode (default: 20000)')
+    auth_parser.add_argument('--users', type=int, default=500,
+                             help='Distinct users sending requests (default: 500)')
+    auth_parser.add_argument('--fetch-ms', type=float, default=80,
+                             help='Simulated signing key fetch latency in ms (default: 80)')
+
+    overload_parser = subparsers.add_parser('overload',
+                                            help='Analyze burst above capacity, with and without admission control')
+    overload_parser.add_argument('--rate', type=float, default=40,
+                                 help='Analyze requests per second (default: 40)')
+    overload_parser.add_argument('--duration', type=float, default=10,
+                                 help='Burst length in seconds (default: 10)')
+    overload_parser.add_argument('--users', type=int, default=200,
+                                 help='Distinct users sending analyze requests (default: 200)')
+    overload_parser.add_argument('--read-rate', type=float, default=20,
+                                 help='History reads per second during the burst (default: 20)')
+    overload_parser.add_argument('--infer-ms', type=float, default=30,
+                                 help='Simulated inference time in ms (default: 30)')
+    overload_parser.add_argument('--llm-ms', type=float, default=1500,
+                                 help='Simulated recommendation call time in ms (default: 1500)')
+    overload_parser.add_argument('--timeout', type=float, default=15,
+                                 help='Client timeout in seconds (default: 15)')
+
+    swap_parser = subparsers.add_parser('model-swap',
+                                        help='Deploying a model version: restart vs hot swap')
+    swap_parser.add_argument('--architecture', default='small_cnn', choices=['small_cnn', 'mobilenetv2'],
+                             help='Architecture of the two versions (default: small_cnn)')
+    swap_parser.add_argument('--img-size', type=int, default=224,
+                             help='Model input size (default: 224)')
+    swap_parser.add_argument('--interval-ms', type=float, default=10,
+                             help='Time between client requests in ms (default: 10)')
+    swap_parser.add_argument('--shadow-requests', type=int, default=300,
+                             help='Requests served with the shadow candidate (default: 300)')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'input-pipeline':
+        benchmark_input_pipeline(args.data_dir, args.epochs, args.batch_size, args.shards)
+    elif args.benchmark == 'upload-ingest':
+        benchmark_upload_ingest(args.size_mb, args.requests)
+    elif args.benchmark == 'adversarial-images':
+        benchmark_adversarial_images()
+    elif args.benchmark == 'compact-upload':
+        benchmark_compact_upload(args.data_dir, args.model, args.images, args.uplink_mbps)
+    elif args.benchmark == 'near-duplicates':
+        benchmark_near_duplicates(args.data_dir, args.entries, args.searches)
+    elif args.benchmark == 'dashboard':
+        benchmark_dashboard(args.records, args.rtt_ms, args.firestore_ms, args.doc_ms, args.runs)
+    elif args.benchmark == 'conditional-get':
+        benchmark_conditional_get(args.records, args.rtt_ms, args.downlink_mbps, args.firestore_ms, args.refreshes)
+    elif args.benchmark == 'json-serialization':
+        benchmark_json_serialization(args.sizes, args.repeats)
+    elif args.benchmark == 'export':
+        benchmark_export(args.sizes, args.firestore_ms, args.doc_ms, args.export_format)
+    elif args.benchmark == 'analytics':
+        benchmark_analytics(args.rows, args.chunk, args.repeats)
+    elif args.benchmark == 'timeseries':
+        benchmark_timeseries(args.records, args.history_days, args.firestore_ms, args.doc_ms, args.runs)
+    elif args.benchmark == 'auth':
+        benchmark_auth(args.requests, args.users, args.fetch_ms)
+    elif args.benchmark == 'overload':
+        benchmark_overload(args.rate, args.duration, args.users, args.read_rate,
+                           args.infer_ms, args.llm_ms, args.timeout)
+    elif args.benchmark == 'model-swap':
+        benchmark_model_swap(args.architecture, args.img_size, args.interval_ms, args.shadow_requests)
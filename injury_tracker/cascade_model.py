@@ -0,0 +1,222 @@
+"""
+Train and calibrate the cascade gate model.
+A small CNN at low resolution answers confidently easy inputs (mostly clear
+mild abrasions) and escalates everything else to the full MobileNetV2 model.
+
+The images the full model was not trained on are split in two: one part
+stops gate training early, the other is used for nothing but calibration.
+Per-class confidence thresholds are tuned on the calibration part so
+that severe-class recall of the cascade is no lower than the full model's and
+overall accuracy drops by at most --max-accuracy-drop. The gate is saved with
+its thresholds and an escalation/latency report next to it; point
+GATE_MODEL_PATH at it to enable cascade inference in the API.
+
+Usage:
+    python cascade_model.py                                  # Train gate, calibrate, report
+    python cascade_model.py --gate-size 96 --epochs 40
+    python cascade_model.py --calibrate-only                 # Re-tune thresholds of an existing gate
+"""
+import os
+import argparse
+from typing import Dict, Tuple
+
+import numpy as np
+
+THRESHOLD_GRID = np.round(np.arange(0.50, 1.00, 0.01), 2)
+NEVER = 1.01  # Threshold above any probability: the gate never answers this class
+
+
+def calibrate_thresholds(
+    labels: np.ndarray,
+    gate_probs: np.ndarray,
+    full_probs: np.ndarray,
+    class_names: list,
+    severe_class: int = 2,
+    max_accuracy_drop: float = 0.01
+) -> Tuple[Dict[str, float], Dict]:
+    """
+    Pick per-class gate thresholds that maximize the share answered by the gate.
+
+    Inputs answered by the gate are disjoint per gate class, so each class's
+    contribution to accuracy and severe recall is precomputed for every
+    threshold and all combinations are scored with broadcasting.
+
+    Args:
+        labels: True class indices of the calibration set
+        gate_probs: Gate model probabilities, shape (n, classes)
+        full_probs: Full model probabilities, shape (n, classes)
+        class_names: Class names in label order
+        severe_class: Index of the class whose recall must not drop
+        max_accuracy_drop: Allowed drop in overall accuracy
+
+    Returns:
+        Tuple of (thresholds per class name, calibration statistics)
+    """
+    gate_pred = gate_probs.argmax(axis=1)
+    gate_conf = gate_probs.max(axis=1)
+    full_pred = full_probs.argmax(axis=1)
+    n_classes = len(class_names)
+    grid = np.append(THRESHOLD_GRID, NEVER)
+
+    severe = labels == severe_class
+    full_correct = full_pred == labels
+    full_accuracy = full_correct.mean()
+    full_severe_hits = (full_correct & severe).sum()
+
+    # Per gate class and threshold: accepted count and change in correct answers
+    accepted = np.zeros((n_classes, len(grid)))
+    delta_correct = np.zeros((n_classes, len(grid)))
+    delta_severe = np.zeros((n_classes, len(grid)))
+    for c in range(n_classes):
+        for j, threshold in enumerate(grid):
+            mask = (gate_pred == c) & (gate_conf >= threshold)
+            gate_correct = gate_pred[mask] == labels[mask]
+            accepted[c, j] = mask.sum()
+            delta_correct[c, j] = gate_correct.sum() - full_correct[mask].sum()
+            delta_severe[c, j] = (gate_correct & severe[mask]).sum() - (full_correct & severe)[mask].sum()
+
+    # Combine every threshold triple (one axis per class)
+    shape = [len(grid)] * n_classes
+    total_accepted = np.zeros(shape)
+    total_correct = np.zeros(shape)
+    total_severe = np.zeros(shape)
+    for c in range(n_classes):
+        axis_shape = [1] * n_classes
+        axis_shape[c] = len(grid)
+        total_accepted = total_accepted + accepted[c].reshape(axis_shape)
+        total_correct = total_correct + delta_correct[c].reshape(axis_shape)
+        total_severe = total_severe + delta_severe[c].reshape(axis_shape)
+
+    accuracy = full_accuracy + total_correct / len(labels)
+    feasible = (total_severe >= 0) & (accuracy >= full_accuracy - max_accuracy_drop)
+
+    # Among equally good combinations prefer higher accuracy, then stricter thresholds
+    strictness = sum(np.arange(len(grid)).reshape([len(grid) if i == c else 1 for i in range(n_classes)])
+                     for c in range(n_classes))
+    score = np.where(feasible, total_accepted + accuracy * 1e-3 + strictness * 1e-6, -1)
+    best = np.unravel_index(np.argmax(score), shape)
+
+    thresholds = {name: float(grid[best[c]]) for c, name in enumerate(class_names)}
+    n_severe = max(int(severe.sum()), 1)
+    stats = {
+        'samples': int(len(labels)),
+        'escalation_rate': float(1 - total_accepted[best] / len(labels)),
+        'full_accuracy': float(full_accuracy),
+        'cascade_accuracy': float(accuracy[best]),
+        'full_severe_recall': float(full_severe_hits / n_severe),
+        'cascade_severe_recall': float((full_severe_hits + total_severe[best]) / n_severe)
+    }
+    return thresholds, stats
+
+
+def build_cascade(args):
+    """Train (unless --calibrate-only), calibrate and save the gate model."""
+    from ml_model import WoundClassifier, model_metadata_path, split_dataset, update_model_metadata
+    from dataset_shards import ShardedDataset, build_shards
+
+    if not os.path.exists(args.model):
+        raise SystemExit(f"Full model not found: {args.model}. Run train_model.py first.")
+
+    build_shards(args.data_dir, args.shards)
+    shards = ShardedDataset(args.shards)
+    # The full model's split: neither model was trained on the held-out images.
+    # Thresholds tuned on the images that also stopped gate training would
+    # be biased towards the gate, so calibration gets its own part.
+    train_idx, held_out_idx = split_dataset(shards.labels, 0.2, args.seed)
+    val_pos, calibration_pos = split_dataset(shards.labels[held_out_idx], args.calibration_split, args.seed)
+    val_idx, calibration_idx = held_out_idx[val_pos], held_out_idx[calibration_pos]
+
+    full = WoundClassifier(args.model)
+
+    if args.calibrate_only:
+        gate = WoundClassifier(args.gate_path)
+    else:
+        print(f"Training {args.gate_size}x{args.gate_size} gate model...")
+        gate = WoundClassifier(architecture='small_cnn', img_size=args.gate_size,
+                               learning_rate=0.003, dropout=0.2)
+        train_ds = gate.make_dataset(shards.to_tf_dataset(train_idx), args.batch_size,
+                                     training=True, seed=args.seed, cache=False)
+        val_ds = gate.make_dataset(shards.to_tf_dataset(val_idx), args.batch_size, cache=False)
+        gate.fit(train_ds, val_ds, args.epochs, checkpoint_dir=None, verbose=2)
+        gate.save_model(args.gate_path)
+
+    print(f"Calibrating thresholds on {len(calibration_idx)} held-out images...")
+    calibration_images = shards.take(calibration_idx)
+    labels = shards.labels[calibration_idx]
+    thresholds, stats = calibrate_thresholds(
+        labels,
+        gate.predict_probabilities(calibration_images),
+        full.predict_probabilities(calibration_images),
+        full.class_names,
+        severe_class=full.class_names.index('severe'),
+        max_accuracy_drop=args.max_accuracy_drop
+    )
+
+    full_ms = full.measure_latency()
+    gate_ms = gate.measure_latency()
+    cascade_ms = gate_ms + stats['escalation_rate'] * full_ms
+    stats.update({
+        'full_latency_ms': round(full_ms, 2),
+        'gate_latency_ms': round(gate_ms, 2),
+        'cascade_latency_ms': round(cascade_ms, 2),
+        'latency_saved_ms': round(full_ms - cascade_ms, 2)
+    })
+
+    update_model_metadata(
+        args.gate_path,
+        thresholds=thresholds,
+        full_model=os.path.basename(args.model),
+        calibration=stats
+    )
+    config_path = model_metadata_path(args.gate_path)
+
+    print("-" * 50)
+    print("Thresholds: " + ", ".join(f"{name}={value:.2f}" for name, value in thresholds.items()))
+    print(f"Escalation rate:       {stats['escalation_rate']:.1%}")
+    print(f"Accuracy:              {stats['full_accuracy']:.4f} (full) -> "
+          f"{stats['cascade_accuracy']:.4f} (cascade)")
+    print(f"Severe recall:         {stats['full_severe_recall']:.4f} (full) -> "
+          f"{stats['cascade_severe_recall']:.4f} (cascade)")
+    print(f"Latency per image:     {full_ms:.1f} ms (full), {gate_ms:.1f} ms (gate), "
+          f"{cascade_ms:.1f} ms (cascade average)")
+    print(f"Average latency saved: {full_ms - cascade_ms:.1f} ms "
+          f"({(full_ms - cascade_ms) / full_ms:.0%})")
+    print(f"\nGate model saved to {args.gate_path}, thresholds to {config_path}")
+    if cascade_ms < full_ms:
+        print(f"Enable with: GATE_MODEL_PATH={args.gate_path}")
+    else:
+        print("The gate escalates too often to save time; leave GATE_MODEL_PATH unset.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train and calibrate the cascade gate model')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', './models/wound_classifier.h5'),
+                        help='Full model (default: $MODEL_PATH or ./models/wound_classifier.h5)')
+    parser.add_argument('--gate-path', default='./models/gate_model.h5',
+                        help='Gate model output path (default: ./models/gate_model.h5)')
+    parser.add_argument('--gate-size', type=int, default=96,
+                        help='Gate input height and width (default: 96)')
+    parser.add_argument('--epochs', type=int, default=40,
+                        help='Maximum gate training epochs (default: 40)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Batch size (default: 32)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help='Allowed overall accuracy drop (default: 0.01)')
+    parser.add_argument('--calibration-split', type=float, default=0.5,
+                        help='Share of the held-out images used only for calibration; '
+                             'the rest stops gate training early (default: 0.5)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Train/validation split seed (default: 42)')
+    parser.add_argument('--data-dir', default='./dataset',
+                        help='Dataset directory (default: ./dataset)')
+    parser.add_argument('--shards', default='./dataset_shards',
+                        help='Shard directory (default: ./dataset_shards)')
+    parser.add_argument('--calibrate-only', action='store_true',
+                        help='Skip training and re-calibrate the existing gate model')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Wound Severity Classifier - Cascade Gate")
+    print("=" * 50)
+
+    build_cascade(args)
@@ -0,0 +1,381 @@
+"""
+CPU threading and affinity for model inference.
+
+By default TensorFlow sizes its intra-op and inter-op thread pools (and
+oneDNN its OpenMP pool) to every core of the machine, in every uvicorn
+worker. With several workers, plus the threadpool the API runs inference
+and Firestore calls in, the pools oversubscribe the cores and fight over
+them. This module sets the pools per worker:
+
+    TF_INTRA_OP_THREADS  Threads one operation is split across
+    TF_INTER_OP_THREADS  Operations run at the same time
+    OMP_NUM_THREADS      OpenMP (oneDNN) threads
+    CPU_PINNING          'off', 'auto' (worker N gets the Nth equal share of
+                         the cores), or a CPU list such as '0-3,8'
+    WEB_CONCURRENCY      Worker processes on the host (as for uvicorn --workers)
+
+Unset values come from the configuration tuned for this host's core count
+and worker count (THREADING_CONFIG_PATH, written by the autotune command
+below), else from the worker's share of the cores. The settings only take
+effect before TensorFlow starts, so configure_threading() runs before
+ml_model is imported.
+
+Usage:
+    python cpu_threading.py                          # Sweep settings, save the best
+    python cpu_threading.py --workers 4 --seconds 10
+    python cpu_threading.py --max-p99-ms 80          # Fastest config within a latency budget
+"""
+import os
+import json
+import time
+import tempfile
+import argparse
+import itertools
+import threading
+import multiprocessing
+from datetime import datetime
+from typing import Dict, List, Optional
+
+THREADING_CONFIG_PATH = os.getenv('THREADING_CONFIG_PATH', './models/threading.json')
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Holds this worker's CPU slot lock for the life of the process
+_slot_lock = None
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """
+    Parse a CPU list such as '0-3,8'.
+
+    Args:
+        text: Comma-separated CPU numbers and ranges
+
+    Returns:
+        Sorted CPU numbers
+
+    Raises:
+        ValueError: Malformed list
+    """
+    cpus = set()
+    for part in text.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        elif part:
+            cpus.add(int(part))
+    if not cpus:
+        raise ValueError(f"Empty CPU list: {text!r}")
+    return sorted(cpus)
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_share(cpus: List[int], workers: int, slot: int) -> List[int]:
+    """The slot-th of `workers` equal, contiguous shares of cpus."""
+    share = max(1, len(cpus) // workers)
+    start = (slot * share) % len(cpus)
+    return cpus[start:start + share]
+
+
+def claim_cpu_slot(workers: int) -> Optional[int]:
+    """
+    Claim a worker slot for this process.
+
+    Each worker holds an exclusive lock on one slot file, so workers started
+    (or restarted) independently end up on different slots.
+
+    Args:
+        workers: Worker processes on the host
+
+    Returns:
+        Slot number, or None when every slot is taken or locking is unsupported
+    """
+    global _slot_lock
+    try:
+        import fcntl
+    except ImportError:
+        return None
+
+    for slot in range(workers):
+        lock = open(os.path.join(tempfile.gettempdir(), f"injury_tracker_cpu_slot_{slot}.lock"), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        _slot_lock = lock
+        return slot
+    return None
+
+
+def load_threading_config(cpus: int, workers: int, path: str = THREADING_CONFIG_PATH) -> Dict:
+    """
+    Tuned settings for a core count and worker count.
+
+    Args:
+        cpus: Cores available to the API
+        workers: Worker processes
+        path: Configuration file written by the autotune command
+
+    Returns:
+        Settings dict (empty if none were tuned for this host shape)
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get(str(cpus), {}).get(str(workers), {})
+
+
+def apply_threading(intra_op_threads: int, inter_op_threads: int,
+                    omp_num_threads: Optional[int], affinity: Optional[List[int]] = None) -> bool:
+    """
+    Set thread pool sizes and CPU affinity for this process.
+
+    Args:
+        intra_op_threads: TensorFlow intra-op threads (0: TensorFlow default)
+        inter_op_threads: TensorFlow inter-op threads (0: TensorFlow default)
+        omp_num_threads: OpenMP threads (None: leave unset)
+        affinity: CPUs to pin the process to (None: no pinning)
+
+    Returns:
+        False if TensorFlow had already started and kept its thread pools
+    """
+    if affinity and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, affinity)
+    if omp_num_threads:
+        os.environ['OMP_NUM_THREADS'] = str(omp_num_threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(intra_op_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(inter_op_threads)
+
+    # OpenMP reads its variable when TensorFlow loads; the pool sizes are
+    # set explicitly too, which fails once TensorFlow has started
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError:
+        return False  # Already initialized
+    return True
+
+
+def configure_threading(workers: int = WEB_CONCURRENCY, path: str = THREADING_CONFIG_PATH) -> Dict:
+    """
+    Apply the thread pool and affinity settings for this worker.
+
+    Call before TensorFlow is imported.
+
+    Args:
+        workers: Worker processes on the host
+        path: Tuned configuration file
+
+    Returns:
+        The applied settings, with their source ('env', 'tuned' or 'default')
+    """
+    cpus = available_cpus()
+    tuned = load_threading_config(len(cpus), workers, path)
+    source = 'tuned' if tuned else 'default'
+
+    pinning = os.getenv('CPU_PINNING') or ('auto' if tuned.get('pin') else 'off')
+    affinity = None
+    if pinning == 'auto':
+        slot = claim_cpu_slot(workers) if workers > 1 else None
+        affinity = worker_share(cpus, workers, slot) if slot is not None else None
+    elif pinning != 'off':
+        affinity = parse_cpu_list(pinning)
+    share = len(affinity) if affinity else max(1, len(cpus) // workers)
+
+    settings = {
+        'intra_op_threads': tuned.get('intra_op_threads', share),
+        'inter_op_threads': tuned.get('inter_op_threads', 1),
+        'omp_num_threads': tuned.get('omp_num_threads', share)
+    }
+    overrides = {
+        'intra_op_threads': 'TF_INTRA_OP_THREADS',
+        'inter_op_threads': 'TF_INTER_OP_THREADS',
+        'omp_num_threads': 'OMP_NUM_THREADS'
+    }
+    for key, name in overrides.items():
+        if os.getenv(name):
+            settings[key] = int(os.getenv(name))
+            source = 'env'
+
+    applied = apply_threading(settings['intra_op_threads'], settings['inter_op_threads'],
+                              settings['omp_num_threads'], affinity)
+    return dict(settings, cpus=len(cpus), workers=workers, cpu_affinity=affinity,
+                source=source, applied=applied)
+
+
+def _candidates(cpus: int, workers: int) -> List[Dict]:
+    """Settings to sweep: TensorFlow's defaults, then thread counts around the per-worker share."""
+    share = max(1, cpus // workers)
+    candidates = [{'name': 'tensorflow default', 'intra_op_threads': 0, 'inter_op_threads': 0,
+                   'omp_num_threads': None, 'pin': False}]
+    intra_options = sorted({1, 2, max(1, share // 2), share, cpus} & set(range(1, cpus + 1)))
+    pin_options = (False, True) if workers > 1 and hasattr(os, 'sched_setaffinity') else (False,)
+    for intra, inter, pin in itertools.product(intra_options, (1, 2), pin_options):
+        candidates.append({'name': f"intra={intra} inter={inter}{' pinned' if pin else ''}",
+                           'intra_op_threads': intra, 'inter_op_threads': inter,
+                           'omp_num_threads': intra, 'pin': pin})
+    return candidates
+
+
+def _autotune_worker(settings: Dict, affinity: Optional[List[int]], model_path: Optional[str],
+                     architecture: str, concurrency: int, seconds: float, barrier, results):
+    """One simulated API worker: `concurrency` threads classifying single images in a loop."""
+    os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    apply_threading(settings['intra_op_threads'], settings['inter_op_threads'],
+                    settings['omp_num_threads'], affinity)
+
+    import numpy as np
+    from ml_model import WoundClassifier
+
+    if model_path and os.path.exists(model_path):
+        classifier = WoundClassifier(model_path)
+    else:
+        classifier = WoundClassifier(architecture=architecture)
+    images = np.random.RandomState(0).randint(
+        0, 256, (16, classifier.img_height, classifier.img_width, 3), dtype=np.uint8
+    )
+    for image in images:
+        classifier.predict_array(image)  # Warm up
+
+    latencies = []
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset: int):
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            classifier.predict_array(images[i % len(images)])
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(latencies)
+
+
+def measure(settings: Dict, workers: int, model_path: Optional[str], architecture: str,
+            concurrency: int, seconds: float) -> Dict:
+    """
+    Run the benchmark workload with one candidate's settings.
+
+    Every worker is a fresh process (thread pool sizes cannot change once
+    TensorFlow has started); all of them load the model, warm up, then
+    classify images for `seconds` at the same time.
+
+    Returns:
+        Images per second across all workers and per-request p50/p99 latency in ms
+    """
+    import numpy as np
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    cpus = available_cpus()
+    processes = [
+        context.Process(target=_autotune_worker, args=(
+            settings, worker_share(cpus, workers, slot) if settings['pin'] else None,
+            model_path, architecture, concurrency, seconds, barrier, results
+        ))
+        for slot in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    latencies = np.concatenate([results.get() for _ in processes])
+    for process in processes:
+        process.join()
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {'images_per_second': round(len(latencies) / seconds, 1),
+            'p50_ms': round(float(p50), 2), 'p99_ms': round(float(p99), 2)}
+
+
+def autotune(workers: int, model_path: Optional[str], architecture: str, concurrency: int,
+             seconds: float, max_p99_ms: Optional[float], path: str = THREADING_CONFIG_PATH) -> Dict:
+    """
+    Sweep thread settings on this host and save the best for its core and worker count.
+
+    The best candidate has the highest throughput among those within
+    max_p99_ms (or the lowest p99 latency if none is).
+
+    Returns:
+        The saved settings
+    """
+    cpus = len(available_cpus())
+    candidates = _candidates(cpus, workers)
+    print(f"{cpus} cores, {workers} workers x {concurrency} inference threads, "
+          f"{len(candidates)} candidates x {seconds:.0f}s")
+    print("-" * 50)
+    print(f"{'settings':<28}{'images/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for candidate in candidates:
+        candidate.update(measure(candidate, workers, model_path, architecture, concurrency, seconds))
+        print(f"{candidate['name']:<28}{candidate['images_per_second']:>10.1f}"
+              f"{candidate['p50_ms']:>9.1f}{candidate['p99_ms']:>9.1f}")
+
+    # TensorFlow's defaults are the baseline, not a configuration to save
+    tuned = candidates[1:]
+    within = [c for c in tuned if max_p99_ms is None or c['p99_ms'] <= max_p99_ms]
+    best = max(within, key=lambda c: c['images_per_second']) if within else min(tuned, key=lambda c: c['p99_ms'])
+    baseline = candidates[0]
+
+    settings = {key: best[key] for key in ('intra_op_threads', 'inter_op_threads', 'omp_num_threads', 'pin',
+                                           'images_per_second', 'p50_ms', 'p99_ms')}
+    settings.update(baseline={key: baseline[key] for key in ('images_per_second', 'p50_ms', 'p99_ms')},
+                    model=model_path if model_path and os.path.exists(model_path) else architecture,
+                    tuned_at=datetime.utcnow().isoformat())
+
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+    config.setdefault(str(cpus), {})[str(workers)] = settings
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+    print("-" * 50)
+    print(f"Best: {best['name']} ({best['images_per_second']:.1f} images/s, p99 {best['p99_ms']:.1f} ms; "
+          f"TensorFlow default {baseline['images_per_second']:.1f} images/s, p99 {baseline['p99_ms']:.1f} ms)")
+    print(f"Saved to {path} for {cpus} cores, {workers} workers")
+    return settings
+
+
+if __name__ == "__main__":
+    from admission import INFERENCE_CONCURRENCY
+
+    parser = argparse.ArgumentParser(description='Tune inference thread settings for this host')
+    parser.add_argument('--workers', type=int, default=WEB_CONCURRENCY,
+                        help='API worker processes (default: WEB_CONCURRENCY or 1)')
+    parser.add_argument('--concurrency', type=int, default=INFERENCE_CONCURRENCY,
+                        help='Inference calls in flight per worker (default: INFERENCE_CONCURRENCY)')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', './models/wound_classifier.h5'),
+                        help='Model to benchmark (default: MODEL_PATH)')
+    parser.add_argument('--architecture', default='mobilenetv2', choices=['mobilenetv2', 'small_cnn'],
+                        help='Untrained stand-in when the model file does not exist (default: mobilenetv2)')
+    parser.add_argument('--seconds', type=float, default=5,
+                        help='Measured seconds per candidate (default: 5)')
+    parser.add_argument('--max-p99-ms', type=float, default=None,
+                        help='Latency budget: fastest candidate within this p99 wins')
+    parser.add_argument('--output', default=THREADING_CONFIG_PATH,
+                        help=f'Configuration file (default: {THREADING_CONFIG_PATH})')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Injury Tracker - Inference Threading Autotune")
+    print("=" * 50)
+
+    autotune(args.workers, args.model, args.architecture, args.concurrency,
+             args.seconds, args.max_p99_ms, args.output)
@@ -0,0 +1,242 @@
+"""
+Combined data for the injury history screen.
+
+The screen needs the first page of records, the user's statistics and the
+details of the most recent record. build_dashboard returns all three in one
+response, with the Firestore reads running concurrently in the threadpool
+(the Firestore client is blocking). Statistics come from count aggregation
+queries instead of reading every record.
+
+Clients keep the records they have seen and refresh with a sync token:
+build_changes returns only the records modified since the token (by their
+updatedAt) and the IDs of records deleted since (from tombstones). A sync
+with more changes than fit on a page hands out page tokens, which continue
+after the last record returned and remember when the sync started.
+"""
+import os
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from firebase_service import TOMBSTONE_RETENTION_DAYS
+
+SEVERITIES = ('mild', 'moderate', 'severe')
+STATUSES = ('active', 'healing', 'resolved')
+
+# Record fields shown in the history list
+SUMMARY_FIELDS = ('id', 'severity', 'confidence', 'status', 'createdAt', 'updatedAt', 'imageHash')
+
+# Document fields read for a summary (the ID is not a field)
+LIST_FIELDS = [field for field in SUMMARY_FIELDS if field != 'id']
+
+# Writes whose updatedAt was taken up to this long before they committed are
+# still picked up by the next sync (clients may see such records twice)
+SYNC_SKEW_SECONDS = float(os.getenv('SYNC_SKEW_SECONDS', 5))
+
+PAGE_TOKEN_PREFIX = 'page|'
+
+
+def _summary(record: Dict) -> Dict:
+    return {field: record.get(field) for field in SUMMARY_FIELDS}
+
+
+def _sync_token(now: datetime) -> str:
+    """Token for a sync that read everything up to now."""
+    return (now - timedelta(seconds=SYNC_SKEW_SECONDS)).isoformat()
+
+
+def parse_sync_token(token: str, now: datetime) -> Optional[str]:
+    """
+    Validate a sync token.
+
+    Args:
+        token: Token from an earlier response
+        now: Current UTC time
+
+    Returns:
+        The token, or None when it is older than the tombstone retention
+        (deletions may have been forgotten, so the client must resync fully)
+
+    Raises:
+        ValueError: The token is malformed
+    """
+    issued = datetime.fromisoformat(token)
+    if issued.tzinfo is not None:
+        raise ValueError(f"Invalid sync token: {token}")
+    if issued < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        return None
+    return token
+
+
+def _page_token(started: datetime, record: Dict) -> str:
+    """Token for the next page of a sync that started at started."""
+    return PAGE_TOKEN_PREFIX + '|'.join((started.isoformat(), record['updatedAt'], record['id']))
+
+
+def parse_page_token(token: str, now: datetime) -> Optional[Tuple[datetime, str, str]]:
+    """
+    Validate a page token.
+
+    The page cursor itself may be arbitrarily old (a full sync pages through
+    old records); only the start of the sync is checked against the
+    tombstone retention, since deletions after it must still be known.
+
+    Args:
+        token: Page token from an earlier response
+        now: Current UTC time
+
+    Returns:
+        (sync start, updatedAt and ID of the last record sent), or None when
+        the sync started longer ago than the tombstone retention
+
+    Raises:
+        ValueError: The token is malformed
+    """
+    parts = token[len(PAGE_TOKEN_PREFIX):].split('|')
+    if len(parts) != 3 or not all(parts):
+        raise ValueError(f"Invalid page token: {token}")
+    started = datetime.fromisoformat(parts[0])
+    datetime.fromisoformat(parts[1])
+    if started.tzinfo is not None:
+        raise ValueError(f"Invalid page token: {token}")
+    if started < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        return None
+    return started, parts[1], parts[2]
+
+
+async def user_statistics(firebase_service, user_id: str) -> Dict:
+    """
+    Count a user's records in total and per severity.
+
+    Args:
+        firebase_service: FirebaseService
+        user_id: User ID
+
+    Returns:
+        Statistics summary
+    """
+    total, *counts = await asyncio.gather(
+        run_in_threadpool(firebase_service.count_injuries, user_id),
+        *(run_in_threadpool(firebase_service.count_injuries, user_id, severity) for severity in SEVERITIES)
+    )
+    return {
+        'total_injuries': total,
+        'severity_breakdown': dict(zip(SEVERITIES, counts)),
+        'user_id': user_id
+    }
+
+
+async def build_changes(firebase_service, user_id: str, since: Optional[str] = None, limit: int = 100) -> Dict:
+    """
+    Get the records changed and deleted since a sync token.
+
+    Args:
+        firebase_service: FirebaseService
+        user_id: User ID
+        since: Sync or page token from an earlier response; None for a full sync
+        limit: Maximum number of changed records
+
+    Returns:
+        Dict with injuries (summaries of new and modified records, oldest
+        change first), deleted (record IDs), full (True when the client must
+        drop its cached records before applying the changes), has_more (call
+        again with sync_token, then a page token, for the next page) and
+        sync_token
+
+    Raises:
+        ValueError: since is malformed
+    """
+    now = datetime.utcnow()
+    started, after, after_id = now, None, None
+    if since and since.startswith(PAGE_TOKEN_PREFIX):
+        page = parse_page_token(since, now)
+        if page:
+            started, after, after_id = page
+    elif since:
+        after = parse_sync_token(since, now)
+
+    if after:
+        records, tombstones = await asyncio.gather(
+            run_in_threadpool(firebase_service.get_injury_changes, user_id, after, limit + 1, LIST_FIELDS, after_id),
+            run_in_threadpool(firebase_service.get_tombstones, user_id, after)
+        )
+    else:
+        records = await run_in_threadpool(firebase_service.get_injury_changes, user_id, None, limit + 1, LIST_FIELDS)
+        tombstones = []
+
+    has_more = len(records) > limit
+    records = records[:limit]
+    # The next page continues after the last record returned
+    sync_token = _page_token(started, records[-1]) if has_more else _sync_token(now)
+
+    return {
+        'injuries': [_summary(record) for record in records],
+        'deleted': [tombstone['injuryId'] for tombstone in tombstones
+                    if not has_more or tombstone['deletedAt'] <= records[-1]['updatedAt']],
+        'full': after is None,
+        'has_more': has_more,
+        'sync_token': sync_token
+    }
+
+
+async def build_dashboard(firebase_service, user_id: str, limit: int = 20, since: Optional[str] = None) -> Dict:
+    """
+    Build the injury history screen data in one go.
+
+    With a sync token, only the changes since then are returned; if there
+    are more than limit of them (or the token expired) the response is a
+    full first page instead.
+
+    Args:
+        firebase_service: FirebaseService
+        user_id: User ID
+        limit: Number of record summaries
+        since: Sync token from an earlier response
+
+    Returns:
+        Dict with injuries (summaries, newest first), deleted (record IDs),
+        full (True when injuries replaces the client's cached records),
+        statistics, latest (full details of the newest record, or None when
+        only changes are returned) and sync_token
+
+    Raises:
+        ValueError: since is malformed
+    """
+    statistics = None
+    if since:
+        changes, statistics = await asyncio.gather(
+            build_changes(firebase_service, user_id, since, limit),
+            user_statistics(firebase_service, user_id)
+        )
+        if not changes['full'] and not changes['has_more']:
+            return {
+                'injuries': changes['injuries'][::-1],
+                'deleted': changes['deleted'],
+                'full': False,
+                'statistics': statistics,
+                'latest': None,
+                'sync_token': changes['sync_token']
+            }
+
+    sync_token = _sync_token(datetime.utcnow())
+    # The list reads only the summary fields; the latest record is read in
+    # full (with its recommendations) by a separate one-record query
+    reads = [
+        run_in_threadpool(firebase_service.get_injury_records, user_id, limit, LIST_FIELDS),
+        run_in_threadpool(firebase_service.get_injury_records, user_id, 1)
+    ]
+    if statistics is None:
+        records, latest, statistics = await asyncio.gather(*reads, user_statistics(firebase_service, user_id))
+    else:
+        records, latest = await asyncio.gather(*reads)
+
+    return {
+        'injuries': [_summary(record) for record in records],
+        'deleted': [],
+        'full': True,
+        'statistics': statistics,
+        'latest': latest[0] if latest else None,
+        'sync_token': sync_token
+    }
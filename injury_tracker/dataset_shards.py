@@ -0,0 +1,357 @@
+"""
+Preprocessed dataset shards.
+Decodes the wound images once into memory-mappable uint8 shards so training,
+evaluation and benchmarks can skip JPEG decoding entirely.
+
+Shard directory layout:
+    dataset_shards/
+      ├── index.json          (labels, source hashes and shard locations)
+      ├── shard-00000.npy     (uint8 array of shape [rows, height, width, 3])
+      └── shard-00001.npy
+
+Rebuilds are incremental: only added or changed source files are decoded and
+appended to a new shard. Removed or replaced rows are dropped from the index
+and reclaimed once more than half of the stored rows are dead.
+
+Usage:
+    python dataset_shards.py                             # ./dataset -> ./dataset_shards
+    python dataset_shards.py --data-dir ./dataset --out ./dataset_shards --img-size 224
+    python dataset_shards.py --compact                   # Force a full rewrite of the shards
+"""
+import os
+import json
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+import numpy as np
+
+from image_io import decode_image, list_dataset_files
+
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+CLASS_NAMES = ['mild', 'moderate', 'severe']
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file without reading it into memory at once.
+
+    Args:
+        path: File path
+        chunk_size: Read size in bytes
+
+    Returns:
+        Hexadecimal hash string
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _decode_for_shard(args: Tuple[str, Tuple[int, int]]) -> np.ndarray:
+    """Process pool worker: decode one image at shard resolution."""
+    path, size = args
+    return decode_image(path, size)
+
+
+def load_index(shard_dir: str) -> Dict:
+    """
+    Load the shard index.
+
+    Args:
+        shard_dir: Shard directory
+
+    Returns:
+        Index dict, or None if the directory has no index yet
+    """
+    index_path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _write_index(shard_dir: str, index: Dict):
+    """Atomically replace the shard index."""
+    index_path = os.path.join(shard_dir, INDEX_FILE)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, index_path)
+
+
+def _shard_path(shard_dir: str, shard_id: int) -> str:
+    return os.path.join(shard_dir, f'shard-{shard_id:05d}.npy')
+
+
+def _write_shard(shard_dir: str, shard_id: int, images: np.ndarray):
+    """Write a shard file (written under a temporary name, then renamed)."""
+    path = _shard_path(shard_dir, shard_id)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, images)
+    os.replace(tmp_path, path)
+
+
+def build_shards(
+    data_dir: str,
+    shard_dir: str,
+    img_size: int = 224,
+    shard_size: int = 512,
+    workers: int = None,
+    compact: bool = False
+) -> Dict[str, int]:
+    """
+    Build or incrementally update the dataset shards.
+
+    Args:
+        data_dir: Dataset directory (mild/, moderate/, severe/)
+        shard_dir: Output shard directory
+        img_size: Height and width of the stored images
+        shard_size: Maximum number of images per shard file
+        workers: Decode processes (default: number of CPU cores)
+        compact: Rewrite all shards even if few rows are dead
+
+    Returns:
+        Counts of added, unchanged and removed images
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    size = (img_size, img_size)
+
+    index = load_index(shard_dir)
+    if (index is None or index.get('version') != INDEX_VERSION
+            or tuple(index.get('img_size', ())) != size
+            or index.get('class_names') != CLASS_NAMES):
+        index = {
+            'version': INDEX_VERSION,
+            'img_size': list(size),
+            'class_names': CLASS_NAMES,
+            'shards': {},
+            'entries': {}
+        }
+
+    old_entries = index['entries']
+    entries = {}
+    pending = []
+    paths, labels = list_dataset_files(data_dir, CLASS_NAMES)
+
+    for path, label in zip(paths, labels):
+        key = os.path.relpath(path, data_dir).replace(os.sep, '/')
+        stat = os.stat(path)
+        entry = old_entries.get(key)
+
+        # Cheap check first (size + mtime), then fall back to the content hash
+        if entry and entry['label'] == label:
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                entries[key] = entry
+                continue
+            sha256 = file_sha256(path)
+            if entry['sha256'] == sha256:
+                entries[key] = dict(entry, size=stat.st_size, mtime=stat.st_mtime)
+                continue
+        else:
+            sha256 = file_sha256(path)
+
+        pending.append((key, path, {
+            'label': label,
+            'sha256': sha256,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime
+        }))
+
+    next_shard = max((int(s) for s in index['shards']), default=-1) + 1
+
+    # Decode new and changed files in parallel, one shard at a time
+    if pending:
+        # Spawned, not forked: callers such as sweep_model have TensorFlow loaded.
+        # Workers import only image_io, so they do not load TensorFlow themselves.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for start in range(0, len(pending), shard_size):
+                batch = pending[start:start + shard_size]
+                images = np.stack(list(pool.map(
+                    _decode_for_shard,
+                    [(path, size) for _, path, _ in batch],
+                    chunksize=8
+                )))
+                _write_shard(shard_dir, next_shard, images)
+                index['shards'][str(next_shard)] = len(batch)
+
+                for row, (key, _, entry) in enumerate(batch):
+                    entries[key] = dict(entry, shard=next_shard, row=row)
+                next_shard += 1
+
+    index['entries'] = entries
+    # Counted after the merge: changed files are re-added, not removed
+    removed = len(set(old_entries) - set(entries))
+
+    # Drop shards without live rows and compact when most rows are dead
+    live_rows = {}
+    for entry in entries.values():
+        live_rows[entry['shard']] = live_rows.get(entry['shard'], 0) + 1
+    stored_rows = sum(index['shards'].values())
+    dead_shards = [int(s) for s in index['shards'] if int(s) not in live_rows]
+
+    if entries and (compact or len(entries) < stored_rows / 2):
+        dead_shards = [int(s) for s in index['shards']]
+        index['shards'] = _compact(shard_dir, entries, next_shard, shard_size)
+    else:
+        for shard_id in dead_shards:
+            del index['shards'][str(shard_id)]
+
+    _write_index(shard_dir, index)
+
+    for shard_id in dead_shards:
+        if str(shard_id) not in index['shards'] and os.path.exists(_shard_path(shard_dir, shard_id)):
+            os.remove(_shard_path(shard_dir, shard_id))
+
+    return {
+        'added': len(pending),
+        'unchanged': len(entries) - len(pending),
+        'removed': removed
+    }
+
+
+def _compact(shard_dir: str, entries: Dict, first_shard: int, shard_size: int) -> Dict[str, int]:
+    """Copy all live rows into new, densely packed shards (updates entries in place)."""
+    keys = sorted(entries)
+    mapped = {}
+    shards = {}
+
+    for start in range(0, len(keys), shard_size):
+        batch = keys[start:start + shard_size]
+        images = []
+        for key in batch:
+            entry = entries[key]
+            if entry['shard'] not in mapped:
+                mapped[entry['shard']] = np.load(_shard_path(shard_dir, entry['shard']), mmap_mode='r')
+            images.append(mapped[entry['shard']][entry['row']])
+
+        shard_id = first_shard + start // shard_size
+        _write_shard(shard_dir, shard_id, np.stack(images))
+        shards[str(shard_id)] = len(batch)
+        for row, key in enumerate(batch):
+            entries[key] = dict(entries[key], shard=shard_id, row=row)
+
+    return shards
+
+
+class ShardedDataset:
+    """Read-only, memory-mapped view of a shard directory."""
+
+    def __init__(self, shard_dir: str):
+        """
+        Open the shards in a directory.
+
+        Args:
+            shard_dir: Directory written by build_shards()
+        """
+        index = load_index(shard_dir)
+        if index is None:
+            raise FileNotFoundError(f"No shard index found in {shard_dir}. "
+                                    "Run: python dataset_shards.py")
+
+        self.shard_dir = shard_dir
+        self.class_names = index['class_names']
+        self.img_size = tuple(index['img_size'])
+
+        keys = sorted(index['entries'])
+        entries = [index['entries'][key] for key in keys]
+        self.paths = keys
+        self.hashes = [entry['sha256'] for entry in entries]
+        self.labels = np.array([entry['label'] for entry in entries], dtype=np.int32)
+        self._shard_ids = np.array([entry['shard'] for entry in entries], dtype=np.int32)
+        self._rows = np.array([entry['row'] for entry in entries], dtype=np.int64)
+        self._shards = {
+            int(shard_id): np.load(_shard_path(shard_dir, int(shard_id)), mmap_mode='r')
+            for shard_id in index['shards']
+        }
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def take(self, indices: np.ndarray = None) -> np.ndarray:
+        """
+        Gather images by dataset index.
+
+        Args:
+            indices: Dataset indices (default: all images)
+
+        Returns:
+            uint8 array of shape (len(indices), height, width, 3)
+        """
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices)
+
+        images = np.empty((len(indices),) + self.img_size + (3,), dtype=np.uint8)
+        shard_ids = self._shard_ids[indices]
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            images[mask] = self._shards[int(shard_id)][self._rows[indices[mask]]]
+        return images
+
+    def to_tf_dataset(self, indices: np.ndarray = None):
+        """
+        Create an unbatched tf.data dataset of (uint8 image, one-hot label) pairs.
+
+        Images are read from the memory-mapped shards on demand.
+
+        Args:
+            indices: Dataset indices to include (default: all images)
+
+        Returns:
+            tf.data.Dataset
+        """
+        import tensorflow as tf
+
+        if indices is None:
+            indices = np.arange(len(self))
+        num_classes = len(self.class_names)
+        shape = self.img_size + (3,)
+
+        def load(index):
+            image = tf.numpy_function(
+                lambda i: self.take(np.array([i]))[0], [index], tf.uint8
+            )
+            image.set_shape(shape)
+            return image, tf.one_hot(tf.gather(self.labels, index), num_classes)
+
+        dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+        return dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build preprocessed dataset shards')
+    parser.add_argument('--data-dir', default='./dataset',
+                        help='Dataset directory (default: ./dataset)')
+    parser.add_argument('--out', default='./dataset_shards',
+                        help='Shard directory (default: ./dataset_shards)')
+    parser.add_argument('--img-size', type=int, default=224,
+                        help='Stored image height and width (default: 224)')
+    parser.add_argument('--shard-size', type=int, default=512,
+                        help='Images per shard file (default: 512)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Decode processes (default: CPU count)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Rewrite all shards')
+    args = parser.parse_args()
+
+    counts = build_shards(
+        args.data_dir,
+        args.out,
+        img_size=args.img_size,
+        shard_size=args.shard_size,
+        workers=args.workers,
+        compact=args.compact
+    )
+
+    print(f"Shards written to {args.out}")
+    print(f"  - Added/updated: {counts['added']}")
+    print(f"  - Unchanged:     {counts['unchanged']}")
+    print(f"  - Removed:       {counts['removed']}")
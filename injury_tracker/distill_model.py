@@ -0,0 +1,169 @@
+"""
+Knowledge distillation of the wound classifier into a smaller student.
+The current model (teacher) labels every training image with its softmax
+probabilities once; the student is then trained on a blend of those soft
+targets and the hard dataset labels. The saved student is a drop-in .h5 for
+MODEL_PATH, and a report compares latency, model size and per-class accuracy
+with the teacher on the held-out validation split.
+
+Usage:
+    python distill_model.py                                  # MobileNetV2 alpha 0.35 @ 160px
+    python distill_model.py --student mobilenetv2 --alpha 0.35 --img-size 128
+    python distill_model.py --student small_cnn --img-size 128 --epochs 60
+    python distill_model.py --temperature 2.0 --hard-weight 0.3
+"""
+import os
+import argparse
+
+import numpy as np
+
+
+def soften(probabilities: np.ndarray, temperature: float) -> np.ndarray:
+    """
+    Apply a softmax temperature to probabilities (equivalent to scaling the logits).
+
+    Args:
+        probabilities: Softmax outputs, shape (n, classes)
+        temperature: > 1 flattens, < 1 sharpens the distribution
+
+    Returns:
+        Re-normalized probabilities
+    """
+    logits = np.log(np.clip(probabilities, 1e-7, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def evaluate(classifier, images: np.ndarray, labels: np.ndarray) -> dict:
+    """Accuracy, per-class accuracy, latency and size for one model."""
+    from metrics import evaluate_predictions
+
+    predicted = classifier.predict_probabilities(images).argmax(axis=1)
+    metrics = evaluate_predictions(labels, predicted, classifier.class_names)
+    return {
+        'accuracy': metrics['accuracy'],
+        'macro_f1': metrics['macro_f1'],
+        'per_class_accuracy': metrics['recall'],
+        'latency_ms': round(classifier.measure_latency(), 2),
+        'batch32_latency_ms': round(classifier.measure_latency(batch_size=32, runs=10), 2),
+        'parameters': int(classifier.model.count_params()),
+        'input_size': int(classifier.img_height)
+    }
+
+
+def distill(args):
+    """Train the student on teacher soft targets and hard labels, then report."""
+    import tensorflow as tf
+    from ml_model import WoundClassifier, model_metadata_path, split_dataset, update_model_metadata
+    from dataset_shards import ShardedDataset, build_shards
+
+    if not os.path.exists(args.teacher):
+        raise SystemExit(f"Teacher model not found: {args.teacher}. Run train_model.py first.")
+
+    build_shards(args.data_dir, args.shards)
+    shards = ShardedDataset(args.shards)
+    train_idx, val_idx = split_dataset(shards.labels, 0.2, args.seed)
+
+    teacher = WoundClassifier(args.teacher)
+    student = WoundClassifier(architecture=args.student, img_size=args.img_size,
+                              alpha=args.alpha, learning_rate=args.learning_rate)
+
+    # Soft targets: one batched teacher pass over the (already decoded) shards
+    print("Computing teacher soft targets...")
+    num_classes = teacher.num_classes
+    soft = soften(teacher.predict_probabilities(shards.take(train_idx)), args.temperature)
+    hard = np.eye(num_classes, dtype=np.float32)[shards.labels[train_idx]]
+    targets = (args.hard_weight * hard + (1 - args.hard_weight) * soft).astype(np.float32)
+
+    train_source = tf.data.Dataset.zip((
+        shards.to_tf_dataset(train_idx),
+        tf.data.Dataset.from_tensor_slices(targets)
+    )).map(lambda pair, target: (pair[0], target))
+
+    train_ds = student.make_dataset(train_source, args.batch_size, training=True,
+                                    seed=args.seed, cache=False)
+    val_ds = student.make_dataset(shards.to_tf_dataset(val_idx), args.batch_size, cache=False)
+
+    print(f"Training {args.student} student at {args.img_size}px"
+          + (f" (alpha {args.alpha})" if args.student == 'mobilenetv2' else "") + "...")
+    student.fit(train_ds, val_ds, args.epochs, checkpoint_dir=None, verbose=2)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    student.save_model(args.output)
+
+    print("Evaluating teacher and student on the validation split...")
+    val_images = shards.take(val_idx)
+    val_labels = shards.labels[val_idx]
+    report = {
+        'teacher': dict(evaluate(teacher, val_images, val_labels),
+                        file_size_bytes=os.path.getsize(args.teacher)),
+        'student': dict(evaluate(student, val_images, val_labels),
+                        file_size_bytes=os.path.getsize(args.output)),
+        'config': {
+            'student': args.student,
+            'img_size': args.img_size,
+            'alpha': args.alpha,
+            'temperature': args.temperature,
+            'hard_weight': args.hard_weight,
+            'teacher': os.path.basename(args.teacher)
+        }
+    }
+
+    update_model_metadata(args.output, distillation=report)
+    report_path = model_metadata_path(args.output)
+
+    teacher_report, student_report = report['teacher'], report['student']
+    print("-" * 50)
+    print(f"{'':<24}{'teacher':>12}{'student':>12}")
+    print(f"{'Input size':<24}{teacher_report['input_size']:>12}{student_report['input_size']:>12}")
+    print(f"{'Parameters':<24}{teacher_report['parameters']:>12,}{student_report['parameters']:>12,}")
+    print(f"{'File size (MB)':<24}{teacher_report['file_size_bytes'] / 1e6:>12.2f}"
+          f"{student_report['file_size_bytes'] / 1e6:>12.2f}")
+    print(f"{'Latency, 1 image (ms)':<24}{teacher_report['latency_ms']:>12.2f}"
+          f"{student_report['latency_ms']:>12.2f}")
+    print(f"{'Latency, 32 images (ms)':<24}{teacher_report['batch32_latency_ms']:>12.2f}"
+          f"{student_report['batch32_latency_ms']:>12.2f}")
+    print(f"{'Accuracy':<24}{teacher_report['accuracy']:>12.4f}{student_report['accuracy']:>12.4f}")
+    for name in teacher.class_names:
+        print(f"{'  ' + name:<24}{teacher_report['per_class_accuracy'][name]:>12.4f}"
+              f"{student_report['per_class_accuracy'][name]:>12.4f}")
+    print(f"\nStudent saved to {args.output}, report to {report_path}")
+    print(f"Use it with: MODEL_PATH={args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Distill the wound classifier into a smaller student')
+    parser.add_argument('--teacher', default=os.getenv('MODEL_PATH', './models/wound_classifier.h5'),
+                        help='Teacher model (default: $MODEL_PATH or ./models/wound_classifier.h5)')
+    parser.add_argument('--output', default='./models/student_classifier.h5',
+                        help='Student output path (default: ./models/student_classifier.h5)')
+    parser.add_argument('--student', choices=['mobilenetv2', 'small_cnn'], default='mobilenetv2',
+                        help='Student architecture (default: mobilenetv2)')
+    parser.add_argument('--img-size', type=int, default=160,
+                        help='Student input height and width (default: 160)')
+    parser.add_argument('--alpha', type=float, default=0.35,
+                        help='MobileNetV2 width multiplier (default: 0.35)')
+    parser.add_argument('--temperature', type=float, default=2.0,
+                        help='Softmax temperature applied to teacher probabilities (default: 2.0)')
+    parser.add_argument('--hard-weight', type=float, default=0.3,
+                        help='Weight of the hard labels in the targets (default: 0.3)')
+    parser.add_argument('--learning-rate', type=float, default=0.001,
+                        help='Student learning rate (default: 0.001)')
+    parser.add_argument('--epochs', type=int, default=40,
+                        help='Maximum training epochs (default: 40)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Batch size (default: 32)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Train/validation split seed (default: 42)')
+    parser.add_argument('--data-dir', default='./dataset',
+                        help='Dataset directory (default: ./dataset)')
+    parser.add_argument('--shards', default='./dataset_shards',
+                        help='Shard directory (default: ./dataset_shards)')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Wound Severity Classifier - Knowledge Distillation")
+    print("=" * 50)
+
+    distill(args)
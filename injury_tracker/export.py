@@ -0,0 +1,105 @@
+"""
+Streaming export of a user's injury history.
+
+Records are read page by page (FirebaseService.iter_injury_records) and
+encoded as they arrive, so the response starts before the history is read
+(CSV sends its header row first, NDJSON its first record) and memory use
+stays flat however long the history is. Two formats:
+
+    ndjson  One JSON object per line, the full record
+    csv     One row per record, the flat fields only
+"""
+import csv
+import io
+import itertools
+from typing import Dict, Iterable, Iterator
+
+from fast_json import dumps
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8'
+}
+
+CSV_COLUMNS = [
+    'id', 'createdAt', 'updatedAt', 'severity', 'confidence', 'status', 'notes',
+    'probability_mild', 'probability_moderate', 'probability_severe', 'urgency', 'imageHash', 'modelVersion'
+]
+
+# Encoded rows are sent in chunks of about this size
+EXPORT_CHUNK_BYTES = 32 * 1024
+
+
+def _csv_text(value) -> str:
+    """Cell text; user text that spreadsheets would run as a formula is quoted."""
+    text = '' if value is None else str(value)
+    if text[:1] in ('=', '+', '-', '@'):
+        return "'" + text
+    return text
+
+
+def _csv_row(record: Dict) -> list:
+    probabilities = record.get('probabilities') or {}
+    return [
+        record.get('id'),
+        record.get('createdAt'),
+        record.get('updatedAt'),
+        record.get('severity'),
+        record.get('confidence'),
+        record.get('status'),
+        _csv_text(record.get('notes')),
+        probabilities.get('mild'),
+        probabilities.get('moderate'),
+        probabilities.get('severe'),
+        (record.get('emergencyInfo') or {}).get('urgency'),
+        record.get('imageHash'),
+        record.get('modelVersion')
+    ]
+
+
+def ndjson_lines(records: Iterable[Dict]) -> Iterator[bytes]:
+    """Encode records as newline-delimited JSON."""
+    for record in records:
+        yield dumps(record) + b'\n'
+
+
+def csv_lines(records: Iterable[Dict]) -> Iterator[bytes]:
+    """Encode records as CSV rows, after a header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in itertools.chain([CSV_COLUMNS], map(_csv_row, records)):
+        writer.writerow(row)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_stream(records: Iterable[Dict], export_format: str, chunk_bytes: int = EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Encode records for a streaming response.
+
+    Args:
+        records: Records, typically a lazy iterator over Firestore pages
+        export_format: Key of EXPORT_FORMATS
+        chunk_bytes: Rows are joined into chunks of about this size
+
+    Yields:
+        Response body chunks
+    """
+    lines = ndjson_lines(records) if export_format == 'ndjson' else csv_lines(records)
+
+    # The first line goes out on its own so the client sees the response start
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first
+
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b''.join(chunk)
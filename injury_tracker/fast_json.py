@@ -0,0 +1,85 @@
+"""
+Fast JSON responses for data the API built itself.
+
+Endpoints without a response_model return plain dicts, which FastAPI walks
+with jsonable_encoder (a recursive Python pass that copies every value)
+before json.dumps. For records with nested recommendation dicts and
+Firestore timestamps that is most of a read request's CPU time, although
+the data came straight from Firestore or was assembled by our own code.
+
+Those endpoints return json_response(...) instead, which serializes in one
+pass with orjson when it is installed and with the stdlib encoder otherwise.
+Endpoints with a response_model keep it: FastAPI serializes those with
+Pydantic's compiled serializer, which is already fast.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Optional
+
+import numpy as np
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # Optional accelerator
+    orjson = None
+
+# Headers of the injected Response that describe its (empty) body
+_BODY_HEADERS = ('content-length', 'content-type')
+
+
+def _default(value: Any) -> Any:
+    """Convert values the JSON encoders do not handle natively."""
+    # Firestore timestamps are DatetimeWithNanoseconds, a datetime subclass
+    # that orjson does not serialize by itself
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize API data to JSON.
+
+    Args:
+        content: Dicts, lists and scalars, including datetimes (as ISO 8601),
+            NumPy scalars and Pydantic models
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    """
+    Build a JSON response without FastAPI's validation and encoding pass.
+
+    Args:
+        content: Response data
+        response: The endpoint's injected Response; headers set on it (ETag,
+            Idempotent-Replayed, ...) are carried over
+        status_code: HTTP status code
+
+    Returns:
+        Response to return from the endpoint
+    """
+    headers = None
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name not in _BODY_HEADERS}
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
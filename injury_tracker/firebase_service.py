@@ -1,12 +1,71 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
-from datetime import datetime
-from typing import Dict, Optional, List
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional, List
+import hashlib
+import json
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Texts shared between records are stored once here, keyed by the digest of their content
+CATALOG_COLLECTION = 'recommendation_catalog'
+CATALOG_CACHE_SIZE = 1024
+
+# Record fields that may be kept in the catalog, and the fields referencing them.
+# Entries written before emergency info got its own reference hold both fields
+# and are referenced by recommendationsRef.
+CATALOG_FIELDS = ('recommendations', 'emergencyInfo')
+CATALOG_REFS = ('recommendationsRef', 'emergencyInfoRef')
+
+# Deleted records leave a tombstone here so clients can sync deletions
+TOMBSTONE_COLLECTION = 'injury_tombstones'
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 30))
+
+# Records read per query when iterating over a user's whole history
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 200))
+
+# Per-user counter incremented with every write to the user's records
+VERSION_COLLECTION = 'user_versions'
+
+# Per-user, per-day record counts by severity and status, kept up to date by every write
+ROLLUP_COLLECTION = 'injury_rollups'
+
+
+def catalog_digest(entry: Dict) -> str:
+    """
+    Content digest of a catalog entry.
+    
+    Args:
+        entry: Catalog entry, e.g. {'emergencyInfo': {...}}
+        
+    Returns:
+        SHA-256 hex digest of the canonical JSON encoding
+    """
+    canonical = json.dumps(entry, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def rollup_day(record: Dict) -> str:
+    """
+    Day (UTC) whose rollup a record is counted in.
+    
+    Args:
+        record: Injury record
+        
+    Returns:
+        ISO date of the record's creation
+    """
+    return record['createdAt'][:10]
+
+
+def rollup_id(user_id: str, day: str) -> str:
+    """Document ID of a user's rollup for a day."""
+    return f"{user_id}_{day}"
+
 
 class FirebaseService:
     """Handle Firebase Firestore operations (storing only metadata and hash)."""
@@ -19,6 +78,94 @@ class FirebaseService:
             firebase_admin.initialize_app(self.cred)
         
         self.db = firestore.client()
+        
+        # Catalog entries never change (content-addressed), so they are cached without expiry
+        self._catalog_cache = OrderedDict()
+        self._catalog_lock = threading.Lock()
+    
+    def add_catalog_entry(self, batch, entry: Dict, added: Dict[str, Dict]) -> str:
+        """
+        Add a catalog entry to a write batch unless it is known to exist.
+        
+        Args:
+            batch: Firestore write batch
+            entry: Catalog entry, e.g. {'emergencyInfo': {...}}
+            added: Entries already added to this batch (digest -> entry),
+                updated in place; pass it to cache_catalog_entries once the
+                batch is committed
+            
+        Returns:
+            Digest referencing the catalog entry
+        """
+        digest = catalog_digest(entry)
+        with self._catalog_lock:
+            known = digest in self._catalog_cache
+        if not known and digest not in added:
+            # Same digest means same content, so concurrent writers cannot conflict
+            batch.set(
+                self.db.collection(CATALOG_COLLECTION).document(digest),
+                dict(entry, createdAt=datetime.utcnow().isoformat())
+            )
+            added[digest] = entry
+        return digest
+    
+    def cache_catalog_entries(self, entries: Dict[str, Dict]):
+        """Remember catalog entries that were written (digest -> entry)."""
+        for digest, entry in entries.items():
+            self._cache_catalog_entry(digest, entry)
+    
+    def get_catalog_entries(self, digests: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Resolve catalog references, from the in-process cache where possible.
+        
+        Args:
+            digests: Catalog digests
+            
+        Returns:
+            Dict of digest -> entry (the CATALOG_FIELDS it holds) for the
+            digests that exist
+        """
+        entries = {}
+        missing = []
+        with self._catalog_lock:
+            for digest in set(digests):
+                entry = self._catalog_cache.get(digest)
+                if entry is None:
+                    missing.append(digest)
+                else:
+                    self._catalog_cache.move_to_end(digest)
+                    entries[digest] = entry
+        
+        if missing:
+            catalog = self.db.collection(CATALOG_COLLECTION)
+            for doc in self.db.get_all([catalog.document(digest) for digest in missing]):
+                if doc.exists:
+                    data = doc.to_dict()
+                    entry = {field: data[field] for field in CATALOG_FIELDS if field in data}
+                    self._cache_catalog_entry(doc.id, entry)
+                    entries[doc.id] = entry
+        
+        return entries
+    
+    def _cache_catalog_entry(self, digest: str, entry: Dict):
+        # Called from threadpool threads: eviction must not race a lookup
+        with self._catalog_lock:
+            self._catalog_cache[digest] = entry
+            self._catalog_cache.move_to_end(digest)
+            if len(self._catalog_cache) > CATALOG_CACHE_SIZE:
+                self._catalog_cache.popitem(last=False)
+    
+    def _resolve_recommendations(self, records: List[Dict]) -> List[Dict]:
+        """Fill in the fields of records that reference the catalog."""
+        entries = self.get_catalog_entries(
+            record[ref] for record in records for ref in CATALOG_REFS if ref in record
+        )
+        for record in records:
+            for ref in CATALOG_REFS:
+                entry = entries.get(record.get(ref))
+                if entry:
+                    record.update(entry)
+        return records
     
     def store_injury_record(
         self,
@@ -29,7 +176,10 @@ class FirebaseService:
         probabilities: Dict,
         recommendations: Dict,
         emergency_info: Dict,
-        status: str = 'active'
+        status: str = 'active',
+        perceptual_hash: Optional[str] = None,
+        model_version: Optional[str] = None,
+        shared_recommendations: bool = False
     ) -> str:
         """
         Store injury tracking record in Firestore (only metadata and hash, no image).
@@ -43,11 +193,18 @@ class FirebaseService:
             recommendations: First aid recommendations dict
             emergency_info: Emergency information dict
             status: Status of injury (active, healing, resolved)
+            perceptual_hash: Perceptual hash of the image (for near-duplicate detection)
+            model_version: Version of the model that classified the image
+            shared_recommendations: The recommendations are static text many
+                records share (the fallback), so they are kept in the catalog;
+                generated text is unique to the record and stored in it
             
         Returns:
             Document ID of the stored record
         """
         injury_ref = self.db.collection('injuries').document()
+        batch = self.db.batch()
+        catalog_added = {}
         
         record = {
             'userId': user_id,
@@ -55,35 +212,60 @@ class FirebaseService:
             'severity': severity,
             'confidence': confidence,
             'probabilities': probabilities,
-            'recommendations': recommendations,
-            'emergencyInfo': emergency_info,
+            # Emergency info is fixed per severity; store a reference to it
+            'emergencyInfoRef': self.add_catalog_entry(
+                batch, {'emergencyInfo': emergency_info}, catalog_added
+            ),
             'status': status,
             'timestamp': firestore.SERVER_TIMESTAMP,
             'createdAt': datetime.utcnow().isoformat(),
             'updatedAt': datetime.utcnow().isoformat()
         }
+        if perceptual_hash:
+            record['perceptualHash'] = perceptual_hash
+        if model_version:
+            record['modelVersion'] = model_version
+        if shared_recommendations:
+            record['recommendationsRef'] = self.add_catalog_entry(
+                batch, {'recommendations': recommendations}, catalog_added
+            )
+        else:
+            record['recommendations'] = recommendations
         
-        injury_ref.set(record)
+        batch.set(injury_ref, record)
+        self._add_to_rollup(batch, user_id, rollup_day(record), 1, {
+            'severity': {severity: 1},
+            'status': {status: 1}
+        })
+        self._bump_version(batch, user_id)
+        batch.commit()
+        self.cache_catalog_entries(catalog_added)
         return injury_ref.id
     
     def get_injury_records(
         self,
         user_id: str,
-        limit: int = 50
+        limit: int = 50,
+        fields: Optional[List[str]] = None
     ) -> list:
         """
-        Get injury records for a user.
+        Get injury records for a user, newest first.
         
         Args:
             user_id: User ID
             limit: Maximum number of records to retrieve
+            fields: Only read these fields, for lists that show a summary;
+                catalog references are then not resolved (all fields,
+                resolved, if None)
             
         Returns:
             List of injury records
         """
         records = []
-        query = (self.db.collection('injuries')
-                .where('userId', '==', user_id)
+        query = self.db.collection('injuries').where('userId', '==', user_id)
+        if fields:
+            query = query.select(fields)
+        query = (query
                 .order_by('timestamp', direction=firestore.Query.DESCENDING)
                 .limit(limit))
         
@@ -94,8 +276,204 @@ class FirebaseService:
             record['id'] = doc.id
             records.append(record)
         
+        return records if fields else self._resolve_recommendations(records)
+    
+    def iter_injury_records(self, user_id: str, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Dict]:
+        """
+        Iterate over all of a user's injury records, newest first.
+        
+        Reads one page at a time with a query cursor, so memory use does not
+        grow with the number of records and no query stays open for long.
+        
+        Args:
+            user_id: User ID
+            page_size: Records read per query
+            
+        Yields:
+            Injury records
+        """
+        query = (self.db.collection('injuries')
+                .where('userId', '==', user_id)
+                .order_by('timestamp', direction=firestore.Query.DESCENDING)
+                .limit(page_size))
+        
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc else query
+            docs = list(page.stream())
+            
+            records = []
+            for doc in docs:
+                record = doc.to_dict()
+                record['id'] = doc.id
+                records.append(record)
+            yield from self._resolve_recommendations(records)
+            
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+    
+    def get_injury_changes(
+        self,
+        user_id: str,
+        after: Optional[str] = None,
+        limit: int = 100,
+        fields: Optional[List[str]] = None,
+        after_id: Optional[str] = None
+    ) -> list:
+        """
+        Get a user's records modified after a point in time, oldest change first.
+        
+        Records with the same updatedAt are ordered by document ID. Needs a
+        composite index on (userId, updatedAt).
+        
+        Args:
+            user_id: User ID
+            after: ISO timestamp; only records with a later updatedAt are returned
+            limit: Maximum number of records to retrieve
+            fields: Only read these fields (all fields if None)
+            after_id: With after, continue after the record (after, after_id)
+                instead, so records sharing its updatedAt are not skipped
+            
+        Returns:
+            List of injury records (recommendations are not resolved)
+        """
+        query = self.db.collection('injuries').where('userId', '==', user_id)
+        if after and not after_id:
+            query = query.where('updatedAt', '>', after)
+        if fields:
+            query = query.select(fields)
+        query = query.order_by('updatedAt').order_by('__name__')
+        if after and after_id:
+            query = query.start_after({'updatedAt': after, '__name__': after_id})
+        query = query.limit(limit)
+        
+        records = []
+        for doc in query.stream():
+            record = doc.to_dict()
+            record['id'] = doc.id
+            records.append(record)
+        
         return records
     
+    def get_tombstones(self, user_id: str, after: Optional[str] = None) -> list:
+        """
+        Get a user's deleted record IDs, oldest deletion first.
+        
+        Needs a composite index on (userId, deletedAt).
+        
+        Args:
+            user_id: User ID
+            after: ISO timestamp; only deletions after it are returned
+            
+        Returns:
+            List of dicts with injuryId and deletedAt
+        """
+        query = self.db.collection(TOMBSTONE_COLLECTION).where('userId', '==', user_id)
+        if after:
+            query = query.where('deletedAt', '>', after)
+        query = query.select(['injuryId', 'deletedAt']).order_by('deletedAt')
+        
+        return [doc.to_dict() for doc in query.stream()]
+    
+    def iter_all_injury_changes(
+        self,
+        after: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        page_size: int = EXPORT_PAGE_SIZE
+    ) -> Iterator[Dict]:
+        """
+        Iterate over all users' records modified after a point in time, oldest change first.
+        
+        Reads one page at a time with a query cursor (uses the automatic
+        single-field index on updatedAt).
+        
+        Args:
+            after: ISO timestamp; only records with a later updatedAt are returned
+            fields: Only read these fields (all fields if None)
+            page_size: Records read per query
+        
+        Yields:
+            Injury records (recommendations are not resolved)
+        """
+        query = self.db.collection('injuries')
+        if after:
+            query = query.where('updatedAt', '>', after)
+        if fields:
+            query = query.select(fields)
+        query = query.order_by('updatedAt').limit(page_size)
+        
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc else query
+            docs = list(page.stream())
+        
+            for doc in docs:
+                record = doc.to_dict()
+                record['id'] = doc.id
+                yield record
+        
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+    
+    def get_all_tombstones(self, after: Optional[str] = None) -> list:
+        """
+        Get all users' deleted record IDs, oldest deletion first.
+        
+        Args:
+            after: ISO timestamp; only deletions after it are returned
+        
+        Returns:
+            List of dicts with injuryId and deletedAt
+        """
+        query = self.db.collection(TOMBSTONE_COLLECTION)
+        if after:
+            query = query.where('deletedAt', '>', after)
+        query = query.select(['injuryId', 'deletedAt']).order_by('deletedAt')
+        
+        return [doc.to_dict() for doc in query.stream()]
+    
+    def count_injuries(self, user_id: str, severity: Optional[str] = None) -> int:
+        """
+        Count a user's injury records with an aggregation query (no documents are read).
+        
+        Args:
+            user_id: User ID
+            severity: Only count records of this severity
+            
+        Returns:
+            Number of records
+        """
+        query = self.db.collection('injuries').where('userId', '==', user_id)
+        if severity:
+            query = query.where('severity', '==', severity)
+        
+        result = query.count().get()
+        return int(result[0][0].value)
+    
+    def get_perceptual_hashes(self, user_id: str) -> List[tuple]:
+        """
+        Get the perceptual hashes of a user's records.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            List of (document ID, perceptual hash, createdAt) for records that have one
+        """
+        query = (self.db.collection('injuries')
+                .where('userId', '==', user_id)
+                .select(['perceptualHash', 'createdAt']))
+        
+        hashes = []
+        for doc in query.stream():
+            data = doc.to_dict()
+            if data.get('perceptualHash'):
+                hashes.append((doc.id, data['perceptualHash'], data.get('createdAt')))
+        
+        return hashes
+    
     def get_injury_by_id(self, injury_id: str) -> Optional[Dict]:
         """
         Get a specific injury record by ID.
@@ -111,13 +489,14 @@ class FirebaseService:
         if doc.exists:
             record = doc.to_dict()
             record['id'] = doc.id
-            return record
+            return self._resolve_recommendations([record])[0]
         
         return None
     
     def update_injury_status(
         self,
         injury_id: str,
+        user_id: str,
         status: str,
         notes: str = None
     ):
@@ -126,6 +505,7 @@ class FirebaseService:
         
         Args:
             injury_id: Injury document ID
+            user_id: Owner of the record
             status: New status (e.g., 'active', 'healing', 'resolved')
             notes: Additional notes
         """
@@ -138,13 +518,115 @@ class FirebaseService:
         if notes:
             update_data['notes'] = notes
         
-        self.db.collection('injuries').document(injury_id).update(update_data)
+        injury_ref = self.db.collection('injuries').document(injury_id)
+        
+        # The record is read in the transaction so its old status is moved
+        # out of the rollup exactly once, even with concurrent updates
+        @firestore.transactional
+        def update(transaction):
+            doc = injury_ref.get(transaction=transaction)
+            transaction.update(injury_ref, update_data)
+            record = doc.to_dict() if doc.exists else None
+            if record and record.get('status', 'active') != status:
+                self._add_to_rollup(transaction, user_id, rollup_day(record), 0, {
+                    'status': {record.get('status', 'active'): -1, status: 1}
+                })
+            self._bump_version(transaction, user_id)
+        
+        update(self.db.transaction())
     
-    def delete_injury_record(self, injury_id: str):
+    def delete_injury_record(self, injury_id: str, user_id: str):
         """
-        Delete injury record from Firestore.
+        Delete injury record from Firestore, leaving a tombstone for syncing clients.
         
         Args:
             injury_id: Injury document ID
+            user_id: Owner of the record
+        """
+        injury_ref = self.db.collection('injuries').document(injury_id)
+        
+        # Read in the transaction so a record is subtracted from its rollup
+        # only by the delete that actually removed it
+        @firestore.transactional
+        def delete(transaction):
+            doc = injury_ref.get(transaction=transaction)
+            now = datetime.utcnow()
+            transaction.delete(injury_ref)
+            transaction.set(self.db.collection(TOMBSTONE_COLLECTION).document(injury_id), {
+                'userId': user_id,
+                'injuryId': injury_id,
+                'deletedAt': now.isoformat(),
+                # Removed by a Firestore TTL policy on this field
+                'expireAt': now + timedelta(days=TOMBSTONE_RETENTION_DAYS)
+            })
+            if doc.exists:
+                record = doc.to_dict()
+                self._add_to_rollup(transaction, user_id, rollup_day(record), -1, {
+                    'severity': {record['severity']: -1},
+                    'status': {record.get('status', 'active'): -1}
+                })
+            self._bump_version(transaction, user_id)
+        
+        delete(self.db.transaction())
+    
+    def _bump_version(self, batch, user_id: str):
+        """Add an increment of the user's data version to a write batch or transaction."""
+        batch.set(
+            self.db.collection(VERSION_COLLECTION).document(user_id),
+            {'version': firestore.Increment(1)},
+            merge=True
+        )
+    
+    def _add_to_rollup(self, batch, user_id: str, day: str, total: int, counts: Dict[str, Dict[str, int]]):
+        """
+        Add count changes to a user's daily rollup in a write batch or transaction.
+        
+        Args:
+            batch: WriteBatch or Transaction
+            user_id: User ID
+            day: ISO date of the rollup
+            total: Change of the record count
+            counts: Changes per group ('severity', 'status') and value
+        """
+        update = {'userId': user_id, 'date': day}
+        if total:
+            update['total'] = firestore.Increment(total)
+        for group, changes in counts.items():
+            update[group] = {value: firestore.Increment(change) for value, change in changes.items()}
+        batch.set(self.db.collection(ROLLUP_COLLECTION).document(rollup_id(user_id, day)), update, merge=True)
+    
+    def get_rollups(self, user_id: str, start: str, end: str) -> List[Dict]:
+        """
+        Get a user's daily rollups in a date range.
+        
+        Only days with records have a rollup. Needs a composite index on
+        (userId, date).
+        
+        Args:
+            user_id: User ID
+            start: First ISO date
+            end: Last ISO date (inclusive)
+            
+        Returns:
+            List of rollups (date, total, severity and status counts), oldest first
+        """
+        query = (self.db.collection(ROLLUP_COLLECTION)
+                .where('userId', '==', user_id)
+                .where('date', '>=', start)
+                .where('date', '<=', end)
+                .order_by('date'))
+        
+        return [doc.to_dict() for doc in query.stream()]
+    
+    def get_user_version(self, user_id: str) -> int:
+        """
+        Get a user's data version, which changes whenever their records do.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            Version number (0 if the user never wrote anything)
         """
-        self.db.collection('injuries').document(injury_id).delete()
+        doc = self.db.collection(VERSION_COLLECTION).document(user_id).get()
+        return (doc.to_dict() or {}).get('version', 0) if doc.exists else 0
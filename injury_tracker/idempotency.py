@@ -0,0 +1,113 @@
+"""
+Idempotency keys for non-repeatable API requests.
+
+A client sends the same Idempotency-Key header when it retries a request.
+The first request with a key runs; while it is in flight, duplicates wait for
+its result instead of starting a second run (single-flight), and after it
+finishes its result is replayed for IDEMPOTENCY_TTL_SECONDS. Failed requests
+are not remembered, so a retry after an error runs again.
+
+The store lives in process memory: it covers retries that reach the same
+worker process, which with a single uvicorn worker is every retry.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 3600))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', 10000))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflictError(ValueError):
+    """An idempotency key was reused for a different request."""
+
+
+class _Entry:
+    def __init__(self, fingerprint: str, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at = float('inf')  # Set when the request completes
+
+
+class IdempotencyStore:
+    """Single-flight cache of request results keyed by idempotency key."""
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        """
+        Args:
+            ttl_seconds: How long a completed result is replayed
+            max_keys: Completed results kept at most (oldest dropped first)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+
+    async def run(
+        self,
+        key: Hashable,
+        fingerprint: str,
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Run compute once per key, or wait for / replay the result of the run.
+
+        Args:
+            key: Idempotency key, scoped by the caller (e.g. (user_id, header value))
+            fingerprint: Identifies the request payload; a key reused with a
+                different payload is rejected
+            compute: Coroutine function producing the result
+
+        Returns:
+            Tuple of (result, replayed) where replayed is True when the result
+            came from an earlier or concurrent request
+
+        Raises:
+            IdempotencyConflictError: The key was used for a different payload
+        """
+        self._evict()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflictError(
+                    "Idempotency-Key was already used for a different request"
+                )
+            # shield: a waiter that disconnects must not cancel the original run
+            return await asyncio.shield(entry.future), True
+
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._entries[key] = entry
+        try:
+            result = await compute()
+        except BaseException as e:
+            # Forget failures so a retry runs again; concurrent waiters get the same error
+            del self._entries[key]
+            entry.future.set_exception(e)
+            entry.future.exception()  # Mark retrieved when nobody was waiting
+            raise
+
+        entry.future.set_result(result)
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(key)
+        return result, False
+
+    def _evict(self):
+        """Drop expired results, and the oldest ones above max_keys."""
+        # Completed entries are kept in completion order, so expiry order too
+        now = time.monotonic()
+        excess = len(self._entries) - self.max_keys + 1  # Room for the new key
+        stale = []
+        for key, entry in self._entries.items():
+            if not entry.future.done():
+                continue
+            if entry.expires_at > now and len(stale) >= excess:
+                break
+            stale.append(key)
+        for key in stale:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
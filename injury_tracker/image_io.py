@@ -0,0 +1,168 @@
+"""
+Image decoding and dataset listing, without TensorFlow.
+
+Decode worker processes (batch scoring, dataset shards) import this module
+instead of ml_model, so a spawned worker starts in well under a second and
+does not load TensorFlow. ml_model re-exports everything here.
+"""
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Limits for untrusted images, checked from the header before decoding (see probe_image)
+ALLOWED_IMAGE_FORMATS = tuple(os.getenv('ALLOWED_IMAGE_FORMATS', 'JPEG,PNG,WEBP').upper().split(','))
+MAX_DECODE_PIXELS = int(os.getenv('MAX_DECODE_PIXELS', 24_000_000))
+
+# JPEG can be decoded at 1/2, 1/4 or 1/8 scale straight from the DCT coefficients.
+# MPO is the multi-picture JPEG variant some phone cameras write; PIL opens it as JPEG.
+JPEG_FORMATS = ('JPEG', 'MPO')
+JPEG_DRAFT_SCALES = (2, 4, 8)
+
+
+class UnsupportedImageError(ValueError):
+    """The upload is not an image in one of the allowed formats."""
+
+
+class ImageTooLargeError(ValueError):
+    """The image dimensions exceed what can be decoded safely."""
+
+
+def list_dataset_files(data_dir: str, class_names: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    List image files in a class-per-folder dataset directory.
+    
+    Args:
+        data_dir: Directory containing one sub-directory per class
+        class_names: Class names in label order
+        
+    Returns:
+        Tuple of (file paths, integer labels), sorted for reproducibility
+    """
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, filename))
+                labels.append(label)
+    return paths, labels
+
+
+def _required_draft_scale(image_format: str, width: int, height: int) -> int:
+    """
+    Smallest decode scale that keeps an image within MAX_DECODE_PIXELS.
+    
+    Returns:
+        1 for a full decode, or a JPEG draft scale (2, 4 or 8)
+        
+    Raises:
+        ImageTooLargeError: No allowed scale brings the image under the limit
+    """
+    pixels = width * height
+    if pixels <= MAX_DECODE_PIXELS:
+        return 1
+    
+    scales = JPEG_DRAFT_SCALES if image_format in JPEG_FORMATS else ()
+    for scale in scales:
+        if pixels / (scale * scale) <= MAX_DECODE_PIXELS:
+            return scale
+    raise ImageTooLargeError(
+        f"Image is {width}x{height}; the limit is {MAX_DECODE_PIXELS / 1e6:g} megapixels"
+    )
+
+
+def probe_image(source) -> Dict:
+    """
+    Check an untrusted image against the decode limits by reading only its header.
+    
+    JPEGs above MAX_DECODE_PIXELS are accepted when a reduced-scale decode
+    brings them under the limit; decode_image then decodes them at that scale.
+    
+    Args:
+        source: Seekable file-like object with encoded image data; it is
+            rewound to its original position afterwards
+        
+    Returns:
+        Dict with format, width, height and draft_scale (1 = full decode)
+        
+    Raises:
+        UnsupportedImageError: Not an image in one of ALLOWED_IMAGE_FORMATS
+        ImageTooLargeError: Too many pixels to decode, even at reduced scale
+    """
+    position = source.tell()
+    try:
+        with Image.open(source, formats=ALLOWED_IMAGE_FORMATS) as image:
+            image_format = image.format
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError("Image dimensions exceed the decode limit")
+    except (Image.UnidentifiedImageError, OSError, SyntaxError):
+        raise UnsupportedImageError(
+            f"Unsupported or corrupt image (allowed formats: {', '.join(ALLOWED_IMAGE_FORMATS)})"
+        )
+    finally:
+        source.seek(position)
+    
+    return {
+        'format': image_format,
+        'width': width,
+        'height': height,
+        'draft_scale': _required_draft_scale(image_format, width, height)
+    }
+
+
+def decode_image(source, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Decode an image file or stream and resize it to a uint8 RGB array.
+    
+    JPEGs larger than MAX_DECODE_PIXELS are decoded at reduced scale (as small
+    as the target size allows) instead of at full resolution.
+    
+    Args:
+        source: File path or file-like object with encoded image data
+        size: Target (height, width)
+        
+    Returns:
+        Array of shape (height, width, 3) and dtype uint8
+        
+    Raises:
+        ImageTooLargeError: Too many pixels to decode, even at reduced scale
+    """
+    image = Image.open(source)
+    scale = _required_draft_scale(image.format, image.width, image.height)
+    if scale > 1:
+        scale = max(scale, min(image.width // size[1], image.height // size[0]))
+        image.draft('RGB', (image.width // scale, image.height // scale))
+    image = image.convert('RGB')
+    if image.size != (size[1], size[0]):
+        image = image.resize((size[1], size[0]))
+    return np.asarray(image, dtype=np.uint8)
+
+
+def decode_raw_image(data: bytes, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Interpret a raw pixel buffer as an image of the given size (no decode or resize).
+    
+    Args:
+        data: height * width * 3 bytes of uint8 RGB, row-major
+        size: Expected (height, width)
+        
+    Returns:
+        Array of shape (height, width, 3) and dtype uint8 backed by data
+        
+    Raises:
+        UnsupportedImageError: The buffer length does not match the size
+    """
+    expected = size[0] * size[1] * 3
+    if len(data) != expected:
+        raise UnsupportedImageError(
+            f"Raw image must be {size[0]}x{size[1]}x3 uint8 RGB ({expected} bytes), got {len(data)} bytes"
+        )
+    return np.frombuffer(data, dtype=np.uint8).reshape(size[0], size[1], 3)
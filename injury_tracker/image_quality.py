@@ -0,0 +1,183 @@
+"""
+Fast image-quality gate for wound photos.
+Runs on the already-downscaled model input and flags photos that are too
+blurry, too dark or bright, or show too little skin/wound area for the model's
+answer to mean anything. The API answers those with a "retake photo" response
+instead of running inference, recommendations and Firestore.
+
+Thresholds are read from the environment (QUALITY_* variables). Running this
+module evaluates them on the dataset: how many good photos would be rejected,
+and how many synthetically degraded copies (blurred, under- and overexposed,
+cropped to background) would be caught.
+
+Usage:
+    python image_quality.py                                  # Evaluate on ./dataset
+    python image_quality.py --data-dir ./dataset --size 224
+"""
+import os
+import argparse
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', 10))
+MIN_BRIGHTNESS = float(os.getenv('QUALITY_MIN_BRIGHTNESS', 40))
+MAX_BRIGHTNESS = float(os.getenv('QUALITY_MAX_BRIGHTNESS', 225))
+MAX_CLIPPED_FRACTION = float(os.getenv('QUALITY_MAX_CLIPPED_FRACTION', 0.7))
+MIN_SKIN_COVERAGE = float(os.getenv('QUALITY_MIN_SKIN_COVERAGE', 0.1))
+
+RETAKE_HINTS = {
+    'blurry': "The photo is blurry. Hold the camera steady and tap to focus on the wound.",
+    'too_dark': "The photo is too dark. Move to a brighter place or turn on the flash.",
+    'too_bright': "The photo is overexposed. Avoid direct light or turn off the flash.",
+    'no_wound_region': "The wound is hard to see. Fill the frame with the injured area."
+}
+
+
+def measure_quality(image: np.ndarray) -> Dict[str, float]:
+    """
+    Compute quality metrics for one image.
+
+    Args:
+        image: uint8 RGB array (the downscaled model input)
+
+    Returns:
+        Dict with sharpness (variance of the Laplacian), brightness (mean
+        luma), dark/bright clipped fractions and skin_coverage (fraction of
+        pixels in the skin/wound YCrCb range)
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    ycrcb = cv2.cvtColor(image, cv2.COLOR_RGB2YCrCb)
+
+    # Skin, blood and wound tissue all sit in a high-Cr band of YCrCb
+    skin = cv2.inRange(ycrcb, (0, 133, 70), (255, 185, 135))
+    histogram = np.bincount(gray.ravel(), minlength=256) / gray.size
+
+    return {
+        'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        'brightness': float(gray.mean()),
+        'dark_fraction': float(histogram[:20].sum()),
+        'bright_fraction': float(histogram[236:].sum()),
+        'skin_coverage': float(np.count_nonzero(skin) / skin.size)
+    }
+
+
+def quality_issues(metrics: Dict[str, float]) -> List[str]:
+    """
+    Compare quality metrics against the configured thresholds.
+
+    Returns:
+        Failed checks (keys of RETAKE_HINTS); empty if the photo is usable
+    """
+    issues = []
+    if metrics['sharpness'] < MIN_SHARPNESS:
+        issues.append('blurry')
+    if metrics['brightness'] < MIN_BRIGHTNESS or metrics['dark_fraction'] > MAX_CLIPPED_FRACTION:
+        issues.append('too_dark')
+    if metrics['brightness'] > MAX_BRIGHTNESS or metrics['bright_fraction'] > MAX_CLIPPED_FRACTION:
+        issues.append('too_bright')
+    if metrics['skin_coverage'] < MIN_SKIN_COVERAGE:
+        issues.append('no_wound_region')
+    return issues
+
+
+def assess_quality(image: np.ndarray) -> Dict:
+    """
+    Run the quality gate on one image.
+
+    Args:
+        image: uint8 RGB array (the downscaled model input)
+
+    Returns:
+        Dict with passed, issues, hints (one per issue) and metrics
+    """
+    metrics = measure_quality(image)
+    issues = quality_issues(metrics)
+    return {
+        'passed': not issues,
+        'issues': issues,
+        'hints': [RETAKE_HINTS[issue] for issue in issues],
+        'metrics': {name: round(value, 4) for name, value in metrics.items()}
+    }
+
+
+def _degraded_copies(image: np.ndarray) -> Dict[str, np.ndarray]:
+    """Synthetic bad photos for each check, derived from a good one."""
+    height, width = image.shape[:2]
+    background = np.full_like(image, (70, 90, 110))
+    background[:height // 16, :width // 16] = image[:height // 16, :width // 16]
+    return {
+        'blurry': cv2.GaussianBlur(image, (0, 0), 3),
+        'too_dark': (image * 0.15).astype(np.uint8),
+        'too_bright': cv2.convertScaleAbs(image, alpha=1.8, beta=90),
+        'no_wound_region': background
+    }
+
+
+def evaluate(data_dir: str, size: int):
+    """Print metric distributions, false rejects and catch rates on the dataset."""
+    import time
+    from ml_model import decode_image, list_dataset_files
+
+    class_names = ['mild', 'moderate', 'severe']
+    paths, labels = list_dataset_files(data_dir, class_names)
+    if not paths:
+        raise SystemExit(f"No images found in {data_dir}")
+
+    print(f"Evaluating {len(paths)} images at {size}x{size}...")
+    metrics, rejected_by_class = [], {name: 0 for name in class_names}
+    rejected_by_issue = {issue: 0 for issue in RETAKE_HINTS}
+    caught = {issue: 0 for issue in RETAKE_HINTS}
+    seconds = 0.0
+
+    for path, label in zip(paths, labels):
+        image = decode_image(path, (size, size))
+
+        start = time.perf_counter()
+        result = measure_quality(image)
+        seconds += time.perf_counter() - start
+
+        metrics.append(result)
+        issues = quality_issues(result)
+        if issues:
+            rejected_by_class[class_names[label]] += 1
+        for issue in issues:
+            rejected_by_issue[issue] += 1
+
+        for issue, degraded in _degraded_copies(image).items():
+            if issue in quality_issues(measure_quality(degraded)):
+                caught[issue] += 1
+
+    print("-" * 50)
+    print(f"{'metric':<18}{'p1':>10}{'p5':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name in metrics[0]:
+        values = np.array([m[name] for m in metrics])
+        percentiles = np.percentile(values, [1, 5, 50, 95, 99])
+        print(f"{name:<18}" + "".join(f"{p:>10.3f}" for p in percentiles))
+
+    print("-" * 50)
+    print("Good photos rejected (false rejects):")
+    for name in class_names:
+        total = labels.count(class_names.index(name))
+        print(f"  {name:<16}{rejected_by_class[name]:>5} / {total} ({rejected_by_class[name] / max(total, 1):.1%})")
+    print("  by check: " + ", ".join(f"{issue}={count}" for issue, count in rejected_by_issue.items()))
+    print("Degraded copies caught:")
+    for issue, count in caught.items():
+        print(f"  {issue:<16}{count:>5} / {len(paths)} ({count / len(paths):.1%})")
+    print(f"Average check time: {seconds / len(paths) * 1000:.2f} ms per image")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Evaluate the image-quality gate on the dataset')
+    parser.add_argument('--data-dir', default='./dataset',
+                        help='Dataset directory (default: ./dataset)')
+    parser.add_argument('--size', type=int, default=224,
+                        help='Input size the checks run at (default: 224)')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Wound Severity Classifier - Image Quality Gate")
+    print("=" * 50)
+
+    evaluate(args.data_dir, args.size)
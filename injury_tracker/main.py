@@ -1,18 +1,61 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartParser
+from datetime import datetime
 from typing import Optional, List
-import io
 import os
 from dotenv import load_dotenv
 
+# Load .env before the service modules read their configuration at import
+load_dotenv()
+
+# Size TensorFlow's thread pools (and pin the worker) before TensorFlow starts
+from cpu_threading import configure_threading
+threading_settings = configure_threading()
+
 from ml_model import WoundClassifier
+from model_manager import MODEL_WATCH_SECONDS, ModelManager
+from admission import (
+    ANALYZE_BURST,
+    ANALYZE_RATE_PER_MINUTE,
+    INFERENCE_CONCURRENCY,
+    INFERENCE_MAX_WAIT_SECONDS,
+    INFERENCE_QUEUE_DEPTH,
+    LLM_CONCURRENCY,
+    LLM_MAX_WAIT_SECONDS,
+    LLM_QUEUE_DEPTH,
+    LoadSheddingMiddleware,
+    OverloadedError,
+    RateLimiter,
+    Stage,
+    retry_after_header
+)
+from analytics import SnapshotStore, confidence_distribution, severity_mix, snapshot_summary, status_funnel
 from azure_openai_service import FirstAidRecommendation
 from encryption import ImageEncryption
 from firebase_service import FirebaseService
-
-load_dotenv()
+from http_cache import conditional_response
+from idempotency import MAX_KEY_LENGTH, IdempotencyConflictError, IdempotencyStore
+from dashboard import build_changes, build_dashboard, user_statistics
+from rollups import build_timeseries
+from export import EXPORT_FORMATS, export_stream
+from fast_json import json_response
+from image_quality import assess_quality
+from near_duplicates import DuplicateIndex, format_hash, perceptual_hash
+from token_auth import InvalidTokenError, KeyFetchError, KeySet, TokenVerifier
+from upload_ingest import (
+    MAX_UPLOAD_BYTES,
+    MULTIPART_OVERHEAD_BYTES,
+    RAW_IMAGE_CONTENT_TYPE,
+    UPLOAD_SPOOL_BYTES,
+    UploadSizeLimitMiddleware,
+    accepted_content_types,
+    read_model_input
+)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -30,12 +73,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized uploads while they stream in; uploads above the spool
+# threshold are buffered on disk instead of in worker memory
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    paths=["/api/v1/analyze-wound"]
+)
+MultiPartParser.spool_max_size = UPLOAD_SPOOL_BYTES
+
+# Admission control for analyses: bounded model and recommendation stages,
+# uploads shed before they are read while a stage's queue is full, and a
+# per-user rate limit
+inference_stage = Stage('inference', INFERENCE_CONCURRENCY, INFERENCE_QUEUE_DEPTH, INFERENCE_MAX_WAIT_SECONDS)
+llm_stage = Stage('recommendation', LLM_CONCURRENCY, LLM_QUEUE_DEPTH, LLM_MAX_WAIT_SECONDS, service_time=3.0)
+analyze_rate_limiter = RateLimiter(ANALYZE_RATE_PER_MINUTE / 60, ANALYZE_BURST)
+app.add_middleware(
+    LoadSheddingMiddleware,
+    stages=[inference_stage, llm_stage],
+    paths=["/api/v1/analyze-wound"]
+)
+
+# Compress response bodies above GZIP_MIN_BYTES for clients that accept gzip
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.getenv('GZIP_MIN_BYTES', 1024)),
+    compresslevel=int(os.getenv('GZIP_LEVEL', 6))
+)
+
 # Initialize services
 model_path = os.getenv('MODEL_PATH', './models/wound_classifier.h5')
-classifier = WoundClassifier(model_path if os.path.exists(model_path) else None)
+classifier = WoundClassifier(
+    model_path if os.path.exists(model_path) else None,
+    gate_model_path=os.getenv('GATE_MODEL_PATH')
+)
+model_manager = ModelManager(classifier, model_path if os.path.exists(model_path) else None)
+if MODEL_WATCH_SECONDS > 0:
+    model_manager.watch(model_path)
 first_aid_service = FirstAidRecommendation()
 encryption_service = ImageEncryption(os.getenv('ENCRYPTION_KEY'))
 firebase_service = FirebaseService()
+idempotency_store = IdempotencyStore()
+duplicate_index = DuplicateIndex(firebase_service.get_perceptual_hashes)
+analytics_store = SnapshotStore()
+token_verifier = TokenVerifier(os.getenv('FIREBASE_PROJECT_ID') or firebase_service.db.project, KeySet())
+
+# Local development only: accept "Bearer <user_id>" without verification
+ALLOW_UNVERIFIED_TOKENS = os.getenv('ALLOW_UNVERIFIED_TOKENS', '').lower() in ('1', 'true', 'yes')
+
+# Admin model deployments may only load models from this directory
+MODEL_DIR = os.path.dirname(os.path.abspath(model_path))
+
+# Users allowed to call the /api/v1/admin endpoints
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
 
 
 # Pydantic models
@@ -49,6 +139,8 @@ class PredictionResponse(BaseModel):
     recommendations: dict
     emergency_info: dict
     image_hash: str  # SHA-256 hash for identification
+    duplicate: bool = False  # True when an earlier record of the same photo was returned
+    model_version: Optional[str] = None  # Model version that classified the photo
 
 
 class InjuryRecord(BaseModel):
@@ -58,34 +150,79 @@ class InjuryRecord(BaseModel):
     severity: str
     confidence: float
     imageHash: str
-    timestamp: str
+    timestamp: datetime  # Firestore server timestamp
     status: Optional[str] = "active"
 
 
+# Fields read for the injury list (the InjuryRecord fields)
+INJURY_LIST_FIELDS = ['userId', 'severity', 'confidence', 'imageHash', 'timestamp', 'status']
+
+
 class StatusUpdate(BaseModel):
     """Model for status update."""
     status: str
     notes: Optional[str] = None
 
 
+class ModelDeployRequest(BaseModel):
+    """Model for a model deployment."""
+    path: Optional[str] = None  # Model file in MODEL_DIR (default: MODEL_PATH)
+    shadow: bool = False  # Run as shadow candidate instead of making it live
+
+
 # Helper function to verify user
 async def get_current_user(authorization: str = Header(None)) -> str:
     """
-    Extract user ID from authorization header.
-    In production, implement proper JWT verification.
+    Verify the Firebase ID token in the Authorization header.
+    
+    Tokens seen before are answered from the verifier's cache; new tokens
+    are verified in the threadpool (the signing keys may need a fetch).
+    
+    Args:
+        authorization: "Bearer <Firebase ID token>"
+        
+    Returns:
+        User ID (the token's subject)
     """
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header missing")
     
-    # Simple token extraction - implement proper JWT verification in production
-    try:
-        # Assuming format: "Bearer <user_id>" or "Bearer <jwt_token>"
-        user_id = authorization.replace("Bearer ", "")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid authorization token")
-        return user_id
-    except Exception as e:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
         raise HTTPException(status_code=401, detail="Invalid authorization token")
+    
+    if ALLOW_UNVERIFIED_TOKENS:
+        return token
+    
+    user_id = token_verifier.cached(token)
+    if user_id is not None:
+        return user_id
+    
+    try:
+        return await run_in_threadpool(token_verifier.verify, token)
+    except InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid or expired authorization token")
+    except KeyFetchError:
+        raise HTTPException(status_code=503, detail="Authentication is temporarily unavailable")
+
+
+async def get_admin_user(user_id: str = Depends(get_current_user)) -> str:
+    """Require the user to be listed in ADMIN_USER_IDS."""
+    if user_id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_id
+
+
+async def get_analyze_user(user_id: str = Depends(get_current_user)) -> str:
+    """Apply the per-user analyze rate limit (429 with Retry-After when exceeded)."""
+    retry_after = analyze_rate_limiter.acquire(user_id)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many analyses. Please wait before sending another photo.",
+            headers={'Retry-After': retry_after_header(retry_after)}
+        )
+    return user_id
 
 
 # API Endpoints
@@ -99,83 +236,209 @@ async def root():
     }
 
 
+@app.get("/api/v1/model-info")
+async def get_model_info():
+    """
+    Describe the model input so clients can upload pre-resized images.
+    
+    Returns:
+        Input size, resize convention, accepted upload content types and
+        the live model version
+    """
+    classifier = model_manager.classifier
+    return {
+        'input_size': {
+            'height': classifier.img_height,
+            'width': classifier.img_width,
+            'channels': 3
+        },
+        # Images are stretched to the input size (aspect ratio not kept)
+        'resize': 'stretch',
+        'interpolation': 'bicubic',
+        'accepted_content_types': accepted_content_types(),
+        'raw_format': {
+            'content_type': RAW_IMAGE_CONTENT_TYPE,
+            'layout': 'height x width x 3, uint8 RGB, row-major',
+            'bytes': classifier.img_height * classifier.img_width * 3
+        },
+        'max_upload_bytes': MAX_UPLOAD_BYTES,
+        'architecture': classifier.architecture,
+        'class_names': classifier.class_names,
+        'model_version': model_manager.live.version
+    }
+
+
+async def _analyze_image(image, image_hash: str, user_id: str) -> PredictionResponse:
+    """
+    Classify a decoded image, get recommendations and store the record.
+    
+    Args:
+        image: Decoded uint8 RGB image at the model input size
+        image_hash: SHA-256 of the uploaded bytes
+        user_id: Owner of the new record
+        
+    Returns:
+        Prediction results with recommendations
+    """
+    # Ask for a retake instead of classifying blurry, badly exposed or
+    # off-target photos (skips inference, recommendations and Firestore)
+    quality = assess_quality(image)
+    if not quality['passed']:
+        raise HTTPException(status_code=422, detail={
+            'message': "Photo quality is too low for an assessment. Please retake the photo.",
+            'retake': True,
+            'issues': quality['issues'],
+            'hints': quality['hints']
+        })
+    
+    # A recent re-upload of a photo the user already analyzed (re-encoded,
+    # resized or slightly cropped) gets the earlier result instead of a new
+    # record. The search runs in the threadpool because a user's first search
+    # loads their index from Firestore.
+    image_phash = perceptual_hash(image)
+    match = await run_in_threadpool(duplicate_index.find, user_id, image_phash)
+    if match:
+        record = await run_in_threadpool(firebase_service.get_injury_by_id, match[0])
+        if record:
+            return PredictionResponse(
+                injury_id=record['id'],
+                severity=record['severity'],
+                confidence=record['confidence'],
+                probabilities=record['probabilities'],
+                description=model_manager.classifier.get_severity_description(record['severity']),
+                recommendations=record['recommendations'],
+                emergency_info=record['emergencyInfo'],
+                image_hash=record['imageHash'],
+                duplicate=True,
+                model_version=record.get('modelVersion')
+            )
+        duplicate_index.remove(user_id, match[0])
+    
+    # Classify wound severity (in the threadpool, so reads are served meanwhile)
+    async with inference_stage.slot():
+        prediction = await run_in_threadpool(model_manager.predict, image)
+    
+    severity = prediction['severity']
+    confidence = prediction['confidence']
+    probabilities = prediction['probabilities']
+    
+    # Get severity description
+    description = model_manager.classifier.get_severity_description(severity)
+    
+    # Get first aid recommendations from Azure OpenAI; when the recommendation
+    # stage is saturated, the static recommendations are used instead of
+    # failing a request whose classification is already done
+    try:
+        async with llm_stage.slot():
+            recommendations = await run_in_threadpool(
+                first_aid_service.get_recommendations,
+                severity=severity,
+                confidence=confidence,
+                wound_type="wound"
+            )
+    except OverloadedError:
+        recommendations = first_aid_service.fallback_recommendations(severity, confidence, "wound")
+    
+    # Store record in Firestore (only metadata and hash, no image)
+    injury_id = await run_in_threadpool(
+        firebase_service.store_injury_record,
+        user_id=user_id,
+        image_hash=image_hash,
+        severity=severity,
+        confidence=confidence,
+        probabilities=probabilities,
+        recommendations=recommendations['recommendations'],
+        emergency_info=recommendations['emergency_info'],
+        perceptual_hash=format_hash(image_phash),
+        model_version=prediction['model_version'],
+        shared_recommendations=recommendations['fallback']
+    )
+    duplicate_index.add(user_id, injury_id, image_phash)
+    
+    return PredictionResponse(
+        injury_id=injury_id,
+        severity=severity,
+        confidence=confidence,
+        probabilities=probabilities,
+        description=description,
+        recommendations=recommendations['recommendations'],
+        emergency_info=recommendations['emergency_info'],
+        image_hash=image_hash,
+        model_version=prediction['model_version']
+    )
+
+
 @app.post("/api/v1/analyze-wound", response_model=PredictionResponse)
 async def analyze_wound(
+    response: Response,
     file: UploadFile = File(...),
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_analyze_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Analyze wound image and provide severity classification and first aid recommendations.
     
+    Requests retried with the same Idempotency-Key header get the original
+    response (marked with Idempotent-Replayed: true) instead of a new
+    analysis and record; a retry that arrives while the original is still
+    running waits for it.
+    
+    Under overload the request is rejected with 503 (or 429 when the user
+    exceeds ANALYZE_RATE_PER_MINUTE) and a Retry-After header.
+    
     Args:
+        response: Outgoing response (for the replay header)
         file: Uploaded wound image
         user_id: User ID from authorization header
+        idempotency_key: Client-chosen key, the same for every retry
         
     Returns:
         Prediction results with recommendations
     """
     try:
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read image bytes
-        image_bytes = await file.read()
+        # Size-check, hash and decode the upload straight from the spooled file;
+        # pre-resized and raw uploads skip the resize / decode
+        classifier = model_manager.classifier
+        image, upload = await read_model_input(file, (classifier.img_height, classifier.img_width))
         
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty file")
+        # Hash of image (for identification, not storage)
+        image_hash = upload.sha256
         
-        # Generate hash of image (for identification, not storage)
-        image_hash = encryption_service.hash_image(image_bytes)
+        if not idempotency_key:
+            return await _analyze_image(image, image_hash, user_id)
         
-        # Classify wound severity
-        image_stream = io.BytesIO(image_bytes)
-        prediction = classifier.predict(image_stream)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
         
-        severity = prediction['severity']
-        confidence = prediction['confidence']
-        probabilities = prediction['probabilities']
+        try:
+            result, replayed = await idempotency_store.run(
+                (user_id, idempotency_key),
+                image_hash,
+                lambda: _analyze_image(image, image_hash, user_id)
+            )
+        except IdempotencyConflictError as e:
+            raise HTTPException(status_code=422, detail=str(e))
         
-        # Get severity description
-        description = classifier.get_severity_description(severity)
-        
-        # Get first aid recommendations from Azure OpenAI
-        recommendations = first_aid_service.get_recommendations(
-            severity=severity,
-            confidence=confidence,
-            wound_type="wound"
-        )
-        
-        # Store record in Firestore (only metadata and hash, no image)
-        injury_id = firebase_service.store_injury_record(
-            user_id=user_id,
-            image_hash=image_hash,
-            severity=severity,
-            confidence=confidence,
-            probabilities=probabilities,
-            recommendations=recommendations['recommendations'],
-            emergency_info=recommendations['emergency_info']
-        )
-        
-        return PredictionResponse(
-            injury_id=injury_id,
-            severity=severity,
-            confidence=confidence,
-            probabilities=probabilities,
-            description=description,
-            recommendations=recommendations['recommendations'],
-            emergency_info=recommendations['emergency_info'],
-            image_hash=image_hash
-        )
+        if replayed:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return result
         
     except HTTPException:
         raise
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The service is busy. Please retry shortly.",
+            headers={'Retry-After': retry_after_header(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
 @app.get("/api/v1/injuries", response_model=List[InjuryRecord])
 async def get_user_injuries(
+    request: Request,
+    response: Response,
     user_id: str = Depends(get_current_user),
     limit: int = 50
 ):
@@ -183,22 +446,90 @@ async def get_user_injuries(
     Get all injury records for the current user.
     
     Args:
+        request: Incoming request (for If-None-Match)
+        response: Response the ETag is set on
         user_id: User ID from authorization header
         limit: Maximum number of records to retrieve
         
     Returns:
-        List of injury records
+        List of injury records, or 304 if the client's copy is current
     """
     try:
-        records = firebase_service.get_injury_records(user_id, limit)
+        version = await run_in_threadpool(firebase_service.get_user_version, user_id)
+        not_modified = conditional_response(request, response, user_id, version)
+        if not_modified:
+            return not_modified
+        
+        records = await run_in_threadpool(
+            firebase_service.get_injury_records, user_id, limit, fields=INJURY_LIST_FIELDS
+        )
         return records
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving records: {str(e)}")
 
 
+# Declared before /injuries/{injury_id} so "changes" and "export" are not taken as IDs
+@app.get("/api/v1/injuries/changes")
+async def get_injury_changes(
+    user_id: str = Depends(get_current_user),
+    since: Optional[str] = None,
+    limit: int = 100
+):
+    """
+    Get the records created, modified or deleted since a sync token.
+    
+    Args:
+        user_id: User ID from authorization header
+        since: sync_token from the previous response; omit for a full sync
+        limit: Maximum number of changed records
+        
+    Returns:
+        Changed record summaries, deleted record IDs and the next sync_token
+    """
+    try:
+        return json_response(await build_changes(firebase_service, user_id, since, limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving changes: {str(e)}")
+
+
+@app.get("/api/v1/injuries/export")
+async def export_injuries(
+    user_id: str = Depends(get_current_user),
+    export_format: str = Query('ndjson', alias='format')
+):
+    """
+    Download the user's whole injury history, newest first.
+    
+    Records are read from Firestore page by page and streamed as they
+    arrive, so memory use does not depend on the length of the history.
+    
+    Args:
+        user_id: User ID from authorization header
+        export_format: 'ndjson' (full records) or 'csv' (flat fields)
+        
+    Returns:
+        Streaming NDJSON or CSV response
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    
+    return StreamingResponse(
+        export_stream(firebase_service.iter_injury_records(user_id), export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="injuries.{export_format}"'}
+    )
+
+
 @app.get("/api/v1/injuries/{injury_id}")
 async def get_injury_details(
     injury_id: str,
+    request: Request,
+    response: Response,
     user_id: str = Depends(get_current_user)
 ):
     """
@@ -206,22 +537,30 @@ async def get_injury_details(
     
     Args:
         injury_id: Injury record ID
+        request: Incoming request (for If-None-Match)
+        response: Response the ETag is set on
         user_id: User ID from authorization header
         
     Returns:
-        Injury record details
+        Injury record details, or 304 if the client's copy is current
     """
     try:
-        record = firebase_service.get_injury_by_id(injury_id)
+        version = await run_in_threadpool(firebase_service.get_user_version, user_id)
+        record = await run_in_threadpool(firebase_service.get_injury_by_id, injury_id)
         
         if not record:
             raise HTTPException(status_code=404, detail="Injury record not found")
         
-        # Verify ownership
+        # Verify ownership before answering anything, 304 included
         if record.get('userId') != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        return record
+        # The version is read first, so a write in between makes the ETag stale
+        not_modified = conditional_response(request, response, user_id, version)
+        if not_modified:
+            return not_modified
+        
+        return json_response(record, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -247,7 +586,7 @@ async def update_injury_status(
     """
     try:
         # Verify ownership
-        record = firebase_service.get_injury_by_id(injury_id)
+        record = await run_in_threadpool(firebase_service.get_injury_by_id, injury_id)
         if not record:
             raise HTTPException(status_code=404, detail="Injury record not found")
         
@@ -255,8 +594,10 @@ async def update_injury_status(
             raise HTTPException(status_code=403, detail="Access denied")
         
         # Update status
-        firebase_service.update_injury_status(
+        await run_in_threadpool(
+            firebase_service.update_injury_status,
             injury_id,
+            user_id,
             status_update.status,
             status_update.notes
         )
@@ -285,18 +626,16 @@ async def delete_injury(
     """
     try:
         # Verify ownership
-        record = firebase_service.get_injury_by_id(injury_id)
+        record = await run_in_threadpool(firebase_service.get_injury_by_id, injury_id)
         if not record:
             raise HTTPException(status_code=404, detail="Injury record not found")
         
         if record.get('userId') != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Delete record and image
-        firebase_service.delete_injury_record(
-            injury_id,
-            record.get('encryptedImagePath')
-        )
+        # Delete record
+        await run_in_threadpool(firebase_service.delete_injury_record, injury_id, user_id)
+        duplicate_index.remove(user_id, injury_id)
         
         return {"message": "Injury record deleted successfully", "injury_id": injury_id}
     except HTTPException:
@@ -306,34 +645,291 @@ async def delete_injury(
 
 
 @app.get("/api/v1/statistics")
-async def get_user_statistics(user_id: str = Depends(get_current_user)):
+async def get_user_statistics(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user)
+):
     """
     Get statistics about user's injury records.
     
     Args:
+        request: Incoming request (for If-None-Match)
+        response: Response the ETag is set on
         user_id: User ID from authorization header
         
     Returns:
-        Statistics summary
+        Statistics summary, or 304 if the client's copy is current
     """
     try:
-        records = firebase_service.get_injury_records(user_id, limit=1000)
+        version = await run_in_threadpool(firebase_service.get_user_version, user_id)
+        not_modified = conditional_response(request, response, user_id, version)
+        if not_modified:
+            return not_modified
         
-        total_injuries = len(records)
-        severity_counts = {'mild': 0, 'moderate': 0, 'severe': 0}
+        return json_response(await user_statistics(firebase_service, user_id), response)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving statistics: {str(e)}")
+
+
+@app.get("/api/v1/statistics/timeseries")
+async def get_statistics_timeseries(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user),
+    period: str = 'day',
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Get the user's injury counts per day or week, by severity and status.
+    
+    Args:
+        request: Incoming request (for If-None-Match)
+        response: Response the ETag is set on
+        user_id: User ID from authorization header
+        period: 'day' or 'week'
+        start: First ISO date (default: 30 days or 12 weeks before end)
+        end: Last ISO date, inclusive (default: today, UTC)
         
-        for record in records:
-            severity = record.get('severity', 'unknown')
-            if severity in severity_counts:
-                severity_counts[severity] += 1
+    Returns:
+        Counts per period, or 304 if the client's copy is current
+    """
+    try:
+        # The default range ends today, so the ETag changes with the date
+        version = await run_in_threadpool(firebase_service.get_user_version, user_id)
+        not_modified = conditional_response(
+            request, response, user_id, version, extra=datetime.utcnow().date().isoformat()
+        )
+        if not_modified:
+            return not_modified
         
-        return {
-            'total_injuries': total_injuries,
-            'severity_breakdown': severity_counts,
-            'user_id': user_id
-        }
+        return json_response(await build_timeseries(firebase_service, user_id, period, start, end), response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving timeseries: {str(e)}")
+
+
+@app.get("/api/v1/dashboard")
+async def get_dashboard(
+    user_id: str = Depends(get_current_user),
+    limit: int = 20,
+    since: Optional[str] = None
+):
+    """
+    Get everything the injury history screen shows on open in one request.
+    
+    Args:
+        user_id: User ID from authorization header
+        limit: Number of record summaries
+        since: sync_token from the previous response; only changes are returned
+        
+    Returns:
+        Record summaries, statistics and the most recent record's details
+    """
+    try:
+        return json_response(await build_dashboard(firebase_service, user_id, limit, since))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving dashboard: {str(e)}")
+
+
+@app.get("/api/v1/admin/analytics/summary")
+async def get_analytics_summary(admin_id: str = Depends(get_admin_user)):
+    """
+    Describe the analytics snapshot (records, users, date range, freshness).
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        
+    Returns:
+        Snapshot summary
+    """
+    snapshot = await run_in_threadpool(analytics_store.get)
+    return json_response(snapshot_summary(snapshot))
+
+
+@app.get("/api/v1/admin/analytics/severity-mix")
+async def get_severity_mix(
+    admin_id: str = Depends(get_admin_user),
+    period: str = 'week',
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Get the severity mix of all users' records over time.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        period: 'day', 'week' or 'month'
+        start: Only records created at or after this ISO date
+        end: Only records created before this ISO date
+        
+    Returns:
+        Records and severity counts and shares per period
+    """
+    snapshot = await run_in_threadpool(analytics_store.get)
+    try:
+        return json_response({'period': period, 'periods': severity_mix(snapshot, period, start, end)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/v1/admin/analytics/confidence")
+async def get_confidence_distribution(
+    admin_id: str = Depends(get_admin_user),
+    bins: int = Query(10, ge=1, le=100),
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Get the distribution of prediction confidence across all users' records.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        bins: Number of histogram bins
+        start: Only records created at or after this ISO date
+        end: Only records created before this ISO date
+        
+    Returns:
+        Histogram, mean and percentiles overall and per severity
+    """
+    snapshot = await run_in_threadpool(analytics_store.get)
+    try:
+        return json_response(confidence_distribution(snapshot, bins, start, end))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/v1/admin/analytics/status-funnel")
+async def get_status_funnel(
+    admin_id: str = Depends(get_admin_user),
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Get how far all users' records have progressed from active to resolved.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        start: Only records created at or after this ISO date
+        end: Only records created before this ISO date
+        
+    Returns:
+        Status counts, funnel stages and time to resolution
+    """
+    snapshot = await run_in_threadpool(analytics_store.get)
+    try:
+        return json_response(status_funnel(snapshot, start, end))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/v1/admin/analytics/refresh")
+async def refresh_analytics(
+    admin_id: str = Depends(get_admin_user),
+    full: bool = False
+):
+    """
+    Apply the records changed since the last refresh to the analytics snapshot.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        full: Rebuild the snapshot from all records
+        
+    Returns:
+        Changed and deleted record counts and the snapshot size
+    """
+    try:
+        return await run_in_threadpool(analytics_store.refresh, firebase_service, full)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing analytics: {str(e)}")
+
+
+@app.get("/api/v1/admin/model")
+async def get_model_status(admin_id: str = Depends(get_admin_user)):
+    """
+    Get the live model, the shadow candidate with its comparison, and deployment progress.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        
+    Returns:
+        Model versions, shadow agreement and latency, the latest deployment
+        and the inference thread settings
+    """
+    return dict(model_manager.status(), threading=threading_settings)
+
+
+@app.post("/api/v1/admin/model/deploy", status_code=202)
+async def deploy_model(
+    deploy_request: ModelDeployRequest,
+    admin_id: str = Depends(get_admin_user)
+):
+    """
+    Load and warm a model version in the background, then make it live or shadow it.
+    
+    Args:
+        deploy_request: Model file and whether to shadow it
+        admin_id: Admin user ID from authorization header
+        
+    Returns:
+        Model status; poll GET /api/v1/admin/model for the outcome
+    """
+    # An explicit path is relative to MODEL_DIR; the default MODEL_PATH is
+    # relative to the working directory (it already includes the directory)
+    if deploy_request.path:
+        path = os.path.realpath(os.path.join(MODEL_DIR, deploy_request.path))
+    else:
+        path = os.path.realpath(model_path)
+    if not path.startswith(os.path.realpath(MODEL_DIR) + os.sep):
+        raise HTTPException(status_code=400, detail="Models can only be deployed from MODEL_DIR")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Model file not found")
+    
+    try:
+        model_manager.deploy_in_background(path, deploy_request.shadow)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_manager.status()
+
+
+@app.post("/api/v1/admin/model/promote")
+async def promote_model(admin_id: str = Depends(get_admin_user)):
+    """
+    Make the shadow candidate the live model.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        
+    Returns:
+        Model status
+    """
+    try:
+        model_manager.promote()
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_manager.status()
+
+
+@app.delete("/api/v1/admin/model/shadow")
+async def stop_shadow(admin_id: str = Depends(get_admin_user)):
+    """
+    Stop running the shadow candidate.
+    
+    Args:
+        admin_id: Admin user ID from authorization header
+        
+    Returns:
+        Model status (the last comparison stays available)
+    """
+    try:
+        model_manager.stop_shadow()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_manager.status()
 
 
 # Run the app
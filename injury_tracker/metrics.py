@@ -0,0 +1,50 @@
+"""
+Classification metrics shared by the training, sweep and evaluation scripts.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def evaluate_predictions(labels: np.ndarray, predicted: np.ndarray, class_names: List[str]) -> Dict:
+    """
+    Compute classification metrics.
+
+    Args:
+        labels: True class indices
+        predicted: Predicted class indices
+        class_names: Class names in label order
+
+    Returns:
+        Accuracy, macro-F1, per-class precision/recall/F1 and the confusion matrix
+    """
+    from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support
+
+    class_ids = list(range(len(class_names)))
+    precision, recall, f1, support = precision_recall_fscore_support(
+        labels, predicted, labels=class_ids, zero_division=0
+    )
+    return {
+        'accuracy': float(accuracy_score(labels, predicted)),
+        'macro_f1': float(np.mean(f1)),
+        'precision': {name: float(precision[i]) for i, name in enumerate(class_names)},
+        'recall': {name: float(recall[i]) for i, name in enumerate(class_names)},
+        'f1': {name: float(f1[i]) for i, name in enumerate(class_names)},
+        'support': {name: int(support[i]) for i, name in enumerate(class_names)},
+        'confusion_matrix': confusion_matrix(labels, predicted, labels=class_ids).tolist()
+    }
+
+
+def print_report(metrics: Dict, class_names: List[str]):
+    """Print a confusion matrix and per-class metrics table."""
+    print(f"Accuracy: {metrics['accuracy']:.4f}   Macro-F1: {metrics['macro_f1']:.4f}")
+    print()
+    print(f"{'':<12}{'precision':>10}{'recall':>10}{'f1':>10}{'support':>10}")
+    for name in class_names:
+        print(f"{name:<12}{metrics['precision'][name]:>10.4f}{metrics['recall'][name]:>10.4f}"
+              f"{metrics['f1'][name]:>10.4f}{metrics['support'][name]:>10}")
+    print()
+    print("Confusion matrix (rows: true, columns: predicted)")
+    print(f"{'':<12}" + "".join(f"{name:>10}" for name in class_names))
+    for name, row in zip(class_names, metrics['confusion_matrix']):
+        print(f"{name:<12}" + "".join(f"{count:>10}" for count in row))
@@ -0,0 +1,169 @@
+"""
+Move shared text out of injury records into the recommendation catalog.
+
+Older injury documents embed the full recommendations and emergencyInfo
+maps. Emergency info is fixed per severity, so it is always stored once in
+the recommendation_catalog collection and replaced by an emergencyInfoRef
+digest. Recommendations move to the catalog (recommendationsRef) only when
+several records hold the same text, e.g. the fallback recommendations;
+generated text is unique and stays in its record. Finding the shared texts
+takes a first pass over the recommendations of all records.
+
+Reads resolve the references transparently, so records can be migrated
+while the API is running, and re-running the migration is safe.
+
+Usage:
+    python migrate_recommendations.py --dry-run                # Report sizes, change nothing
+    python migrate_recommendations.py
+    python migrate_recommendations.py --sample-user <user_id>  # Also time list reads before/after
+"""
+import time
+import argparse
+from datetime import datetime
+from collections import Counter
+from typing import Any, Dict
+
+from firebase_admin import firestore
+
+from firebase_service import CATALOG_COLLECTION, FirebaseService, catalog_digest
+
+
+def value_size(value: Any) -> int:
+    """Storage size of a Firestore field value, per Firestore's size rules."""
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key.encode('utf-8')) + 1 + value_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    return 8
+
+
+def document_size(collection: str, doc_id: str, data: Dict) -> int:
+    """Storage size of a document (name, fields and the fixed 32-byte overhead)."""
+    name_size = len(collection) + 1 + len(doc_id) + 1 + 16
+    return name_size + value_size(data) + 32
+
+
+def time_list_read(firebase: FirebaseService, user_id: str, runs: int = 5) -> float:
+    """Median time in ms to read a user's first page of records."""
+    firebase.get_injury_records(user_id)  # Warm up the connection and catalog cache
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        firebase.get_injury_records(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def recommendation_counts(firebase: FirebaseService) -> Counter:
+    """Number of records embedding each recommendations text, by catalog digest."""
+    counts = Counter()
+    for doc in firebase.db.collection('injuries').select(['recommendations']).stream():
+        recommendations = doc.to_dict().get('recommendations')
+        if recommendations is not None:
+            counts[catalog_digest({'recommendations': recommendations})] += 1
+    return counts
+
+
+def migrate(args):
+    """Migrate all injury records and print the size report."""
+    firebase = FirebaseService()
+
+    before_ms = time_list_read(firebase, args.sample_user) if args.sample_user else None
+    counts = recommendation_counts(firebase)
+
+    scanned = migrated = 0
+    size_before = size_after = 0
+    created = {}  # Catalog entries written (digest -> entry)
+    added = {}  # Catalog entries in the current batch
+    batch = firebase.db.batch()
+    pending = 0
+
+    def reference(entry: Dict) -> str:
+        if args.dry_run:
+            digest = catalog_digest(entry)
+            added.setdefault(digest, entry)
+            return digest
+        return firebase.add_catalog_entry(batch, entry, added)
+
+    for doc in firebase.db.collection('injuries').stream():
+        data = doc.to_dict()
+        scanned += 1
+        size_before += document_size('injuries', doc.id, data)
+
+        update = {}
+        if 'emergencyInfo' in data:
+            data['emergencyInfoRef'] = reference({'emergencyInfo': data.pop('emergencyInfo')})
+            update.update(emergencyInfoRef=data['emergencyInfoRef'], emergencyInfo=firestore.DELETE_FIELD)
+        if 'recommendations' in data:
+            entry = {'recommendations': data['recommendations']}
+            if counts[catalog_digest(entry)] > 1:
+                del data['recommendations']
+                data['recommendationsRef'] = reference(entry)
+                update.update(recommendationsRef=data['recommendationsRef'],
+                              recommendations=firestore.DELETE_FIELD)
+
+        size_after += document_size('injuries', doc.id, data)
+        if not update:
+            continue
+        migrated += 1
+        if args.dry_run:
+            continue
+
+        batch.update(doc.reference, update)
+        pending += 1
+
+        # Catalog entries are writes in the same batch
+        if pending + len(added) >= args.batch_size:
+            batch.commit()
+            firebase.cache_catalog_entries(added)
+            created.update(added)
+            added.clear()
+            batch = firebase.db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+        firebase.cache_catalog_entries(added)
+    created.update(added)
+
+    created_at = datetime.utcnow().isoformat()
+    catalog_size = sum(document_size(CATALOG_COLLECTION, digest, dict(entry, createdAt=created_at))
+                       for digest, entry in created.items())
+
+    print("-" * 50)
+    print(f"Records scanned:        {scanned}")
+    print(f"Records {'to migrate' if args.dry_run else 'migrated'}:      {migrated}")
+    print(f"Catalog entries:        {len(created)} new ({catalog_size / 1024:.1f} KB)")
+    if scanned:
+        print(f"Average record size:    {size_before / scanned:.0f} -> {size_after / scanned:.0f} bytes")
+        print(f"Total storage:          {size_before / 1024:.1f} -> "
+              f"{(size_after + catalog_size) / 1024:.1f} KB (records and new catalog entries)")
+
+    if args.sample_user and not args.dry_run:
+        after_ms = time_list_read(FirebaseService(), args.sample_user)
+        print(f"List read ({args.sample_user}): {before_ms:.1f} -> {after_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move shared recommendation text into the recommendation catalog')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report sizes without changing anything')
+    parser.add_argument('--batch-size', type=int, default=400,
+                        help='Writes per batch, record updates and catalog entries (default: 400)')
+    parser.add_argument('--sample-user', default=None,
+                        help='Time list reads for this user before and after the migration')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Injury Tracker - Recommendation Catalog Migration")
+    print("=" * 50)
+
+    migrate(args)
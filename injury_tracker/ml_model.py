@@ -1,40 +1,246 @@
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, models
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
 import numpy as np
-from PIL import Image
-import cv2
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+import json
 import os
+import time
+
+# Image decoding lives in image_io (no TensorFlow) and is re-exported here
+from image_io import (
+    IMAGE_EXTENSIONS,
+    ALLOWED_IMAGE_FORMATS,
+    MAX_DECODE_PIXELS,
+    UnsupportedImageError,
+    ImageTooLargeError,
+    list_dataset_files,
+    probe_image,
+    decode_image,
+    decode_raw_image
+)
+
+
+def resize_images(images, size: Tuple[int, int]) -> tf.Tensor:
+    """
+    Resize a batch of images to a model's input size, antialiased and rounded to uint8.
+    
+    Images are decoded to one size with decode_image (PIL, bicubic). This
+    function resizes already decoded images for a model of another size: the
+    cascade gate, and models trained from shards stored at another
+    resolution. The training pipeline, calibration and serving inference
+    all use it for that step, so the gate and its calibrated thresholds see
+    the same pixels everywhere.
+    
+    Args:
+        images: Array or tensor of shape (n, height, width, 3), values 0-255
+        size: Target (height, width)
+        
+    Returns:
+        uint8 tensor of shape (n, size[0], size[1], 3)
+    """
+    resized = tf.image.resize(images, size, antialias=True)
+    return tf.cast(tf.clip_by_value(tf.round(resized), 0, 255), tf.uint8)
+
+
+def model_metadata_path(model_path: str) -> str:
+    """Path of the JSON metadata file stored next to a model file."""
+    return os.path.splitext(model_path)[0] + '.json'
+
+
+def load_model_metadata(model_path: str) -> Dict:
+    """
+    Load the metadata stored next to a model file.
+    
+    Args:
+        model_path: Path to the model (.h5)
+        
+    Returns:
+        Metadata dict (empty if the model has no metadata file)
+    """
+    path = model_metadata_path(model_path)
+    if not os.path.exists(path):
+        return {}
+    
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_model_metadata(model_path: str, **fields) -> Dict:
+    """
+    Merge fields into the metadata stored next to a model file.
+    
+    Args:
+        model_path: Path to the model (.h5)
+        **fields: Top-level metadata entries to add or replace
+        
+    Returns:
+        The updated metadata
+    """
+    metadata = load_model_metadata(model_path)
+    metadata.update(fields)
+    with open(model_metadata_path(model_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def split_dataset(
+    labels: List[int],
+    validation_split: float = 0.2,
+    seed: int = 42
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deterministic stratified train/validation split.
+    
+    Args:
+        labels: Integer label of every sample
+        validation_split: Fraction of each class held out for validation
+        seed: Random seed, so every run gets the same split
+        
+    Returns:
+        Tuple of (train indices, validation indices)
+    """
+    labels = np.asarray(labels)
+    rng = np.random.RandomState(seed)
+    train_idx, val_idx = [], []
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        rng.shuffle(idx)
+        n_val = int(round(len(idx) * validation_split))
+        val_idx.append(idx[:n_val])
+        train_idx.append(idx[n_val:])
+    return np.sort(np.concatenate(train_idx)), np.sort(np.concatenate(val_idx))
 
 
 class WoundClassifier:
     """ML Model for wound severity classification."""
     
-    def __init__(self, model_path: str = None):
+    def __init__(
+        self,
+        model_path: str = None,
+        learning_rate: float = 0.001,
+        head_units: int = 128,
+        dropout: float = 0.5,
+        architecture: str = 'mobilenetv2',
+        img_size: int = 224,
+        alpha: float = 1.0,
+        gate_model_path: str = None
+    ):
         """
         Initialize the wound classifier.
         
         Args:
             model_path: Path to saved model. If None, creates a new model.
+            learning_rate: Adam learning rate for a new model
+            head_units: Width of the first dense layer of the classification
+                head (the second layer is half as wide)
+            dropout: Dropout after the first dense layer (the second dropout
+                layer uses 60% of this rate)
+            architecture: 'mobilenetv2' or 'small_cnn' for a new model
+            img_size: Input height and width for a new model. Loaded models
+                use their own input size.
+            alpha: MobileNetV2 width multiplier for a new model
+            gate_model_path: Optional cheap gate model for cascade inference
+                (see cascade_model.py)
         """
-        self.img_height = 224
-        self.img_width = 224
+        self.img_height = img_size
+        self.img_width = img_size
         self.num_classes = 3  # mild, moderate, severe
         self.class_names = ['mild', 'moderate', 'severe']
+        self.learning_rate = learning_rate
+        self.head_units = head_units
+        self.dropout = dropout
+        self.architecture = architecture
+        self.alpha = alpha
         
+        self.metadata = {}
         if model_path and os.path.exists(model_path):
             self.model = keras.models.load_model(model_path)
+            self.metadata = load_model_metadata(model_path)
+            
+            # Input size and classes come from the model's metadata, falling
+            # back to the saved model's input shape for older models
+            input_size = self.metadata.get('input_size', self.model.input_shape[1:3])
+            self.img_height, self.img_width = int(input_size[0]), int(input_size[1])
+            self.class_names = self.metadata.get('class_names', self.class_names)
+            self.num_classes = len(self.class_names)
+            self.architecture = self.metadata.get('architecture', self.architecture)
+            self.alpha = self.metadata.get('alpha', self.alpha)
         else:
             self.model = self._build_model()
+        
+        self.gate = None
+        self.gate_thresholds = {}
+        if gate_model_path and os.path.exists(gate_model_path):
+            self.load_gate(gate_model_path)
+    
+    def load_gate(self, gate_model_path: str):
+        """
+        Enable cascade inference with a gate model.
+        
+        The gate answers on its own when its confidence for the predicted class
+        reaches that class's calibrated threshold; otherwise the input is
+        escalated to the full model. Thresholds are read from the gate model's
+        metadata, written by cascade_model.py.
+        
+        Args:
+            gate_model_path: Path to the gate model (.h5)
+        """
+        gate = WoundClassifier(gate_model_path)
+        if 'thresholds' not in gate.metadata:
+            raise ValueError(f"Gate model {gate_model_path} has no calibrated thresholds. "
+                             "Run: python cascade_model.py --calibrate-only")
+        
+        self.gate = gate
+        self.gate_thresholds = gate.metadata['thresholds']
     
     def _build_model(self) -> keras.Model:
+        """Build the classification model for the configured architecture."""
+        if self.architecture == 'small_cnn':
+            model = self._build_small_cnn()
+        elif self.architecture == 'mobilenetv2':
+            model = self._build_mobilenet()
+        else:
+            raise ValueError(f"Unknown architecture: {self.architecture}")
+        
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        
+        return model
+    
+    def _build_small_cnn(self) -> keras.Model:
+        """Build a small CNN (tens of thousands of parameters) for fast gating."""
+        model = models.Sequential([
+            layers.Input(shape=(self.img_height, self.img_width, 3)),
+            layers.Conv2D(16, 3, strides=2, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.SeparableConv2D(32, 3, strides=2, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.SeparableConv2D(64, 3, strides=2, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.SeparableConv2D(128, 3, strides=2, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.GlobalAveragePooling2D(),
+            layers.Dropout(self.dropout),
+            layers.Dense(self.num_classes, activation='softmax')
+        ])
+        
+        return model
+    
+    def _build_mobilenet(self) -> keras.Model:
         """Build a transfer learning model using MobileNetV2."""
         # Load pre-trained MobileNetV2
         base_model = MobileNetV2(
             input_shape=(self.img_height, self.img_width, 3),
+            alpha=self.alpha,
             include_top=False,
             weights='imagenet'
         )
@@ -46,19 +252,13 @@ class WoundClassifier:
         model = models.Sequential([
             base_model,
             layers.GlobalAveragePooling2D(),
-            layers.Dense(128, activation='relu'),
-            layers.Dropout(0.5),
-            layers.Dense(64, activation='relu'),
-            layers.Dropout(0.3),
+            layers.Dense(self.head_units, activation='relu'),
+            layers.Dropout(self.dropout),
+            layers.Dense(self.head_units // 2, activation='relu'),
+            layers.Dropout(round(self.dropout * 0.6, 4)),
             layers.Dense(self.num_classes, activation='softmax')
         ])
         
-        model.compile(
-            optimizer='adam',
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
-        
         return model
     
     def preprocess_image(self, image_bytes: bytes) -> np.ndarray:
@@ -71,14 +271,8 @@ class WoundClassifier:
         Returns:
             Preprocessed image array
         """
-        # Convert bytes to PIL Image
-        image = Image.open(image_bytes).convert('RGB')
-        
-        # Resize
-        image = image.resize((self.img_width, self.img_height))
-        
-        # Convert to array
-        img_array = np.array(image)
+        # Decode and resize
+        img_array = decode_image(image_bytes, (self.img_height, self.img_width))
         
         # Normalize
         img_array = img_array / 255.0
@@ -98,22 +292,129 @@ class WoundClassifier:
         Returns:
             Dictionary with prediction results
         """
-        # Preprocess image
-        processed_image = self.preprocess_image(image_bytes)
+        image = decode_image(image_bytes, (self.img_height, self.img_width))
+        return self.predict_array(image)
+    
+    def predict_array(self, image: np.ndarray) -> Dict[str, any]:
+        """
+        Predict wound severity for one decoded image.
+        
+        With a gate model loaded, the gate runs first on a downscaled copy and
+        only inputs it is not confident about reach the full model.
+        
+        Args:
+            image: uint8 array of shape (height, width, 3); other sizes than
+                the model input are resized with resize_images
+            
+        Returns:
+            Dictionary with prediction results; 'model_stage' says whether the
+            gate ('gate') or the full model ('full') produced it
+        """
+        if self.gate is not None:
+            gate_probabilities = self.gate._infer(image[np.newaxis])[0]
+            gate_class = self.class_names[int(np.argmax(gate_probabilities))]
+            
+            if gate_probabilities.max() >= self.gate_thresholds.get(gate_class, float('inf')):
+                result = self._format_prediction(gate_probabilities)
+                result['model_stage'] = 'gate'
+                return result
+        
+        result = self._format_prediction(self._infer(image[np.newaxis])[0])
+        result['model_stage'] = 'full'
+        return result
+    
+    def _infer(self, images: np.ndarray) -> np.ndarray:
+        """
+        Run a compiled forward pass on a small uint8 batch (no predict() overhead).
+        
+        Batches of another image size are resized inside the compiled function,
+        which costs far less than a separate eager resize.
+        """
+        if getattr(self, '_serving_model', None) is not self.model:
+            model = self.model
+            size = (self.img_height, self.img_width)
+            
+            def serve(batch):
+                # Shapes may be generalized to None; resizing to the same size is exact
+                if tuple(batch.shape[1:3]) != size:
+                    batch = resize_images(batch, size)
+                return model(tf.cast(batch, tf.float32) / 255.0, training=False)
+            
+            self._serving_fn = tf.function(serve, reduce_retracing=True)
+            self._serving_model = model
+        return self._serving_fn(images).numpy()
+    
+    def measure_latency(self, batch_size: int = 1, runs: int = 50) -> float:
+        """
+        Measure mean inference latency on random input.
+        
+        Args:
+            batch_size: Images per call
+            runs: Timed calls after one warm-up call
+            
+        Returns:
+            Mean latency per call in milliseconds
+        """
+        images = np.random.randint(
+            0, 256, (batch_size, self.img_height, self.img_width, 3), dtype=np.uint8
+        )
+        self._infer(images)  # Warm up
+        
+        start = time.perf_counter()
+        for _ in range(runs):
+            self._infer(images)
+        return (time.perf_counter() - start) * 1000 / runs
+    
+    def predict_batch(self, images: np.ndarray, batch_size: int = 64) -> List[Dict[str, any]]:
+        """
+        Predict wound severity for a batch of decoded images.
+        
+        Args:
+            images: uint8 array of shape (n, img_height, img_width, 3)
+            batch_size: Inference batch size
+            
+        Returns:
+            One prediction dictionary per image
+        """
+        if len(images) == 0:
+            return []
+        
+        predictions = self.predict_probabilities(images, batch_size)
+        return [self._format_prediction(row) for row in predictions]
+    
+    def predict_probabilities(self, images: np.ndarray, batch_size: int = 64) -> np.ndarray:
+        """
+        Class probabilities for a batch of decoded images.
         
-        # Make prediction
-        predictions = self.model.predict(processed_image, verbose=0)
+        Args:
+            images: uint8 array of shape (n, height, width, 3); images of another
+                size are resized to the model input first
+            batch_size: Inference batch size
+            
+        Returns:
+            Array of shape (n, num_classes)
+        """
+        if images.shape[1:3] != (self.img_height, self.img_width):
+            images = resize_images(images, (self.img_height, self.img_width)).numpy()
         
+        return self.model.predict(
+            images.astype(np.float32) / 255.0,
+            batch_size=batch_size,
+            verbose=0
+        )
+    
+    def _format_prediction(self, probabilities: np.ndarray) -> Dict[str, any]:
+        """Turn one row of class probabilities into a prediction dictionary."""
         # Get class probabilities
         class_probabilities = {
-            self.class_names[i]: float(predictions[0][i])
+            self.class_names[i]: float(probabilities[i])
             for i in range(self.num_classes)
         }
         
         # Get predicted class
-        predicted_class_idx = np.argmax(predictions[0])
+        predicted_class_idx = np.argmax(probabilities)
         predicted_class = self.class_names[predicted_class_idx]
-        confidence = float(predictions[0][predicted_class_idx])
+        confidence = float(probabilities[predicted_class_idx])
         
         return {
             'severity': predicted_class,
@@ -121,7 +422,148 @@ class WoundClassifier:
             'probabilities': class_probabilities
         }
     
-    def train(self, train_dir: str, epochs: int = 30, batch_size: int = 32):
+    def _augmentation(self, seed: int = None) -> keras.Sequential:
+        """Batched augmentation layers (rotation, shift, flip, zoom)."""
+        return keras.Sequential([
+            layers.RandomFlip('horizontal', seed=seed),
+            layers.RandomRotation(20 / 360, fill_mode='nearest', seed=seed),
+            layers.RandomTranslation(0.2, 0.2, fill_mode='nearest', seed=seed),
+            layers.RandomZoom(0.2, fill_mode='nearest', seed=seed)
+        ])
+    
+    def _decode_file(self, path: tf.Tensor, label: tf.Tensor) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Read, decode and resize one image file to a uint8 tensor.
+        
+        Uses decode_image (PIL, bicubic), the same decoder the API and the
+        dataset shards use, so the model trains on the pixels it is served.
+        """
+        size = (self.img_height, self.img_width)
+        image = tf.numpy_function(
+            lambda file_path: decode_image(np.asarray(file_path).item().decode('utf-8'), size),
+            [path],
+            tf.uint8
+        )
+        image.set_shape((self.img_height, self.img_width, 3))
+        return image, tf.one_hot(label, self.num_classes)
+    
+    def make_dataset(
+        self,
+        dataset: tf.data.Dataset,
+        batch_size: int,
+        training: bool = False,
+        seed: int = 42,
+        cache: bool = True
+    ) -> tf.data.Dataset:
+        """
+        Turn a dataset of (uint8 image, one-hot label) pairs into model input.
+        
+        Args:
+            dataset: Unbatched dataset of decoded, resized images
+            batch_size: Batch size
+            training: Shuffle and augment when True
+            seed: Shuffle/augmentation seed
+            cache: Cache the decoded images in memory after the first epoch
+            
+        Returns:
+            Batched, normalized and prefetched dataset
+        """
+        if cache:
+            dataset = dataset.cache()
+        
+        if training:
+            dataset = dataset.shuffle(2048, seed=seed, reshuffle_each_iteration=True)
+        
+        dataset = dataset.batch(batch_size)
+        
+        # Sources stored at another resolution (e.g. 224px shards for a smaller model)
+        if tuple(dataset.element_spec[0].shape[1:3]) != (self.img_height, self.img_width):
+            dataset = dataset.map(
+                lambda images, labels: (resize_images(images, (self.img_height, self.img_width)), labels),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        
+        dataset = dataset.map(
+            lambda images, labels: (tf.cast(images, tf.float32) / 255.0, labels),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        
+        if training:
+            augment = self._augmentation(seed)
+            dataset = dataset.map(
+                lambda images, labels: (augment(images, training=True), labels),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def build_datasets(
+        self,
+        train_dir: str,
+        batch_size: int = 32,
+        validation_split: float = 0.2,
+        seed: int = 42,
+        shard_dir: str = None
+    ) -> Tuple[tf.data.Dataset, tf.data.Dataset]:
+        """
+        Build tf.data training and validation pipelines from a dataset directory.
+        
+        Files are read and decoded in parallel, decoded images are cached, and
+        only the training subset is augmented.
+        
+        Args:
+            train_dir: Directory containing training data (mild/, moderate/, severe/)
+            batch_size: Batch size
+            validation_split: Fraction of each class used for validation
+            seed: Seed for the split, shuffling and augmentation
+            shard_dir: Read pre-decoded images from this shard directory
+                (see dataset_shards.py) instead of decoding train_dir
+            
+        Returns:
+            Tuple of (training dataset, validation dataset)
+        """
+        if shard_dir:
+            from dataset_shards import ShardedDataset
+            
+            # Shards stored at another resolution are resized in make_dataset()
+            shards = ShardedDataset(shard_dir)
+            
+            train_idx, val_idx = split_dataset(shards.labels, validation_split, seed)
+            print(f"Loaded {len(train_idx)} training and {len(val_idx)} validation images "
+                  f"from shards in {shard_dir}.")
+            
+            # Shards are memory-mapped, so there is nothing to gain from cache()
+            train_ds = self.make_dataset(shards.to_tf_dataset(train_idx), batch_size,
+                                         training=True, seed=seed, cache=False)
+            val_ds = self.make_dataset(shards.to_tf_dataset(val_idx), batch_size, cache=False)
+            return train_ds, val_ds
+        
+        paths, labels = list_dataset_files(train_dir, self.class_names)
+        if not paths:
+            raise ValueError(f"No images found in {train_dir}")
+        
+        train_idx, val_idx = split_dataset(labels, validation_split, seed)
+        paths = np.array(paths)
+        labels = np.array(labels, dtype=np.int32)
+        
+        def decoded(indices: np.ndarray) -> tf.data.Dataset:
+            dataset = tf.data.Dataset.from_tensor_slices((paths[indices], labels[indices]))
+            return dataset.map(self._decode_file, num_parallel_calls=tf.data.AUTOTUNE)
+        
+        print(f"Found {len(train_idx)} training and {len(val_idx)} validation images "
+              f"belonging to {self.num_classes} classes.")
+        
+        train_ds = self.make_dataset(decoded(train_idx), batch_size, training=True, seed=seed)
+        val_ds = self.make_dataset(decoded(val_idx), batch_size, training=False)
+        return train_ds, val_ds
+    
+    def train(
+        self,
+        train_dir: str,
+        epochs: int = 30,
+        batch_size: int = 32,
+        shard_dir: str = None
+    ):
         """
         Train the model on wound images.
         
@@ -129,73 +571,87 @@ class WoundClassifier:
             train_dir: Directory containing training data (mild/, moderate/, severe/)
             epochs: Number of training epochs (default: 30)
             batch_size: Batch size for training
+            shard_dir: Optional directory of preprocessed dataset shards
         """
-        # Data augmentation
-        train_datagen = ImageDataGenerator(
-            rescale=1./255,
-            rotation_range=20,
-            width_shift_range=0.2,
-            height_shift_range=0.2,
-            horizontal_flip=True,
-            zoom_range=0.2,
-            validation_split=0.2
+        train_dataset, validation_dataset = self.build_datasets(
+            train_dir, batch_size, shard_dir=shard_dir
         )
         
-        # Training data
-        train_generator = train_datagen.flow_from_directory(
-            train_dir,
-            target_size=(self.img_height, self.img_width),
-            batch_size=batch_size,
-            class_mode='categorical',
-            subset='training'
-        )
-        
-        # Validation data
-        validation_generator = train_datagen.flow_from_directory(
-            train_dir,
-            target_size=(self.img_height, self.img_width),
-            batch_size=batch_size,
-            class_mode='categorical',
-            subset='validation'
-        )
+        return self.fit(train_dataset, validation_dataset, epochs)
+    
+    def fit(
+        self,
+        train_dataset: tf.data.Dataset,
+        validation_dataset: tf.data.Dataset,
+        epochs: int = 30,
+        checkpoint_dir: str = './models',
+        verbose: int = 1
+    ):
+        """
+        Fit the model on prepared datasets with early stopping.
         
+        Args:
+            train_dataset: Batched training dataset (see make_dataset)
+            validation_dataset: Batched validation dataset
+            epochs: Maximum number of epochs
+            checkpoint_dir: Where to save best-epoch checkpoints (None to disable)
+            verbose: Keras verbosity
+            
+        Returns:
+            Keras training history
+        """
         # Callbacks - increased patience for longer training
         callbacks = [
             keras.callbacks.EarlyStopping(
                 monitor='val_loss',
                 patience=10,  # Increased from 5 to 10 - allows more epochs
                 restore_best_weights=True,
-                verbose=1
+                verbose=verbose
             ),
             keras.callbacks.ReduceLROnPlateau(
                 monitor='val_loss',
                 factor=0.2,
                 patience=5,  # Increased from 3 to 5
                 min_lr=1e-7,
-                verbose=1
-            ),
-            keras.callbacks.ModelCheckpoint(
-                filepath='./models/checkpoint_epoch_{epoch:02d}_val_acc_{val_accuracy:.2f}.h5',
-                monitor='val_accuracy',
-                save_best_only=True,
-                verbose=1
+                verbose=verbose
             )
         ]
         
+        if checkpoint_dir:
+            callbacks.append(keras.callbacks.ModelCheckpoint(
+                filepath=os.path.join(checkpoint_dir, 'checkpoint_epoch_{epoch:02d}_val_acc_{val_accuracy:.2f}.h5'),
+                monitor='val_accuracy',
+                save_best_only=True,
+                verbose=verbose
+            ))
+        
         # Train
         history = self.model.fit(
-            train_generator,
-            validation_data=validation_generator,
+            train_dataset,
+            validation_data=validation_dataset,
             epochs=epochs,
             callbacks=callbacks,
-            verbose=1
+            verbose=verbose
         )
         
         return history
     
-    def save_model(self, path: str):
-        """Save the model to disk."""
+    def save_model(self, path: str, **metadata):
+        """
+        Save the model to disk, with its metadata in a JSON file next to it.
+        
+        Args:
+            path: Model path (.h5)
+            **metadata: Extra metadata entries to store
+        """
         self.model.save(path)
+        with open(model_metadata_path(path), 'w') as f:
+            json.dump(dict({
+                'architecture': self.architecture,
+                'input_size': [self.img_height, self.img_width],
+                'alpha': self.alpha,
+                'class_names': self.class_names
+            }, **metadata), f, indent=2)
         print(f"Model saved to {path}")
     
     def get_severity_description(self, severity: str) -> str:
@@ -0,0 +1,393 @@
+"""
+Serving model deployment without restarts.
+
+A new model version is loaded and warmed (its inference function traced and
+run) in a background thread while the live model keeps serving. It then
+replaces the live model in one reference swap: requests that already started
+finish on the model they began with and new requests use the new one, so no
+request is dropped or pays the cold start.
+
+A new version can first run in shadow: a sampled fraction of live requests
+(SHADOW_SAMPLE_RATE) is classified again by the candidate on a separate
+thread, after the response is computed, and agreement and latency against
+the live model are recorded. Shadow results are never returned or stored.
+Promote the candidate once its numbers look right.
+
+Versions come from the model's metadata ('version') or, failing that, from
+the first 12 hex digits of the model file's SHA-256.
+
+Deployments are started from the admin endpoints, or by a watcher that
+reloads MODEL_PATH when the file changes (MODEL_WATCH_SECONDS > 0). Replace
+the file with an atomic rename (write to a temporary name, then mv) so the
+watcher never sees a partly written model.
+"""
+import os
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from ml_model import WoundClassifier, load_model_metadata
+
+# Warm-up inference calls before a new model takes traffic
+MODEL_WARMUP_RUNS = int(os.getenv('MODEL_WARMUP_RUNS', 20))
+
+# Fraction of requests classified again by a shadow candidate
+SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', 0.1))
+
+# Seconds between checks of MODEL_PATH for a new file (0 disables the watcher)
+MODEL_WATCH_SECONDS = float(os.getenv('MODEL_WATCH_SECONDS', 0))
+
+# Latest shadow comparisons kept for latency percentiles
+SHADOW_LATENCY_SAMPLES = 1000
+
+
+def model_version(model_path: Optional[str]) -> str:
+    """
+    Version of a model file.
+
+    Args:
+        model_path: Path to the model (.h5), or None for an untrained model
+
+    Returns:
+        The 'version' metadata entry, else the first 12 hex digits of the
+        file's SHA-256, or 'untrained' without a model file
+    """
+    if not model_path or not os.path.exists(model_path):
+        return 'untrained'
+    version = load_model_metadata(model_path).get('version')
+    if version:
+        return str(version)
+
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class Deployment:
+    """A loaded, warmed model and its version."""
+
+    def __init__(self, classifier: WoundClassifier, version: str, path: Optional[str]):
+        self.classifier = classifier
+        self.version = version
+        self.path = path
+        self.loaded_at = datetime.utcnow().isoformat()
+
+    def predict(self, image: np.ndarray) -> Dict:
+        """Classify one decoded image (images of another size are resized by the classifier)."""
+        result = self.classifier.predict_array(image)
+        result['model_version'] = self.version
+        return result
+
+    def describe(self) -> Dict:
+        return {
+            'version': self.version,
+            'path': self.path,
+            'loaded_at': self.loaded_at,
+            'architecture': self.classifier.architecture,
+            'input_size': [self.classifier.img_height, self.classifier.img_width]
+        }
+
+
+class ShadowStats:
+    """Agreement and latency of a shadow candidate against the live model."""
+
+    def __init__(self, live_version: str, candidate_version: str):
+        self.live_version = live_version
+        self.candidate_version = candidate_version
+        self.compared = 0
+        self.agreed = 0
+        self.skipped = 0  # Sampled while the previous comparison was still running
+        self.errors = 0  # Comparisons in which the candidate raised
+        self.last_error = None
+        self.confusion = {}  # 'live->candidate' -> count
+        self.confidence_delta = 0.0
+        self.live_ms = deque(maxlen=SHADOW_LATENCY_SAMPLES)
+        self.candidate_ms = deque(maxlen=SHADOW_LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def add(self, live: Dict, candidate: Dict, live_ms: float, candidate_ms: float):
+        with self._lock:
+            self.compared += 1
+            if live['severity'] == candidate['severity']:
+                self.agreed += 1
+            else:
+                key = f"{live['severity']}->{candidate['severity']}"
+                self.confusion[key] = self.confusion.get(key, 0) + 1
+            self.confidence_delta += candidate['confidence'] - live['confidence']
+            self.live_ms.append(live_ms)
+            self.candidate_ms.append(candidate_ms)
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self.errors += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+
+    def summary(self) -> Dict:
+        with self._lock:
+            def percentiles(samples):
+                if not samples:
+                    return None
+                p50, p95 = np.percentile(np.fromiter(samples, dtype=float), [50, 95])
+                return {'p50': round(float(p50), 2), 'p95': round(float(p95), 2)}
+
+            return {
+                'live_version': self.live_version,
+                'candidate_version': self.candidate_version,
+                'compared': self.compared,
+                'skipped': self.skipped,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'agreement': self.agreed / self.compared if self.compared else None,
+                'disagreements': dict(self.confusion),
+                'mean_confidence_delta': self.confidence_delta / self.compared if self.compared else None,
+                'live_ms': percentiles(self.live_ms),
+                'candidate_ms': percentiles(self.candidate_ms)
+            }
+
+
+class ModelManager:
+    """
+    The live model, an optional shadow candidate, and background deployment.
+
+    Args:
+        classifier: Initially loaded classifier (its gate model, if any, is
+            kept for every later version)
+        model_path: Path the classifier was loaded from (None if untrained)
+        warmup_runs: Warm-up inference calls before a new model takes traffic
+        shadow_rate: Fraction of requests the shadow candidate classifies
+    """
+
+    def __init__(self, classifier: WoundClassifier, model_path: Optional[str] = None,
+                 warmup_runs: int = MODEL_WARMUP_RUNS, shadow_rate: float = SHADOW_SAMPLE_RATE):
+        self.warmup_runs = warmup_runs
+        self.shadow_rate = shadow_rate
+        self.live = Deployment(classifier, model_version(model_path), model_path)
+        self.candidate = None
+        self.shadow_stats = None
+        self.deploying = None  # {'path', 'shadow', 'started_at'} while a load runs
+        self.last_deploy = None  # Outcome of the latest load
+        self._deploy_lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1)
+        self._shadow_slot = threading.Lock()  # Held while a comparison runs
+
+    @property
+    def classifier(self) -> WoundClassifier:
+        return self.live.classifier
+
+    def predict(self, image: np.ndarray) -> Dict:
+        """
+        Classify an image with the live model, and sample it for the shadow candidate.
+
+        Args:
+            image: Decoded uint8 RGB image
+
+        Returns:
+            Prediction dictionary, with the 'model_version' that produced it
+        """
+        live = self.live  # One read: a concurrent swap cannot mix versions
+        start = time.perf_counter()
+        result = live.predict(image)
+        live_ms = (time.perf_counter() - start) * 1000
+
+        candidate, stats = self.candidate, self.shadow_stats
+        if candidate is not None and random.random() < self.shadow_rate:
+            # Never queue shadow work: under load it would only fall behind
+            if self._shadow_slot.acquire(blocking=False):
+                try:
+                    self._shadow_executor.submit(self._compare, candidate, stats, image, result, live_ms)
+                except Exception:
+                    self._shadow_slot.release()
+                    raise
+            else:
+                stats.skip()
+        return result
+
+    def _compare(self, candidate: Deployment, stats: ShadowStats, image: np.ndarray,
+                 live_result: Dict, live_ms: float):
+        # Runs on the shadow thread with _shadow_slot held; releases it
+        try:
+            start = time.perf_counter()
+            result = candidate.predict(image)
+            stats.add(live_result, result, live_ms, (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            stats.fail(e)  # Reported in status(); the live response is unaffected
+        finally:
+            self._shadow_slot.release()
+
+    def load(self, model_path: str) -> Deployment:
+        """
+        Load and warm a model version without touching the live model.
+
+        Args:
+            model_path: Path to the model (.h5)
+
+        Returns:
+            The warmed deployment
+
+        Raises:
+            ValueError: The file is missing, or the model predicts other classes
+        """
+        if not os.path.exists(model_path):
+            raise ValueError(f"Model file not found: {model_path}")
+        version = model_version(model_path)
+        classifier = WoundClassifier(model_path)
+        if set(classifier.class_names) != set(self.classifier.class_names):
+            raise ValueError(f"Model classes {classifier.class_names} differ from the live "
+                             f"model's {self.classifier.class_names}")
+
+        # The gate answers on its own thresholds, so it carries over unchanged
+        classifier.gate = self.classifier.gate
+        classifier.gate_thresholds = self.classifier.gate_thresholds
+
+        # Trace and run the serving function before the model takes traffic
+        classifier.measure_latency(batch_size=1, runs=self.warmup_runs)
+        classifier.predict_array(np.zeros((classifier.img_height, classifier.img_width, 3), dtype=np.uint8))
+        return Deployment(classifier, version, model_path)
+
+    def deploy(self, model_path: str, shadow: bool = False):
+        """
+        Load, warm and activate a model version (blocking).
+
+        Args:
+            model_path: Path to the model (.h5)
+            shadow: Run the new version as the shadow candidate instead of
+                making it live
+
+        Raises:
+            RuntimeError: Another deployment is in progress
+            ValueError: The model could not be used (see load)
+        """
+        if not self._deploy_lock.acquire(blocking=False):
+            raise RuntimeError("Another model deployment is in progress")
+        self._deploy_locked(model_path, shadow)
+
+    def deploy_in_background(self, model_path: str, shadow: bool = False):
+        """
+        Start deploy() in a background thread; the outcome shows in status().
+
+        Raises:
+            RuntimeError: Another deployment is in progress
+        """
+        if not self._deploy_lock.acquire(blocking=False):
+            raise RuntimeError("Another model deployment is in progress")
+
+        def run():
+            try:
+                self._deploy_locked(model_path, shadow)
+            except Exception:
+                pass  # Recorded in last_deploy
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _deploy_locked(self, model_path: str, shadow: bool):
+        # Called with _deploy_lock held; releases it
+        try:
+            self.deploying = {'path': model_path, 'shadow': shadow,
+                              'started_at': datetime.utcnow().isoformat()}
+            start = time.perf_counter()
+            try:
+                deployment = self.load(model_path)
+            except Exception as e:
+                self.last_deploy = dict(self.deploying, error=str(e))
+                raise
+
+            if shadow:
+                self.shadow_stats = ShadowStats(self.live.version, deployment.version)
+                self.candidate = deployment
+            else:
+                self.live = deployment
+            self.last_deploy = dict(self.deploying, version=deployment.version,
+                                    seconds=round(time.perf_counter() - start, 2))
+        finally:
+            self.deploying = None
+            self._deploy_lock.release()
+
+    def promote(self) -> Deployment:
+        """
+        Make the shadow candidate the live model.
+
+        Raises:
+            RuntimeError: A deployment is in progress
+            ValueError: There is no shadow candidate
+        """
+        if not self._deploy_lock.acquire(blocking=False):
+            raise RuntimeError("A model deployment is in progress")
+        try:
+            candidate = self.candidate
+            if candidate is None:
+                raise ValueError("No shadow candidate to promote")
+            self.live = candidate
+            self.candidate = None
+            return candidate
+        finally:
+            self._deploy_lock.release()
+
+    def stop_shadow(self):
+        """
+        Drop the shadow candidate (its statistics stay in status()).
+
+        Raises:
+            RuntimeError: A deployment is in progress
+        """
+        if not self._deploy_lock.acquire(blocking=False):
+            raise RuntimeError("A model deployment is in progress")
+        try:
+            self.candidate = None
+        finally:
+            self._deploy_lock.release()
+
+    def status(self) -> Dict:
+        """Live model, shadow candidate and comparison, and deployment progress."""
+        return {
+            'live': self.live.describe(),
+            'shadow': self.candidate.describe() if self.candidate else None,
+            'shadow_sample_rate': self.shadow_rate,
+            'shadow_stats': self.shadow_stats.summary() if self.shadow_stats else None,
+            'deploying': self.deploying,
+            'last_deploy': self.last_deploy
+        }
+
+    def watch(self, model_path: str, interval: float = MODEL_WATCH_SECONDS):
+        """
+        Deploy model_path whenever the file changes, checking every interval seconds.
+
+        A change is deployed once the file's size and modification time have
+        stayed the same for one interval. Runs in a daemon thread.
+        """
+        def signature():
+            try:
+                stat = os.stat(model_path)
+                return stat.st_mtime_ns, stat.st_size
+            except OSError:
+                return None
+
+        def run():
+            deployed = signature()
+            seen = deployed
+            while True:
+                time.sleep(interval)
+                current = signature()
+                if current is not None and current != deployed and current == seen:
+                    try:
+                        self.deploy(model_path)
+                        deployed = current
+                    except RuntimeError:
+                        pass  # Busy; try again next interval
+                    except Exception:
+                        deployed = current  # Broken file: wait for the next change
+                seen = current
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,173 @@
+"""
+Near-duplicate detection for uploaded wound photos.
+
+Each analyzed photo gets a 64-bit perceptual difference hash (dHash) of its
+model input. Re-encoded, recompressed or slightly cropped copies of a photo
+hash to within a few bits of the original, while different photos differ in
+about half of the bits. Every user has an in-memory index of their hashes;
+a search is one vectorized XOR and popcount over a NumPy array.
+
+Only records created within DUPLICATE_MAX_AGE_HOURS count: a photo of the
+same wound taken days later is a follow-up, not a re-upload, and gets its
+own record however similar it looks.
+
+A user's index is loaded from storage the first time that user uploads after
+startup (a blocking read; call find from a worker thread), then kept up to
+date as records are added and deleted.
+"""
+import os
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+DUPLICATE_MAX_DISTANCE = int(os.getenv('DUPLICATE_MAX_DISTANCE', 6))
+
+# Records older than this are never matched (follow-up photos get a new record)
+DUPLICATE_MAX_AGE_HOURS = float(os.getenv('DUPLICATE_MAX_AGE_HOURS', 12))
+
+# Set-bit count of every byte value (for NumPy versions without bitwise_count)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """
+    64-bit difference hash of an image.
+
+    Each bit says whether a cell of a 9x8 grayscale thumbnail is brighter than
+    its right-hand neighbour, which survives re-encoding, rescaling and small
+    crops.
+
+    Args:
+        image: uint8 RGB array
+
+    Returns:
+        Hash as an unsigned 64-bit integer
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    thumbnail = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Number of differing bits between every hash in a uint64 array and value."""
+    diff = hashes ^ np.uint64(value)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff)
+    return _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def created_seconds(created_at: Optional[str]) -> float:
+    """Unix time of a record's createdAt (naive UTC ISO string); 0 if unknown."""
+    if not created_at:
+        return 0.0
+    return datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc).timestamp()
+
+
+class _UserIndex:
+    """Hashes, creation times and record IDs of one user, in growable arrays."""
+
+    def __init__(self, entries: Iterable[Tuple[str, int, float]]):
+        entries = list(entries)
+        self.ids = [injury_id for injury_id, _, _ in entries]
+        self.hashes = np.zeros(max(16, len(entries) * 2), dtype=np.uint64)
+        self.hashes[:len(entries)] = [value for _, value, _ in entries]
+        self.created = np.zeros(len(self.hashes), dtype=np.float64)
+        self.created[:len(entries)] = [created for _, _, created in entries]
+
+    def find(self, value: int, max_distance: int, min_created: float) -> Optional[Tuple[str, int]]:
+        if not self.ids:
+            return None
+        count = len(self.ids)
+        distances = hamming_distances(self.hashes[:count], value).astype(np.int64)
+        distances[self.created[:count] < min_created] = max_distance + 1
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return self.ids[best], int(distances[best])
+
+    def add(self, injury_id: str, value: int, created: float):
+        if len(self.ids) == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.zeros_like(self.hashes)])
+            self.created = np.concatenate([self.created, np.zeros_like(self.created)])
+        self.hashes[len(self.ids)] = value
+        self.created[len(self.ids)] = created
+        self.ids.append(injury_id)
+
+    def remove(self, injury_id: str):
+        if injury_id not in self.ids:
+            return
+        # Move the last entry into the freed slot
+        i = self.ids.index(injury_id)
+        last = len(self.ids) - 1
+        self.hashes[i] = self.hashes[last]
+        self.created[i] = self.created[last]
+        self.ids[i] = self.ids[last]
+        self.ids.pop()
+
+
+class DuplicateIndex:
+    """Per-user perceptual hash indexes, loaded lazily from storage."""
+
+    def __init__(
+        self,
+        loader: Callable[[str], Iterable[Tuple[str, str, Optional[str]]]],
+        max_distance: int = DUPLICATE_MAX_DISTANCE,
+        max_age_hours: float = DUPLICATE_MAX_AGE_HOURS
+    ):
+        """
+        Args:
+            loader: Returns (record ID, hex hash, createdAt) of a user's stored records
+            max_distance: Largest Hamming distance counted as a duplicate
+            max_age_hours: Age of the oldest record that can still be matched
+        """
+        self.loader = loader
+        self.max_distance = max_distance
+        self.max_age_hours = max_age_hours
+        self._users: Dict[str, _UserIndex] = {}
+        self._lock = threading.Lock()
+
+    def _user(self, user_id: str) -> _UserIndex:
+        index = self._users.get(user_id)
+        if index is None:
+            entries = [(injury_id, int(value, 16), created_seconds(created_at))
+                       for injury_id, value, created_at in self.loader(user_id)]
+            with self._lock:
+                index = self._users.setdefault(user_id, _UserIndex(entries))
+        return index
+
+    def find(self, user_id: str, value: int) -> Optional[Tuple[str, int]]:
+        """
+        Find the closest earlier photo of the user within max_distance and max_age_hours.
+
+        Loads the user's index on first use, which reads storage.
+
+        Returns:
+            Tuple of (record ID, Hamming distance), or None
+        """
+        index = self._user(user_id)
+        min_created = time.time() - self.max_age_hours * 3600
+        with self._lock:
+            return index.find(value, self.max_distance, min_created)
+
+    def add(self, user_id: str, injury_id: str, value: int, created: Optional[float] = None):
+        """Index a newly stored record (created: Unix time, default now)."""
+        index = self._user(user_id)
+        with self._lock:
+            index.add(injury_id, value, time.time() if created is None else created)
+
+    def remove(self, user_id: str, injury_id: str):
+        """Drop a deleted record from the index (no-op if the user is not loaded)."""
+        index = self._users.get(user_id)
+        if index is not None:
+            with self._lock:
+                index.remove(injury_id)
+
+
+def format_hash(value: int) -> str:
+    """Hash as the 16-digit hex string stored with records."""
+    return f"{value:016x}"
@@ -0,0 +1,237 @@
+"""
+Latency/accuracy Pareto report for classifier configurations.
+Trains every candidate configuration (input size, MobileNetV2 alpha, head
+width) on the standard train/validation split, then loads each trained model
+in a fresh CPU-only process to measure single-image and batched latency, file
+size and peak memory. The configurations that no other candidate beats on both
+latency and accuracy form the Pareto front.
+
+Every candidate is saved with its metadata, so serving one is only a matter of
+pointing MODEL_PATH at it; WoundClassifier reads the input size from the
+metadata.
+
+Usage:
+    python pareto_report.py                                  # Default grid
+    python pareto_report.py --img-sizes 128,160,224 --alphas 0.35,0.5,1.0 --head-units 64,128
+    python pareto_report.py --epochs 20 --jobs 2 --threads-per-job 2
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from sweep_model import init_worker
+
+
+def candidate_name(config: Dict) -> str:
+    return f"mnv2_a{config['alpha']}_{config['img_size']}px_h{config['head_units']}"
+
+
+def train_candidate(config: Dict, data_dir: str, shard_dir: str, epochs: int,
+                    batch_size: int, output_dir: str) -> Dict:
+    """
+    Train one candidate and evaluate it on the validation split (runs in a worker).
+
+    Returns:
+        Candidate result with accuracy metrics and the saved model path
+    """
+    from ml_model import WoundClassifier, split_dataset
+    from dataset_shards import ShardedDataset
+    from metrics import evaluate_predictions
+
+    classifier = WoundClassifier(architecture='mobilenetv2', **config)
+
+    train_ds, val_ds = classifier.build_datasets(data_dir, batch_size, shard_dir=shard_dir)
+    start = time.perf_counter()
+    classifier.fit(train_ds, val_ds, epochs, checkpoint_dir=None, verbose=0)
+    train_seconds = time.perf_counter() - start
+
+    shards = ShardedDataset(shard_dir)
+    _, val_idx = split_dataset(shards.labels)
+    predicted = classifier.predict_probabilities(shards.take(val_idx)).argmax(axis=1)
+    metrics = evaluate_predictions(shards.labels[val_idx], predicted, classifier.class_names)
+
+    model_path = os.path.join(output_dir, candidate_name(config) + '.h5')
+    classifier.save_model(model_path, pareto={'config': config, 'accuracy': metrics['accuracy']})
+
+    return {
+        'name': candidate_name(config),
+        'config': config,
+        'model_path': model_path,
+        'accuracy': metrics['accuracy'],
+        'macro_f1': metrics['macro_f1'],
+        'recall': metrics['recall'],
+        'parameters': int(classifier.model.count_params()),
+        'train_seconds': round(train_seconds, 1)
+    }
+
+
+def measure_serving(model_path: str, batch_size: int) -> Dict:
+    """
+    Load a model in a fresh process and measure its serving cost (runs in a worker).
+
+    Returns:
+        Latency, file size and peak resident memory of the process
+    """
+    import resource
+    import sys
+    from ml_model import WoundClassifier
+
+    classifier = WoundClassifier(model_path)
+    single_ms = classifier.measure_latency(batch_size=1, runs=50)
+    batch_ms = classifier.measure_latency(batch_size=batch_size, runs=10)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    return {
+        'latency_ms': round(single_ms, 2),
+        'batch_latency_ms': round(batch_ms, 2),
+        'batch_images_per_sec': round(batch_size * 1000 / batch_ms, 1),
+        'file_size_mb': round(os.path.getsize(model_path) / 1e6, 2),
+        'peak_memory_mb': round(peak_mb, 1)
+    }
+
+
+def pareto_front(results: List[Dict]) -> List[Dict]:
+    """
+    Candidates not dominated on (single-image latency, accuracy).
+
+    Returns:
+        Front members ordered by latency
+    """
+    front = []
+    best_accuracy = -1.0
+    for result in sorted(results, key=lambda r: (r['latency_ms'], -r['accuracy'])):
+        if result['accuracy'] > best_accuracy:
+            front.append(result)
+            best_accuracy = result['accuracy']
+    return front
+
+
+def write_report(results: List[Dict], output_dir: str) -> str:
+    """Write the report as CSV and JSON and return the CSV path."""
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+    csv_path = os.path.join(output_dir, 'report.csv')
+    columns = ['name', 'pareto', 'img_size', 'alpha', 'head_units', 'accuracy', 'macro_f1',
+               'recall_severe', 'latency_ms', 'batch_latency_ms', 'batch_images_per_sec',
+               'parameters', 'file_size_mb', 'peak_memory_mb', 'train_seconds', 'model_path']
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for result in results:
+            row = {key: result.get(key) for key in columns}
+            row.update(result['config'])
+            row['recall_severe'] = result['recall']['severe']
+            writer.writerow(row)
+    return csv_path
+
+
+def _parse_list(value: str, cast) -> list:
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def run_report(args):
+    """Train all candidates, measure them and print the Pareto front."""
+    from dataset_shards import build_shards
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Updating dataset shards in {args.shards}...")
+    build_shards(args.data_dir, args.shards)
+
+    candidates = [
+        {'img_size': size, 'alpha': alpha, 'head_units': units}
+        for size, alpha, units in itertools.product(
+            _parse_list(args.img_sizes, int),
+            _parse_list(args.alphas, float),
+            _parse_list(args.head_units, int)
+        )
+    ]
+
+    cores = os.cpu_count() or 1
+    jobs = args.jobs or max(1, min(len(candidates), cores // args.threads_per_job))
+    context = multiprocessing.get_context('spawn')
+    print(f"Training {len(candidates)} candidates on {jobs} workers...")
+    print("-" * 50)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=init_worker, initargs=(args.threads_per_job,)) as pool:
+        futures = [
+            pool.submit(train_candidate, config, args.data_dir, args.shards,
+                        args.epochs, args.batch_size, args.output_dir)
+            for config in candidates
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"Trained {result['name']}: accuracy {result['accuracy']:.4f}")
+
+    # Serving measurements run one at a time in fresh processes, using all
+    # cores, so candidates do not disturb each other's latency or memory
+    print("-" * 50)
+    print("Measuring serving cost...")
+    for result in results:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context,
+                                 initializer=init_worker, initargs=(cores,)) as pool:
+            result.update(pool.submit(measure_serving, result['model_path'], args.serving_batch_size).result())
+
+    front = pareto_front(results)
+    front_names = {result['name'] for result in front}
+    for result in results:
+        result['pareto'] = result['name'] in front_names
+
+    results.sort(key=lambda r: r['latency_ms'])
+    csv_path = write_report(results, args.output_dir)
+
+    print("-" * 50)
+    print(f"{'candidate':<28}{'acc':>8}{'1 img ms':>10}{f'{args.serving_batch_size} img ms':>11}"
+          f"{'MB':>8}{'peak MB':>9}  pareto")
+    for result in results:
+        print(f"{result['name']:<28}{result['accuracy']:>8.4f}{result['latency_ms']:>10.2f}"
+              f"{result['batch_latency_ms']:>11.2f}{result['file_size_mb']:>8.2f}"
+              f"{result['peak_memory_mb']:>9.0f}  {'*' if result['pareto'] else ''}")
+    print()
+    print(f"Report written to {csv_path}")
+    print("Serve a configuration with: MODEL_PATH=<model_path from the report>")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latency/accuracy Pareto report for classifier configurations')
+    parser.add_argument('--img-sizes', default='96,128,160,224',
+                        help='Comma-separated input sizes (default: 96,128,160,224)')
+    parser.add_argument('--alphas', default='0.35,0.5,1.0',
+                        help='Comma-separated MobileNetV2 alphas (default: 0.35,0.5,1.0)')
+    parser.add_argument('--head-units', default='128',
+                        help='Comma-separated head widths (default: 128)')
+    parser.add_argument('--epochs', type=int, default=30,
+                        help='Maximum training epochs per candidate (default: 30)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Training batch size (default: 32)')
+    parser.add_argument('--serving-batch-size', type=int, default=32,
+                        help='Batch size for the batched latency measurement (default: 32)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Candidates trained in parallel (default: CPU cores / threads per job)')
+    parser.add_argument('--threads-per-job', type=int, default=2,
+                        help='TensorFlow threads per training worker (default: 2)')
+    parser.add_argument('--data-dir', default='./dataset',
+                        help='Dataset directory (default: ./dataset)')
+    parser.add_argument('--shards', default='./dataset_shards',
+                        help='Shard directory (default: ./dataset_shards)')
+    parser.add_argument('--output-dir', default='./models/pareto',
+                        help='Output directory for candidates and the report (default: ./models/pareto)')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Wound Severity Classifier - Pareto Report")
+    print("=" * 50)
+
+    run_report(args)
@@ -0,0 +1,214 @@
+"""
+Injury counts over time from per-user daily rollups.
+
+Every write to an injury record also updates a rollup document for the
+record's owner and creation day (UTC) in the same batch or transaction:
+the record count and the counts per severity and per status. A timeseries
+reads only the rollups in the requested range (one document per day with
+records) instead of the user's records, and weeks are summed from days.
+
+Rollups can be recomputed from the records, e.g. for records written before
+rollups existed or after changing records by hand:
+
+Usage:
+    python rollups.py --user <user_id>    # Rebuild one user's rollups
+    python rollups.py --all               # Rebuild every user's rollups
+"""
+import os
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from firebase_admin import firestore
+from starlette.concurrency import run_in_threadpool
+
+from dashboard import SEVERITIES, STATUSES
+from firebase_service import ROLLUP_COLLECTION, VERSION_COLLECTION, rollup_day, rollup_id
+
+TIMESERIES_PERIODS = ('day', 'week')
+
+# Default range of a timeseries, ending today
+TIMESERIES_DEFAULT_DAYS = {'day': 30, 'week': 84}
+
+# Longest range one timeseries request may cover
+TIMESERIES_MAX_DAYS = int(os.getenv('TIMESERIES_MAX_DAYS', 731))
+
+
+def _empty_bucket(start: date) -> Dict:
+    return {
+        'start': start.isoformat(),
+        'total': 0,
+        'severity': {severity: 0 for severity in SEVERITIES},
+        'status': {status: 0 for status in STATUSES}
+    }
+
+
+def timeseries_range(period: str, start: Optional[str], end: Optional[str], today: date):
+    """
+    Resolve and validate a timeseries range.
+
+    Args:
+        period: 'day' or 'week'
+        start: First ISO date, or None for the default range
+        end: Last ISO date (inclusive), or None for today
+        today: Current UTC date
+
+    Returns:
+        (first date, last date); for weeks the first date is a Monday
+
+    Raises:
+        ValueError: Unknown period, malformed dates, or the range is
+            reversed or longer than TIMESERIES_MAX_DAYS
+    """
+    if period not in TIMESERIES_PERIODS:
+        raise ValueError(f"Unknown period: {period}. Use one of: {', '.join(TIMESERIES_PERIODS)}")
+    last = date.fromisoformat(end) if end else today
+    first = date.fromisoformat(start) if start else last - timedelta(days=TIMESERIES_DEFAULT_DAYS[period] - 1)
+    if period == 'week':
+        first -= timedelta(days=first.weekday())
+    if first > last:
+        raise ValueError("start must not be after end")
+    if (last - first).days + 1 > TIMESERIES_MAX_DAYS:
+        raise ValueError(f"Range is longer than {TIMESERIES_MAX_DAYS} days")
+    return first, last
+
+
+async def build_timeseries(firebase_service, user_id: str, period: str = 'day',
+                           start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """
+    Count a user's injuries per day or week by severity and status.
+
+    Args:
+        firebase_service: FirebaseService
+        user_id: User ID
+        period: 'day' or 'week' (weeks start on Monday)
+        start: First ISO date (default: 30 days or 12 weeks before end)
+        end: Last ISO date, inclusive (default: today, UTC)
+
+    Returns:
+        Dict with period, start, end and buckets (one per period in the
+        range, oldest first, including empty ones), each with its start
+        date, total and counts per severity and status
+
+    Raises:
+        ValueError: Invalid period or range
+    """
+    first, last = timeseries_range(period, start, end, datetime.utcnow().date())
+    rollups = await run_in_threadpool(firebase_service.get_rollups, user_id, first.isoformat(), last.isoformat())
+
+    step = 7 if period == 'week' else 1
+    buckets = []
+    day = first
+    while day <= last:
+        buckets.append(_empty_bucket(day))
+        day += timedelta(days=step)
+
+    for rollup in rollups:
+        bucket = buckets[(date.fromisoformat(rollup['date']) - first).days // step]
+        bucket['total'] += rollup.get('total', 0)
+        for group in ('severity', 'status'):
+            for value, count in (rollup.get(group) or {}).items():
+                bucket[group][value] = bucket[group].get(value, 0) + count
+
+    return {
+        'period': period,
+        'start': first.isoformat(),
+        'end': last.isoformat(),
+        'buckets': buckets
+    }
+
+
+def rebuild_rollups(firebase_service, user_id: Optional[str] = None, batch_size: int = 400) -> Dict:
+    """
+    Recompute rollups from the injury records.
+
+    Rollups of days without records are deleted. Records written while the
+    rebuild runs may be counted twice or not at all, so run it when the
+    affected users are not active (or rebuild those users again afterwards).
+
+    Args:
+        firebase_service: FirebaseService
+        user_id: Only rebuild this user's rollups (all users if None)
+        batch_size: Writes per batch (max 500)
+
+    Returns:
+        Dict with records, users and rollups (written) and deleted (stale rollups)
+    """
+    db = firebase_service.db
+    records = db.collection('injuries')
+    existing = db.collection(ROLLUP_COLLECTION)
+    if user_id:
+        records = records.where('userId', '==', user_id)
+        existing = existing.where('userId', '==', user_id)
+
+    rollups = defaultdict(lambda: {'total': 0, 'severity': defaultdict(int), 'status': defaultdict(int)})
+    scanned = 0
+    for doc in records.select(['userId', 'severity', 'status', 'createdAt']).stream():
+        record = doc.to_dict()
+        if not record.get('createdAt'):
+            continue
+        rollup = rollups[(record['userId'], rollup_day(record))]
+        rollup['total'] += 1
+        rollup['severity'][record['severity']] += 1
+        rollup['status'][record.get('status', 'active')] += 1
+        scanned += 1
+
+    # (document, data, merge); data None deletes the document
+    writes = []
+    keep = {rollup_id(owner, day) for owner, day in rollups}
+    users = {owner for owner, _ in rollups}
+    deleted = 0
+    for doc in existing.select(['userId']).stream():
+        if doc.id not in keep:
+            writes.append((doc.reference, None, False))
+            users.add(doc.get('userId'))
+            deleted += 1
+
+    for (owner, day), rollup in rollups.items():
+        writes.append((db.collection(ROLLUP_COLLECTION).document(rollup_id(owner, day)), {
+            'userId': owner,
+            'date': day,
+            'total': rollup['total'],
+            'severity': dict(rollup['severity']),
+            'status': dict(rollup['status'])
+        }, False))
+
+    # Timeseries responses are cached by ETag; make clients refetch them
+    for owner in users:
+        writes.append((db.collection(VERSION_COLLECTION).document(owner), {'version': firestore.Increment(1)}, True))
+
+    for i in range(0, len(writes), batch_size):
+        batch = db.batch()
+        for document, data, merge in writes[i:i + batch_size]:
+            if data is None:
+                batch.delete(document)
+            else:
+                batch.set(document, data, merge=merge)
+        batch.commit()
+
+    return {'records': scanned, 'users': len(users), 'rollups': len(rollups), 'deleted': deleted}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recompute injury rollups from the records')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--user', default=None,
+                        help="Rebuild this user's rollups")
+    target.add_argument('--all', action='store_true',
+                        help="Rebuild every user's rollups")
+    parser.add_argument('--batch-size', type=int, default=400,
+                        help='Writes per batch (default: 400, max 500)')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Injury Tracker - Rollup Rebuild")
+    print("=" * 50)
+
+    from firebase_service import FirebaseService
+
+    result = rebuild_rollups(FirebaseService(), args.user, args.batch_size)
+    print(f"Records scanned:   {result['records']}")
+    print(f"Users:             {result['users']}")
+    print(f"Rollups written:   {result['rollups']}")
+    print(f"Stale rollups:     {result['deleted']}")
@@ -0,0 +1,260 @@
+"""
+Hyperparameter sweep with k-fold cross-validation for the wound classifier.
+Trials run in parallel worker processes on CPU only, each with its own
+TensorFlow/OpenMP thread limit so workers do not oversubscribe the cores.
+
+Every trial is a combination of learning rate, head width and dropout and is
+cross-validated over the preprocessed dataset shards. Results are written to a
+leaderboard and the best configuration is retrained on the standard
+train/validation split and promoted to models/wound_classifier.h5.
+
+Usage:
+    python sweep_model.py                                    # Default grid, 5 folds
+    python sweep_model.py --learning-rates 0.001,0.0003 --head-units 64,128,256 --dropouts 0.3,0.5
+    python sweep_model.py --folds 3 --epochs 10 --jobs 4 --threads-per-job 2
+    python sweep_model.py --no-promote                       # Only write the leaderboard
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+
+from metrics import evaluate_predictions
+
+def init_worker(threads: int):
+    """
+    Process pool initializer: pin a worker to CPU and limit its threads.
+
+    Must run before TensorFlow is imported in the worker process.
+
+    Args:
+        threads: Intra-op / OpenMP threads for this worker
+    """
+    os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_trial(trial_id: int, config: Dict, shard_dir: str, folds: int,
+              epochs: int, batch_size: int, seed: int) -> Dict:
+    """
+    Cross-validate one configuration (runs inside a worker process).
+
+    Args:
+        trial_id: Trial number
+        config: WoundClassifier keyword arguments
+        shard_dir: Dataset shard directory
+        folds: Number of cross-validation folds
+        epochs: Maximum epochs per fold
+        batch_size: Batch size
+        seed: Fold assignment and shuffling seed
+
+    Returns:
+        Trial result with metrics averaged over folds
+    """
+    from sklearn.model_selection import StratifiedKFold
+    from ml_model import WoundClassifier
+    from dataset_shards import ShardedDataset
+
+    shards = ShardedDataset(shard_dir)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+
+    all_labels, all_predicted = [], []
+    fold_metrics = []
+    train_seconds = 0.0
+    latency_ms = None
+
+    for fold, (train_idx, val_idx) in enumerate(splitter.split(np.zeros(len(shards)), shards.labels)):
+        classifier = WoundClassifier(**config)
+        train_ds = classifier.make_dataset(shards.to_tf_dataset(train_idx), batch_size,
+                                           training=True, seed=seed + fold, cache=False)
+        val_ds = classifier.make_dataset(shards.to_tf_dataset(val_idx), batch_size, cache=False)
+
+        start = time.perf_counter()
+        classifier.fit(train_ds, val_ds, epochs, checkpoint_dir=None, verbose=0)
+        train_seconds += time.perf_counter() - start
+
+        probabilities = classifier.model.predict(val_ds, verbose=0)
+        predicted = np.argmax(probabilities, axis=1)
+        labels = shards.labels[val_idx]
+        fold_metrics.append(evaluate_predictions(labels, predicted, classifier.class_names))
+        all_labels.append(labels)
+        all_predicted.append(predicted)
+
+        if latency_ms is None:
+            latency_ms = classifier.measure_latency(runs=20)
+
+    pooled = evaluate_predictions(np.concatenate(all_labels), np.concatenate(all_predicted),
+                                  shards.class_names)
+    return {
+        'trial': trial_id,
+        'config': config,
+        'accuracy': float(np.mean([m['accuracy'] for m in fold_metrics])),
+        'accuracy_std': float(np.std([m['accuracy'] for m in fold_metrics])),
+        'macro_f1': float(np.mean([m['macro_f1'] for m in fold_metrics])),
+        'recall': {
+            name: float(np.mean([m['recall'][name] for m in fold_metrics]))
+            for name in shards.class_names
+        },
+        'confusion_matrix': pooled['confusion_matrix'],
+        'train_seconds': round(train_seconds, 1),
+        'latency_ms': round(latency_ms, 2)
+    }
+
+
+def promote_best(config: Dict, data_dir: str, shard_dir: str, epochs: int,
+                 batch_size: int, model_path: str) -> float:
+    """
+    Retrain a configuration on the standard split and save it (runs in a worker).
+
+    Returns:
+        Validation accuracy of the promoted model
+    """
+    from ml_model import WoundClassifier
+
+    classifier = WoundClassifier(**config)
+    history = classifier.train(data_dir, epochs=epochs, batch_size=batch_size, shard_dir=shard_dir)
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    classifier.save_model(model_path)
+    return float(max(history.history['val_accuracy']))
+
+
+def write_leaderboard(results: List[Dict], output_dir: str, class_names: List[str]) -> str:
+    """Write the leaderboard as CSV and JSON and return the CSV path."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, 'leaderboard.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+
+    csv_path = os.path.join(output_dir, 'leaderboard.csv')
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'learning_rate', 'head_units', 'dropout', 'accuracy',
+                         'accuracy_std', 'macro_f1']
+                        + [f'recall_{name}' for name in class_names]
+                        + ['train_seconds', 'latency_ms'])
+        for rank, result in enumerate(results, 1):
+            config = result['config']
+            writer.writerow([rank, config['learning_rate'], config['head_units'], config['dropout'],
+                             f"{result['accuracy']:.4f}", f"{result['accuracy_std']:.4f}",
+                             f"{result['macro_f1']:.4f}"]
+                            + [f"{result['recall'][name]:.4f}" for name in class_names]
+                            + [result['train_seconds'], result['latency_ms']])
+    return csv_path
+
+
+def _parse_list(value: str, cast) -> list:
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def run_sweep(args):
+    """Run the sweep described by the parsed command line arguments."""
+    from dataset_shards import build_shards
+
+    print(f"Updating dataset shards in {args.shards}...")
+    build_shards(args.data_dir, args.shards)
+
+    grid = [
+        {'learning_rate': lr, 'head_units': units, 'dropout': dropout}
+        for lr, units, dropout in itertools.product(
+            _parse_list(args.learning_rates, float),
+            _parse_list(args.head_units, int),
+            _parse_list(args.dropouts, float)
+        )
+    ]
+
+    cores = os.cpu_count() or 1
+    # With neither set, 2 threads per trial; with only --jobs, the cores are shared out
+    jobs = args.jobs or max(1, min(len(grid), cores // (args.threads_per_job or 2)))
+    threads = args.threads_per_job or max(1, cores // jobs)
+    print(f"Running {len(grid)} trials x {args.folds} folds on {jobs} workers "
+          f"({threads} threads each, CPU only)")
+    print("-" * 50)
+
+    # spawn: TensorFlow is not fork-safe and each worker needs its own thread settings
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=init_worker, initargs=(threads,)) as pool:
+        futures = {
+            pool.submit(run_trial, trial_id, config, args.shards, args.folds,
+                        args.epochs, args.batch_size, args.seed): config
+            for trial_id, config in enumerate(grid)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"Trial {result['trial']:>3} {result['config']}: "
+                  f"acc={result['accuracy']:.4f} macro-F1={result['macro_f1']:.4f} "
+                  f"recall(severe)={result['recall']['severe']:.4f} "
+                  f"train={result['train_seconds']}s latency={result['latency_ms']}ms")
+
+    results.sort(key=lambda r: (r['macro_f1'], r['accuracy']), reverse=True)
+    csv_path = write_leaderboard(results, args.output_dir, ['mild', 'moderate', 'severe'])
+    best = results[0]
+
+    print("-" * 50)
+    print(f"Leaderboard written to {csv_path}")
+    print(f"Best configuration: {best['config']} (macro-F1 {best['macro_f1']:.4f})")
+
+    if args.no_promote:
+        return
+
+    print(f"\nRetraining best configuration and promoting it to {args.model_path}...")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context,
+                             initializer=init_worker, initargs=(cores,)) as pool:
+        val_accuracy = pool.submit(promote_best, best['config'], args.data_dir, args.shards,
+                                   args.epochs, args.batch_size, args.model_path).result()
+    print(f"Promoted model validation accuracy: {val_accuracy:.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for the wound classifier')
+    parser.add_argument('--learning-rates', default='0.001,0.0003',
+                        help='Comma-separated learning rates (default: 0.001,0.0003)')
+    parser.add_argument('--head-units', default='64,128,256',
+                        help='Comma-separated head widths (default: 64,128,256)')
+    parser.add_argument('--dropouts', default='0.3,0.5',
+                        help='Comma-separated dropout rates (default: 0.3,0.5)')
+    parser.add_argument('--folds', type=int, default=5,
+                        help='Cross-validation folds (default: 5)')
+    parser.add_argument('--epochs', type=int, default=15,
+                        help='Maximum epochs per fold (default: 15)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Batch size (default: 32)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Parallel trials (default: CPU cores / threads per job)')
+    parser.add_argument('--threads-per-job', type=int, default=None,
+                        help='TensorFlow threads per trial (default: CPU cores / jobs, '
+                             'or 2 when --jobs is not set either)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Fold assignment seed (default: 42)')
+    parser.add_argument('--data-dir', default='./dataset',
+                        help='Dataset directory (default: ./dataset)')
+    parser.add_argument('--shards', default='./dataset_shards',
+                        help='Shard directory (default: ./dataset_shards)')
+    parser.add_argument('--output-dir', default='./models/sweep',
+                        help='Leaderboard directory (default: ./models/sweep)')
+    parser.add_argument('--model-path', default='./models/wound_classifier.h5',
+                        help='Where to promote the best model')
+    parser.add_argument('--no-promote', action='store_true',
+                        help='Do not retrain and promote the best configuration')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Wound Severity Classifier - Hyperparameter Sweep")
+    print("=" * 50)
+
+    run_sweep(args)
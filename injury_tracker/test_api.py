@@ -8,6 +8,9 @@ import os
 API_URL = "http://localhost:8000"
 TEST_IMAGE_PATH = "./test_wound.jpg"  # Replace with actual test image
 USER_ID = "test_user_123"
+# Firebase ID token of a test user; without one the API must run with
+# ALLOW_UNVERIFIED_TOKENS=1, which accepts the plain user ID
+ID_TOKEN = os.getenv("TEST_ID_TOKEN")
 
 
 def test_health_check():
@@ -30,7 +33,7 @@ def test_analyze_wound():
     
     with open(TEST_IMAGE_PATH, 'rb') as f:
         files = {'file': f}
-        headers = {'Authorization': f'Bearer {USER_ID}'}
+        headers = {'Authorization': f'Bearer {ID_TOKEN or USER_ID}'}
         
         response = requests.post(
             f"{API_URL}/api/v1/analyze-wound",
@@ -59,7 +62,7 @@ def test_get_injuries():
     """Test getting user injuries."""
     print("Testing get injuries...")
     
-    headers = {'Authorization': f'Bearer {USER_ID}'}
+    headers = {'Authorization': f'Bearer {ID_TOKEN or USER_ID}'}
     response = requests.get(
         f"{API_URL}/api/v1/injuries",
         headers=headers
@@ -82,7 +85,7 @@ def test_statistics():
     """Test statistics endpoint."""
     print("Testing statistics...")
     
-    headers = {'Authorization': f'Bearer {USER_ID}'}
+    headers = {'Authorization': f'Bearer {ID_TOKEN or USER_ID}'}
     response = requests.get(
         f"{API_URL}/api/v1/statistics",
         headers=headers
@@ -0,0 +1,10 @@
+"""
+Unit tests for modules that run without Firebase, Azure or a trained model.
+
+Run from injury_tracker/ with: python -m pytest -q tests
+"""
+import os
+import sys
+
+# The modules live flat in injury_tracker/ and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,135 @@
+"""
+Tests for admission control: bounded stages, rate limits and load shedding.
+"""
+import asyncio
+
+import pytest
+
+from admission import LoadSheddingMiddleware, OverloadedError, RateLimiter, Stage
+
+
+async def hold(stage: Stage, release: asyncio.Event, order=None, name=None):
+    """Hold a slot of the stage until release is set."""
+    async with stage.slot():
+        if order is not None:
+            order.append(name)
+        await release.wait()
+
+
+def test_full_queue_sheds_immediately():
+    """With every slot busy and the queue full, a new call fails at once."""
+    async def scenario():
+        stage = Stage('inference', concurrency=1, max_queue=1, max_wait=5, service_time=0.5)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(stage, release))
+        queued = asyncio.ensure_future(hold(stage, release))
+        await asyncio.sleep(0)
+        full = stage.full()
+
+        with pytest.raises(OverloadedError) as error:
+            async with stage.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(running, queued)
+        return full, error.value.retry_after, stage.in_flight, stage.queued
+
+    full, retry_after, in_flight, queued = asyncio.run(scenario())
+    assert full
+    # One running and one waiting call of 0.5 s each on one slot
+    assert retry_after == pytest.approx(1.0)
+    assert (in_flight, queued) == (0, 0)
+
+
+def test_queued_call_times_out():
+    """A call that waits longer than max_wait fails and leaves the queue."""
+    async def scenario():
+        stage = Stage('inference', concurrency=1, max_queue=4, max_wait=0.05)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(stage, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError):
+            async with stage.slot():
+                pass
+        queued = stage.queued
+
+        release.set()
+        await running
+        return queued, stage.in_flight
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_slots_handed_over_in_arrival_order():
+    """Waiting calls get the slot first come, first served."""
+    async def scenario():
+        stage = Stage('llm', concurrency=1, max_queue=3, max_wait=5)
+        release = asyncio.Event()
+        order = []
+        calls = [asyncio.ensure_future(hold(stage, release, order, name)) for name in 'abcd']
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*calls)
+        return order
+
+    assert asyncio.run(scenario()) == ['a', 'b', 'c', 'd']
+
+
+def test_rate_limiter_burst_then_refill():
+    """A key may burst, is then limited to the rate, and keys are independent."""
+    now = [0.0]
+    limiter = RateLimiter(rate=0.5, burst=2, clock=lambda: now[0])
+
+    assert limiter.acquire('user-1') is None
+    assert limiter.acquire('user-1') is None
+    assert limiter.acquire('user-1') == pytest.approx(2.0)
+    assert limiter.acquire('user-2') is None
+
+    now[0] = 2.0
+    assert limiter.acquire('user-1') is None
+    assert limiter.acquire('user-1') is not None
+
+
+def test_middleware_sheds_while_stage_full():
+    """Requests to guarded paths get 503 with Retry-After while a stage is full."""
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+    async def request(middleware, method, path):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'headers': [], 'query_string': b''}
+        await middleware(scope, receive, send)
+        start = messages[0]
+        return start['status'], dict(start['headers'])
+
+    async def scenario():
+        stage = Stage('inference', concurrency=1, max_queue=0, max_wait=1, service_time=2.5)
+        middleware = LoadSheddingMiddleware(app, [stage], ['/analyze'])
+        idle = await request(middleware, 'POST', '/analyze')
+
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(stage, release))
+        await asyncio.sleep(0)
+        shed = await request(middleware, 'POST', '/analyze')
+        other_path = await request(middleware, 'POST', '/injuries/user-1')
+        read = await request(middleware, 'GET', '/analyze')
+
+        release.set()
+        await running
+        return idle, shed, other_path, read
+
+    idle, shed, other_path, read = asyncio.run(scenario())
+    assert idle[0] == 200
+    assert shed[0] == 503
+    assert shed[1][b'retry-after'] == b'3'
+    assert other_path[0] == 200
+    assert read[0] == 200
@@ -0,0 +1,138 @@
+"""
+Tests for the single-flight idempotency store.
+"""
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyConflictError, IdempotencyStore
+
+
+def test_concurrent_same_key_runs_once():
+    """Concurrent requests with one key share a single run and its result."""
+    async def scenario():
+        store = IdempotencyStore()
+        calls = []
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return {'id': 'injury-1'}
+
+        runs = [asyncio.ensure_future(store.run('key', 'payload', compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        return calls, await asyncio.gather(*runs)
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [{'id': 'injury-1'}] * 5
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+
+def test_completed_result_replayed():
+    """A retry after the first request finished gets the stored result."""
+    async def scenario():
+        store = IdempotencyStore()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return len(calls)
+
+        return calls, await store.run('key', 'payload', compute), await store.run('key', 'payload', compute)
+
+    calls, first, second = asyncio.run(scenario())
+    assert calls == [1]
+    assert first == (1, False)
+    assert second == (1, True)
+
+
+def test_key_reused_for_other_payload_rejected():
+    """A key sent again with a different payload is a conflict."""
+    async def scenario():
+        store = IdempotencyStore()
+
+        async def compute():
+            return 'result'
+
+        await store.run('key', 'payload', compute)
+        await store.run('key', 'other payload', compute)
+
+    with pytest.raises(IdempotencyConflictError):
+        asyncio.run(scenario())
+
+
+def test_failure_shared_with_waiters_and_not_remembered():
+    """Concurrent waiters get the run's error, and a later retry runs again."""
+    async def scenario():
+        store = IdempotencyStore()
+        calls = []
+        release = asyncio.Event()
+
+        async def failing():
+            calls.append(1)
+            await release.wait()
+            raise RuntimeError("model failed")
+
+        async def succeeding():
+            calls.append(1)
+            return 'result'
+
+        runs = [asyncio.ensure_future(store.run('key', 'payload', failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*runs, return_exceptions=True)
+        retry = await store.run('key', 'payload', succeeding)
+        return calls, outcomes, retry, len(store)
+
+    calls, outcomes, retry, size = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert retry == ('result', False)
+    assert size == 1
+
+
+def test_cancelled_waiter_does_not_cancel_run():
+    """A duplicate that disconnects leaves the original run going."""
+    async def scenario():
+        store = IdempotencyStore()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return 'result'
+
+        original = asyncio.ensure_future(store.run('key', 'payload', compute))
+        waiter = asyncio.ensure_future(store.run('key', 'payload', compute))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return waiter.cancelled(), await original
+
+    waiter_cancelled, result = asyncio.run(scenario())
+    assert waiter_cancelled
+    assert result == ('result', False)
+
+
+def test_expired_and_excess_results_evicted():
+    """Results are dropped after the TTL and beyond max_keys, oldest first."""
+    async def scenario():
+        async def compute():
+            return 'result'
+
+        expiring = IdempotencyStore(ttl_seconds=0)
+        await expiring.run('a', 'payload', compute)
+        replayed_after_ttl = (await expiring.run('a', 'payload', compute))[1]
+
+        bounded = IdempotencyStore(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            await bounded.run(key, 'payload', compute)
+        return replayed_after_ttl, len(bounded), (await bounded.run('a', 'payload', compute))[1]
+
+    replayed_after_ttl, size, replayed_oldest = asyncio.run(scenario())
+    assert not replayed_after_ttl
+    assert size == 2
+    assert not replayed_oldest
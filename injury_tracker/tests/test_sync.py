@@ -0,0 +1,141 @@
+"""
+Tests for delta sync: sync tokens, page tokens and tombstones across pages.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from dashboard import PAGE_TOKEN_PREFIX, build_changes, parse_page_token, parse_sync_token
+from firebase_service import TOMBSTONE_RETENTION_DAYS
+
+
+class FakeFirebase:
+    """In-memory stand-in for the FirebaseService queries build_changes uses."""
+
+    def __init__(self, records, tombstones=()):
+        self.records = list(records)
+        self.tombstones = list(tombstones)
+
+    def get_injury_changes(self, user_id, after=None, limit=100, fields=None, after_id=None):
+        # Same order and cursor semantics as the Firestore query
+        records = sorted(self.records, key=lambda record: (record['updatedAt'], record['id']))
+        if after and after_id:
+            records = [record for record in records if (record['updatedAt'], record['id']) > (after, after_id)]
+        elif after:
+            records = [record for record in records if record['updatedAt'] > after]
+        return [dict(record) for record in records[:limit]]
+
+    def get_tombstones(self, user_id, after=None):
+        tombstones = sorted(self.tombstones, key=lambda tombstone: tombstone['deletedAt'])
+        return [dict(tombstone) for tombstone in tombstones if not after or tombstone['deletedAt'] > after]
+
+
+def iso(base: datetime, seconds: int) -> str:
+    return (base + timedelta(seconds=seconds)).isoformat()
+
+
+def record(record_id: str, updated_at: str):
+    return {'id': record_id, 'severity': 'mild', 'status': 'active', 'createdAt': updated_at, 'updatedAt': updated_at}
+
+
+def sync_all(firebase, since, limit):
+    """Page through build_changes until has_more is False; returns the responses."""
+    pages = []
+    while True:
+        page = asyncio.run(build_changes(firebase, 'user-1', since, limit))
+        pages.append(page)
+        since = page['sync_token']
+        if not page['has_more']:
+            return pages
+
+
+def test_tombstones_paged_across_page_boundary():
+    """Every change and deletion is delivered exactly once, on the page it belongs to."""
+    base = datetime.utcnow() - timedelta(hours=1)
+    records = [record(f"r{i}", iso(base, 10 * i)) for i in range(1, 6)]
+    # Deletions before, between and after the records of each page
+    tombstones = [
+        {'injuryId': 'd1', 'deletedAt': iso(base, 5)},
+        {'injuryId': 'd2', 'deletedAt': iso(base, 25)},
+        {'injuryId': 'd3', 'deletedAt': iso(base, 40)},
+        {'injuryId': 'd4', 'deletedAt': iso(base, 45)},
+        {'injuryId': 'd5', 'deletedAt': iso(base, 60)}
+    ]
+    firebase = FakeFirebase(records, tombstones)
+
+    pages = sync_all(firebase, base.isoformat(), limit=2)
+
+    assert [page['has_more'] for page in pages] == [True, True, False]
+    assert [[injury['id'] for injury in page['injuries']] for page in pages] == [['r1', 'r2'], ['r3', 'r4'], ['r5']]
+    # A page only carries deletions up to its last record's updatedAt
+    assert [page['deleted'] for page in pages] == [['d1'], ['d2', 'd3'], ['d4', 'd5']]
+    assert all(not page['full'] for page in pages)
+    assert pages[0]['sync_token'].startswith(PAGE_TOKEN_PREFIX)
+    assert not pages[-1]['sync_token'].startswith(PAGE_TOKEN_PREFIX)
+
+
+def test_records_sharing_updated_at_not_skipped_at_page_boundary():
+    """Records with the same updatedAt on both sides of a page break are all returned."""
+    base = datetime.utcnow() - timedelta(hours=1)
+    same = iso(base, 10)
+    firebase = FakeFirebase([record('a', same), record('b', same), record('c', same), record('d', iso(base, 20))])
+
+    pages = sync_all(firebase, base.isoformat(), limit=2)
+
+    assert [injury['id'] for page in pages for injury in page['injuries']] == ['a', 'b', 'c', 'd']
+
+
+def test_change_while_paging_delivered():
+    """A record written while the client pages through a sync arrives on a later page."""
+    base = datetime.utcnow() - timedelta(hours=1)
+    firebase = FakeFirebase([record(f"r{i}", iso(base, i)) for i in range(1, 4)])
+
+    first = asyncio.run(build_changes(firebase, 'user-1', base.isoformat(), 2))
+    _, after, after_id = parse_page_token(first['sync_token'], datetime.utcnow())
+    assert (after, after_id) == (iso(base, 2), 'r2')
+
+    firebase.records.append(record('late', datetime.utcnow().isoformat()))
+    firebase.tombstones.append({'injuryId': 'r1', 'deletedAt': datetime.utcnow().isoformat()})
+    last = asyncio.run(build_changes(firebase, 'user-1', first['sync_token'], 2))
+
+    assert [injury['id'] for injury in last['injuries']] == ['r3', 'late']
+    assert last['deleted'] == ['r1']
+    assert not last['has_more']
+
+
+def test_full_sync_without_token():
+    """Without a token all records are returned as a full sync, without deletions."""
+    base = datetime.utcnow() - timedelta(hours=1)
+    firebase = FakeFirebase([record('r1', iso(base, 1))], [{'injuryId': 'd1', 'deletedAt': iso(base, 2)}])
+
+    page = asyncio.run(build_changes(firebase, 'user-1', None, 10))
+
+    assert page['full']
+    assert [injury['id'] for injury in page['injuries']] == ['r1']
+    assert page['deleted'] == []
+
+
+def test_expired_tokens_force_full_sync():
+    """Sync and page tokens older than the tombstone retention start a full sync."""
+    old = datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS + 1)
+    firebase = FakeFirebase([record('r1', old.isoformat())])
+    page_token = PAGE_TOKEN_PREFIX + '|'.join((old.isoformat(), old.isoformat(), 'r0'))
+
+    for token in (old.isoformat(), page_token):
+        page = asyncio.run(build_changes(firebase, 'user-1', token, 10))
+        assert page['full']
+        assert [injury['id'] for injury in page['injuries']] == ['r1']
+
+
+@pytest.mark.parametrize('token', [
+    'not-a-date',
+    '2024-01-01T00:00:00+00:00',
+    PAGE_TOKEN_PREFIX + '2024-01-01T00:00:00|2024-01-01T00:00:00',
+    PAGE_TOKEN_PREFIX + '2024-01-01T00:00:00|not-a-date|r1',
+    PAGE_TOKEN_PREFIX + '2024-01-01T00:00:00||r1'
+])
+def test_malformed_tokens_rejected(token):
+    """Malformed or timezone-aware tokens raise ValueError."""
+    with pytest.raises(ValueError):
+        asyncio.run(build_changes(FakeFirebase([]), 'user-1', token, 10))
@@ -0,0 +1,135 @@
+"""
+Tests for Firebase ID token verification, with a locally generated signing key.
+"""
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from token_auth import InvalidTokenError, KeyFetchError, KeySet, TokenVerifier
+
+PROJECT_ID = 'test-project'
+KEY_ID = 'key-1'
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def make_token(kid: str = KEY_ID, private_key=_private_key, **overrides) -> str:
+    """Sign an ID token for PROJECT_ID; overrides replace claims (None removes one)."""
+    now = int(time.time())
+    claims = {
+        'aud': PROJECT_ID,
+        'iss': f"https://securetoken.google.com/{PROJECT_ID}",
+        'sub': 'user-1',
+        'iat': now,
+        'auth_time': now,
+        'exp': now + 3600
+    }
+    claims.update(overrides)
+    claims = {name: value for name, value in claims.items() if value is not None}
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+def make_verifier(**kwargs) -> TokenVerifier:
+    key_set = KeySet(fetch=lambda: ({KEY_ID: _private_key.public_key()}, 3600))
+    return TokenVerifier(PROJECT_ID, key_set, **kwargs)
+
+
+def test_valid_token_returns_subject():
+    """A valid token yields its subject as the user ID."""
+    assert make_verifier().verify(make_token()) == 'user-1'
+
+
+def test_expired_token_rejected():
+    """A token expired for longer than the clock skew is rejected."""
+    token = make_token(iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)
+    with pytest.raises(InvalidTokenError):
+        make_verifier().verify(token)
+
+
+def test_expiry_within_clock_skew_accepted():
+    """A token that expired less than the clock skew ago is still accepted."""
+    token = make_token(exp=int(time.time()) - 10)
+    assert make_verifier(clock_skew=60).verify(token) == 'user-1'
+
+
+def test_wrong_audience_rejected():
+    """A token issued for another Firebase project is rejected."""
+    with pytest.raises(InvalidTokenError):
+        make_verifier().verify(make_token(aud='other-project'))
+
+
+def test_wrong_issuer_rejected():
+    """A token from another issuer is rejected even with the right audience."""
+    with pytest.raises(InvalidTokenError):
+        make_verifier().verify(make_token(iss='https://securetoken.google.com/other-project'))
+
+
+def test_missing_subject_rejected():
+    """A token without a subject is rejected."""
+    with pytest.raises(InvalidTokenError):
+        make_verifier().verify(make_token(sub=None))
+
+
+def test_unknown_key_rejected():
+    """A token signed with a key that is not in the key set is rejected."""
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(InvalidTokenError):
+        make_verifier().verify(make_token(kid='key-2', private_key=other_key))
+
+
+def test_bad_signature_rejected():
+    """A token claiming a known key ID but signed with another key is rejected."""
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(InvalidTokenError):
+        make_verifier().verify(make_token(private_key=other_key))
+
+
+def test_verified_token_cached_until_expiry():
+    """A verified token is served from the cache, and dropped once it expires."""
+    verifier = make_verifier()
+    token = make_token()
+    verifier.verify(token)
+    assert verifier.cached(token) == 'user-1'
+
+    # Pretend the token has since expired
+    verifier._verified[token] = ('user-1', time.time() - 1)
+    assert verifier.cached(token) is None
+    assert token not in verifier._verified
+
+
+def test_rejected_token_not_cached():
+    """A rejected token is checked again on the next request."""
+    verifier = make_verifier()
+    token = make_token(aud='other-project')
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(token)
+    assert verifier.cached(token) is None
+
+
+def test_key_fetch_failure_without_cached_keys():
+    """Verification fails with KeyFetchError when no keys were ever fetched."""
+    def fetch():
+        raise OSError("network down")
+
+    verifier = TokenVerifier(PROJECT_ID, KeySet(fetch=fetch))
+    with pytest.raises(KeyFetchError):
+        verifier.verify(make_token())
+
+
+def test_stale_keys_kept_when_refetch_fails():
+    """Expired keys stay in use when refetching them fails."""
+    now = [0.0]
+    responses = [({KEY_ID: _private_key.public_key()}, 60)]
+
+    def fetch():
+        if not responses:
+            raise OSError("network down")
+        return responses.pop()
+
+    verifier = TokenVerifier(PROJECT_ID, KeySet(fetch=fetch, clock=lambda: now[0]))
+    assert verifier.verify(make_token()) == 'user-1'
+
+    now[0] = 3600.0
+    assert verifier.verify(make_token(sub='user-2')) == 'user-2'
@@ -0,0 +1,260 @@
+"""
+Firebase ID token verification for API requests.
+
+Clients send the ID token of their Firebase Auth session as a bearer token.
+Verifying one means checking its RS256 signature against Google's current
+signing keys and its claims (audience, issuer, expiry). Both costs are kept
+off the steady-state request path:
+
+- The signing keys are fetched once and cached for as long as Google's
+  Cache-Control allows. Shortly before they expire they are refetched in a
+  background thread, so requests keep using the cached keys meanwhile.
+- Verified tokens are kept in a bounded LRU until they expire. Clients reuse
+  a token for up to an hour, so a request with a known token costs one dict
+  lookup; only the first request with a new token checks the signature.
+
+Revocation is not checked (as with firebase_admin.auth.verify_id_token
+without check_revoked): a revoked token stays usable until it expires.
+"""
+import os
+import re
+import json
+import time
+import threading
+import urllib.request
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import jwt
+
+FIREBASE_JWKS_URL = os.getenv(
+    'FIREBASE_JWKS_URL',
+    'https://www.googleapis.com/service_accounts/v1/jwk/securetoken@system.gserviceaccount.com'
+)
+
+# Verified tokens remembered until they expire
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+# Tolerated clock difference to the token issuer
+TOKEN_CLOCK_SKEW_SECONDS = int(os.getenv('TOKEN_CLOCK_SKEW_SECONDS', 60))
+
+# Keys are refetched in the background this long before they expire
+KEY_REFRESH_MARGIN_SECONDS = 300
+
+# A token signed with an unknown key triggers a refetch at most this often
+KEY_MIN_REFETCH_SECONDS = 60
+
+# Used when the key response has no Cache-Control max-age
+KEY_DEFAULT_MAX_AGE_SECONDS = 3600
+
+
+class InvalidTokenError(Exception):
+    """The token is malformed, expired, or not a valid ID token for this project."""
+
+
+class KeyFetchError(Exception):
+    """The signing keys could not be fetched and none are cached."""
+
+
+def fetch_jwks(url: str = FIREBASE_JWKS_URL, timeout: float = 10) -> Tuple[Dict[str, Any], float]:
+    """
+    Fetch the public keys ID tokens are signed with.
+
+    Args:
+        url: JWK set URL
+        timeout: Request timeout in seconds
+
+    Returns:
+        (dict of key ID -> public key, seconds the keys may be cached)
+    """
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        jwks = json.load(response)
+        cache_control = response.headers.get('Cache-Control', '')
+
+    match = re.search(r'max-age=(\d+)', cache_control)
+    max_age = int(match.group(1)) if match else KEY_DEFAULT_MAX_AGE_SECONDS
+    return {jwk['kid']: jwt.PyJWK(jwk).key for jwk in jwks['keys']}, max_age
+
+
+class KeySet:
+    """
+    Signing keys, cached and refreshed before they expire.
+
+    Args:
+        fetch: Returns (dict of key ID -> public key, max age in seconds);
+            fetch_jwks, or locally generated keys for offline use
+        clock: Monotonic clock in seconds
+    """
+
+    def __init__(self, fetch: Callable[[], Tuple[Dict[str, Any], float]] = fetch_jwks,
+                 clock: Callable[[], float] = time.monotonic):
+        self._fetch = fetch
+        self._clock = clock
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self):
+        """
+        Fetch the keys now.
+
+        Raises:
+            KeyFetchError: The fetch failed and no keys are cached
+        """
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        now = self._clock()
+        try:
+            keys, max_age = self._fetch()
+        except Exception as e:
+            # Google keeps signing keys valid well past their cache lifetime,
+            # so stale keys beat failing every request
+            self._fetched_at = now
+            if not self._keys:
+                raise KeyFetchError(f"Could not fetch token signing keys: {e}")
+            return
+        self._keys = keys
+        self._expires_at = now + max_age
+        self._fetched_at = now
+
+    def _refetch_allowed(self, now: float) -> bool:
+        return self._fetched_at is None or now - self._fetched_at >= KEY_MIN_REFETCH_SECONDS
+
+    def _refresh_in_background(self):
+        if self._refreshing:
+            return
+        self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except KeyFetchError:
+                pass  # Requests retry once the keys expire
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, kid: Optional[str]):
+        """
+        Look up a signing key.
+
+        Args:
+            kid: Key ID from the token header
+
+        Returns:
+            Public key
+
+        Raises:
+            InvalidTokenError: No key with this ID
+            KeyFetchError: The keys could not be fetched
+        """
+        now = self._clock()
+        if now >= self._expires_at or kid not in self._keys:
+            # Expired keys, or a key that may have been rotated in since the
+            # last fetch: refetch now (at most once per KEY_MIN_REFETCH_SECONDS)
+            with self._lock:
+                now = self._clock()
+                if self._refetch_allowed(now) and (now >= self._expires_at or kid not in self._keys):
+                    self._refresh_locked()
+        elif now >= self._expires_at - KEY_REFRESH_MARGIN_SECONDS and self._refetch_allowed(now):
+            self._refresh_in_background()
+
+        if not self._keys:
+            raise KeyFetchError("Token signing keys are unavailable")
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Token signed with unknown key: {kid}")
+        return key
+
+
+class TokenVerifier:
+    """
+    Verify Firebase ID tokens, remembering verified ones until they expire.
+
+    Args:
+        project_id: Firebase project ID (the tokens' audience)
+        key_set: Signing keys
+        cache_size: Verified tokens remembered
+        clock_skew: Tolerated clock difference in seconds
+    """
+
+    def __init__(self, project_id: str, key_set: KeySet, cache_size: int = TOKEN_CACHE_SIZE,
+                 clock_skew: int = TOKEN_CLOCK_SKEW_SECONDS):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.key_set = key_set
+        self.cache_size = cache_size
+        self.clock_skew = clock_skew
+        self._verified = OrderedDict()  # token -> (user ID, expiry)
+        self._lock = threading.Lock()
+
+    def cached(self, token: str) -> Optional[str]:
+        """
+        User ID of an already verified, unexpired token.
+
+        Args:
+            token: Bearer token
+
+        Returns:
+            User ID, or None if the token has to be verified
+        """
+        entry = self._verified.get(token)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            with self._lock:
+                self._verified.pop(token, None)
+            return None
+        with self._lock:
+            if token in self._verified:
+                self._verified.move_to_end(token)
+        return entry[0]
+
+    def verify(self, token: str) -> str:
+        """
+        Verify a token.
+
+        Args:
+            token: Bearer token
+
+        Returns:
+            The user ID (the token's subject)
+
+        Raises:
+            InvalidTokenError: The token is not valid
+            KeyFetchError: The signing keys could not be fetched
+        """
+        user_id = self.cached(token)
+        if user_id is not None:
+            return user_id
+
+        try:
+            header = jwt.get_unverified_header(token)
+            claims = jwt.decode(
+                token,
+                self.key_set.get(header.get('kid')),
+                algorithms=['RS256'],
+                audience=self.project_id,
+                issuer=self.issuer,
+                leeway=self.clock_skew,
+                options={'require': ['exp', 'iat', 'sub']}
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e))
+
+        user_id = claims['sub']
+        if not isinstance(user_id, str) or not user_id or len(user_id) > 128:
+            raise InvalidTokenError("Token has an invalid subject")
+        if claims.get('auth_time', 0) > time.time() + self.clock_skew:
+            raise InvalidTokenError("Token has an authentication time in the future")
+
+        with self._lock:
+            self._verified[token] = (user_id, claims['exp'])
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return user_id
@@ -6,19 +6,22 @@ Usage:
     python train_model.py                    # Use default 30 epochs
     python train_model.py --epochs 50        # Train for 50 epochs
     python train_model.py --epochs 25 --batch-size 16
+    python train_model.py --shards ./dataset_shards   # Train from preprocessed shards
 """
 import os
 import argparse
 from ml_model import WoundClassifier
 
 
-def train_model(epochs: int = 30, batch_size: int = 32):
+def train_model(epochs: int = 30, batch_size: int = 32, shard_dir: str = None):
     """
     Train the wound classifier model.
     
     Args:
         epochs: Number of training epochs
         batch_size: Batch size for training
+        shard_dir: Optional shard directory; shards are brought up to date
+            with the dataset before training
     """
     
     # Path to training data
@@ -51,6 +54,14 @@ def train_model(epochs: int = 30, batch_size: int = 32):
                           if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
         print(f"Found {image_count} images in {dir_name} directory")
     
+    if shard_dir:
+        from dataset_shards import build_shards
+        
+        print(f"\nUpdating dataset shards in {shard_dir}...")
+        counts = build_shards(train_dir, shard_dir)
+        print(f"Shards: {counts['added']} added/updated, {counts['unchanged']} unchanged, "
+              f"{counts['removed']} removed")
+    
     print("\nInitializing model...")
     classifier = WoundClassifier()
     
@@ -63,7 +74,8 @@ def train_model(epochs: int = 30, batch_size: int = 32):
         history = classifier.train(
             train_dir=train_dir,
             epochs=epochs,
-            batch_size=batch_size
+            batch_size=batch_size,
+            shard_dir=shard_dir
         )
         
         print("\nTraining completed!")
@@ -96,6 +108,8 @@ if __name__ == "__main__":
                        help='Number of training epochs (default: 30)')
     parser.add_argument('--batch-size', type=int, default=32,
                        help='Batch size for training (default: 32)')
+    parser.add_argument('--shards', default=None,
+                       help='Train from preprocessed shards in this directory')
     args = parser.parse_args()
     
     print("=" * 50)
@@ -105,6 +119,8 @@ if __name__ == "__main__":
     print(f"  - Epochs: {args.epochs}")
     print(f"  - Batch size: {args.batch_size}")
     print(f"  - Early stopping patience: 10 epochs")
+    if args.shards:
+        print(f"  - Shards: {args.shards}")
     print()
     
-    train_model(epochs=args.epochs, batch_size=args.batch_size)
+    train_model(epochs=args.epochs, batch_size=args.batch_size, shard_dir=args.shards)
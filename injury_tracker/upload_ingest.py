@@ -0,0 +1,240 @@
+"""
+Single-pass ingest of uploaded wound images.
+
+The multipart parser spools every uploaded file into a SpooledTemporaryFile
+(kept in memory up to UPLOAD_SPOOL_BYTES, moved to disk above that). Ingest
+hashes that spooled file in place and enforces MAX_UPLOAD_BYTES. The decoder
+then gets the same file object, rewound, so the upload is never copied into
+an intermediate bytes object.
+
+Clients that already know the model input size (GET /api/v1/model-info) can
+upload a pre-resized JPEG/WebP, which skips the server-side resize, or raw
+uint8 RGB pixels, which skip decoding as well.
+
+UploadSizeLimitMiddleware rejects oversized request bodies while they are
+still streaming in, before the multipart parser has buffered them.
+"""
+import os
+import hashlib
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from ml_model import (
+    ALLOWED_IMAGE_FORMATS,
+    ImageTooLargeError,
+    UnsupportedImageError,
+    decode_image,
+    decode_raw_image,
+    probe_image
+)
+
+# Uploads with this content type are raw height x width x 3 uint8 RGB pixels
+RAW_IMAGE_CONTENT_TYPE = 'application/octet-stream'
+
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 15 * 1024 * 1024))
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+INGEST_CHUNK_BYTES = 256 * 1024
+
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class IngestedUpload:
+    """An uploaded file that has been size-checked and hashed."""
+
+    def __init__(self, stream, sha256: str, size: int, content_type: Optional[str], filename: Optional[str]):
+        """
+        Args:
+            stream: Spooled file object positioned at the start of the upload
+            sha256: SHA-256 of the upload (hex)
+            size: Upload size in bytes
+            content_type: Content type sent by the client
+            filename: Original filename sent by the client
+        """
+        self.stream = stream
+        self.sha256 = sha256
+        self.size = size
+        self.content_type = content_type
+        self.filename = filename
+
+
+def _in_memory_buffer(stream) -> Optional[memoryview]:
+    """memoryview over a SpooledTemporaryFile's in-memory buffer, if it has not rolled to disk."""
+    if getattr(stream, '_rolled', True):
+        return None
+    getbuffer = getattr(getattr(stream, '_file', None), 'getbuffer', None)
+    return getbuffer() if getbuffer else None
+
+
+async def ingest_upload(
+    upload: UploadFile,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = INGEST_CHUNK_BYTES
+) -> IngestedUpload:
+    """
+    Hash and size-check an uploaded file without copying it.
+
+    Args:
+        upload: FastAPI upload
+        max_bytes: Maximum accepted file size
+        chunk_size: Read size for uploads spooled to disk
+
+    Returns:
+        IngestedUpload whose stream is rewound for decoding
+
+    Raises:
+        HTTPException: 413 if the file is larger than max_bytes
+    """
+    digest = hashlib.sha256()
+    memory = _in_memory_buffer(upload.file)
+
+    if memory is not None:
+        size = memory.nbytes
+        if size > max_bytes:
+            memory.release()
+            raise _too_large(max_bytes)
+        digest.update(memory)
+        memory.release()
+    else:
+        size = 0
+        await upload.seek(0)
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+
+    await upload.seek(0)
+    return IngestedUpload(upload.file, digest.hexdigest(), size, upload.content_type, upload.filename)
+
+
+async def read_model_input(upload: UploadFile, size: Tuple[int, int]) -> Tuple[np.ndarray, IngestedUpload]:
+    """
+    Ingest an upload and turn it into a model input array.
+    
+    Encoded images are header-probed before decoding and are not resized if
+    they already have the model input size. Raw uploads (RAW_IMAGE_CONTENT_TYPE)
+    are used as-is. Either way the hash is the SHA-256 of the uploaded bytes.
+    
+    Args:
+        upload: FastAPI upload
+        size: Model input (height, width)
+        
+    Returns:
+        Tuple of (uint8 RGB array of the given size, ingested upload)
+        
+    Raises:
+        HTTPException: 400 for non-image or empty uploads, 413 for oversized
+            uploads, 415 for unsupported or corrupt images, 422 for images
+            with too many pixels
+    """
+    content_type = upload.content_type or ''
+    raw = content_type == RAW_IMAGE_CONTENT_TYPE
+    if not raw and not content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    ingested = await ingest_upload(upload)
+    if ingested.size == 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+    
+    try:
+        if raw:
+            image = decode_raw_image(ingested.stream.read(), size)
+        else:
+            # Check format and dimensions from the header before any full decode
+            probe_image(ingested.stream)
+            image = decode_image(ingested.stream, size)
+    except UnsupportedImageError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    return image, ingested
+
+
+def accepted_content_types() -> list:
+    """Upload content types the analyze endpoint accepts."""
+    return ['image/' + image_format.lower() for image_format in ALLOWED_IMAGE_FORMATS] + [RAW_IMAGE_CONTENT_TYPE]
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Image exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB"
+    )
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that caps request body size on upload endpoints.
+
+    Requests with a Content-Length above the limit are rejected before any of
+    the body is read; chunked requests are counted as they stream in and cut
+    off as soon as they cross the limit.
+    """
+
+    def __init__(self, app, max_body_bytes: int, paths: Iterable[str]):
+        """
+        Args:
+            app: ASGI application
+            max_body_bytes: Maximum request body size
+            paths: Path prefixes the limit applies to
+        """
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['method'] not in ('POST', 'PUT')
+                or not scope['path'].startswith(self.paths)):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope['headers']:
+            if name == b'content-length' and value.isdigit() and int(value) > self.max_body_bytes:
+                await self._reject(scope, receive, send)
+                return
+
+        state = {'received': 0, 'exceeded': False, 'started': False}
+
+        async def limited_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                state['received'] += len(message.get('body', b''))
+                if state['received'] > self.max_body_bytes:
+                    state['exceeded'] = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # Once the limit is hit, whatever error the app produces is replaced by a 413
+            if state['exceeded']:
+                return
+            state['started'] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+
+        if state['exceeded'] and not state['started']:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={'detail': f"Request body exceeds {self.max_body_bytes // (1024 * 1024)} MB"},
+            headers={'Connection': 'close'}
+        )
+        await response(scope, receive, send)